@@ -0,0 +1,146 @@
+import logging
+from datetime import datetime
+from itertools import chain
+from sqlalchemy import event, select, update, insert, func
+from models import Produit, AlerteStock, SEUIL_ALERTE_DEFAUT, db
+from serializers import alerte_json
+from services.replica_service import SessionRoutee
+from services.changement_service import ChangementService
+
+logger = logging.getLogger(__name__)
+
+class AlerteService:
+    """Alertes de stock bas détectées à l'écriture de Produit.stock, plus à chaque lecture
+
+    Avant chaque flush, un produit ajouté ou modifié qui passe sous son seuil
+    (ou le repasse) bascule son drapeau stock_bas et reçoit une AlerteStock,
+    dans la même transaction. Les écritures en masse appellent synchroniser().
+    La liste des produits en stock bas se lit sur l'index du drapeau.
+
+    Une vente ou un mouvement ne modifie que le stock de son emplacement: le
+    franchissement du seuil est détecté quand EmplacementService.consolider()
+    reporte le total (synchroniser()), un instant après l'écriture. Le drapeau
+    et les alertes sont donc cohérents à terme, comme Produit.stock.
+
+    Après le commit, les nouvelles alertes sont transmises aux abonnés
+    (AlerteService.abonner); une transaction annulée n'en publie aucune.
+    """
+    _abonnes = []
+    _ecouteur_installe = False
+
+    @staticmethod
+    def init_app(app):
+        if not AlerteService._ecouteur_installe:
+            event.listen(SessionRoutee, 'before_flush', AlerteService._avant_flush)
+            event.listen(SessionRoutee, 'after_flush', AlerteService._apres_flush)
+            event.listen(SessionRoutee, 'after_commit', AlerteService._apres_commit)
+            event.listen(SessionRoutee, 'after_rollback', AlerteService._apres_rollback)
+            AlerteService._ecouteur_installe = True
+        AlerteService.abonner(AlerteService._journaliser)
+
+    @staticmethod
+    def abonner(fonction):
+        """Appeler fonction(alertes) après chaque commit qui en contient (liste de dicts alerte_json)"""
+        if fonction not in AlerteService._abonnes:
+            AlerteService._abonnes.append(fonction)
+        return fonction
+
+    @staticmethod
+    def est_stock_bas(stock, seuil_alerte):
+        return (stock or 0) <= (SEUIL_ALERTE_DEFAUT if seuil_alerte is None else seuil_alerte)
+
+    @staticmethod
+    def synchroniser(produit_ids=None):
+        """Recalculer le drapeau après une écriture en masse, dans sa transaction
+
+        Les produits qui ont franchi leur seuil reçoivent leur alerte, publiée
+        au commit. produit_ids limite la vérification à ces produits. Retourne
+        le nombre d'alertes créées.
+        """
+        bas = Produit.stock <= Produit.seuil_alerte
+        a_changer = func.coalesce(Produit.stock_bas, False) != bas
+        if produit_ids is not None:
+            a_changer = a_changer & Produit.id.in_(produit_ids)
+        lignes = db.session.execute(
+            select(Produit.id, Produit.nom, Produit.stock, Produit.seuil_alerte, bas.label('bas'))
+            .where(a_changer).order_by(Produit.id)
+        ).all()
+        if not lignes:
+            return 0
+
+        maintenant = datetime.utcnow()
+        valeurs = [{
+            'produit_id': l.id,
+            'type_alerte': 'stock_bas' if l.bas else 'stock_retabli',
+            'stock': l.stock,
+            'seuil_alerte': l.seuil_alerte,
+            'created_at': maintenant
+        } for l in lignes]
+        alerte_ids = db.session.scalars(
+            insert(AlerteStock).returning(AlerteStock.id, sort_by_parameter_order=True), valeurs
+        ).all()
+        db.session.execute(update(Produit).where(a_changer).values(stock_bas=bas))
+        ChangementService.enregistrer(db.session, Produit, 'update', [
+            {'id': l.id, 'stock_bas': bool(l.bas)} for l in lignes
+        ])
+
+        db.session.info.setdefault('alertes_stock', []).extend(
+            dict(v, id=alerte_id, produit_nom=l.nom, created_at=maintenant.isoformat())
+            for v, l, alerte_id in zip(valeurs, lignes, alerte_ids)
+        )
+        return len(lignes)
+
+    @staticmethod
+    def initialiser():
+        """Drapeau des produits existants, sans alerte (étape init-db)"""
+        with db.engine.begin() as conn:
+            conn.execute(update(Produit).where(Produit.stock_bas.is_(None))
+                         .values(stock_bas=Produit.stock <= Produit.seuil_alerte))
+
+    @staticmethod
+    def _avant_flush(session, flush_context, instances):
+        for produit in chain(session.new, session.dirty):
+            if not isinstance(produit, Produit):
+                continue
+            bas = AlerteService.est_stock_bas(produit.stock, produit.seuil_alerte)
+            if bool(produit.stock_bas) == bas:
+                continue
+            produit.stock_bas = bas
+            alerte = AlerteStock(
+                produit=produit,
+                type_alerte='stock_bas' if bas else 'stock_retabli',
+                stock=produit.stock or 0,
+                seuil_alerte=SEUIL_ALERTE_DEFAUT if produit.seuil_alerte is None else produit.seuil_alerte
+            )
+            session.add(alerte)
+            session.info.setdefault('alertes_flush', []).append(alerte)
+
+    @staticmethod
+    def _apres_flush(session, flush_context):
+        # Identifiants connus, objets encore chargés: sérialiser avant le commit
+        alertes = session.info.pop('alertes_flush', None)
+        if alertes:
+            session.info.setdefault('alertes_stock', []).extend(alerte_json(a) for a in alertes)
+
+    @staticmethod
+    def _apres_commit(session):
+        alertes = session.info.pop('alertes_stock', None)
+        if not alertes:
+            return
+        for abonne in list(AlerteService._abonnes):
+            try:
+                abonne(alertes)
+            except Exception:
+                logger.exception("Abonné aux alertes de stock en échec")
+
+    @staticmethod
+    def _apres_rollback(session):
+        session.info.pop('alertes_flush', None)
+        session.info.pop('alertes_stock', None)
+
+    @staticmethod
+    def _journaliser(alertes):
+        for alerte in alertes:
+            if alerte['type_alerte'] == 'stock_bas':
+                logger.warning("Stock bas: %s (%s, seuil %s)",
+                               alerte['produit_nom'], alerte['stock'], alerte['seuil_alerte'])
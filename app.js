@@ -150,6 +150,251 @@ const RuineGestion = {
         quantiteInput.addEventListener('input', calculateTotal);
     },
     
+    // Sélecteur avec recherche par préfixe côté serveur (remplace les <select> complets)
+    // inputId: champ texte visible, hiddenId: champ envoyé avec le formulaire (id choisi)
+    typeahead: function(inputId, hiddenId, url, libelle, onSelect) {
+        const input = document.getElementById(inputId);
+        const hidden = document.getElementById(hiddenId);
+
+        if (!input || !hidden) return;
+
+        const suggestions = document.createElement('datalist');
+        suggestions.id = inputId + '-suggestions';
+        input.setAttribute('list', suggestions.id);
+        input.setAttribute('autocomplete', 'off');
+        input.after(suggestions);
+
+        let resultats = new Map();
+        let minuteur = null;
+        let requeteEnCours = null;
+
+        const choisir = (element) => {
+            hidden.value = element ? element.id : '';
+            // Un texte saisi doit correspondre à une suggestion
+            input.setCustomValidity(element || !input.value ? '' : 'Choisissez une suggestion de la liste');
+            if (onSelect) onSelect(element);
+        };
+
+        input.addEventListener('input', () => {
+            const element = resultats.get(input.value);
+            choisir(element || null);
+            if (element) return;
+
+            clearTimeout(minuteur);
+            const terme = input.value.trim();
+            if (!terme) return;
+
+            minuteur = setTimeout(() => {
+                if (requeteEnCours) requeteEnCours.abort();
+                requeteEnCours = new AbortController();
+                const separateur = url.includes('?') ? '&' : '?';
+
+                fetch(url + separateur + 'q=' + encodeURIComponent(terme), {
+                    signal: requeteEnCours.signal,
+                    credentials: 'same-origin'
+                })
+                    .then(response => response.json())
+                    .then(elements => {
+                        resultats = new Map(elements.map(e => [libelle(e), e]));
+                        suggestions.replaceChildren(...elements.map(e => {
+                            const option = document.createElement('option');
+                            option.value = libelle(e);
+                            return option;
+                        }));
+                        // Le texte saisi correspond peut-être déjà à une suggestion
+                        const exact = resultats.get(input.value);
+                        if (exact) choisir(exact);
+                    })
+                    .catch(error => {
+                        if (error.name !== 'AbortError') console.error('Erreur de recherche:', error);
+                    });
+            }, 200);
+        });
+    },
+
+    // Tableau paginé et trié côté serveur: page et tri rechargent seulement le tableau
+    // conteneurId: élément dont data-fragment-url renvoie le tableau (voir TableauService)
+    tableau: function(conteneurId) {
+        const conteneur = document.getElementById(conteneurId);
+        if (!conteneur || !conteneur.dataset.fragmentUrl) return;
+
+        const charger = (url, historique) => {
+            const cible = new URL(url, window.location.href);
+            fetch(conteneur.dataset.fragmentUrl + cible.search, { credentials: 'same-origin' })
+                .then(response => {
+                    if (!response.ok) throw new Error(response.status);
+                    return response.text();
+                })
+                .then(html => {
+                    conteneur.innerHTML = html;
+                    if (historique) history.pushState({ tableau: conteneurId }, '', cible.pathname + cible.search);
+                    this.checkStockAlerts();
+                })
+                .catch(() => { window.location.href = url; });
+        };
+
+        conteneur.addEventListener('click', (e) => {
+            const lien = e.target.closest('a[data-tableau]');
+            if (!lien || lien.closest('.disabled')) return;
+            e.preventDefault();
+            charger(lien.href, true);
+        });
+
+        window.addEventListener('popstate', (e) => {
+            if (e.state && e.state.tableau === conteneurId) charger(window.location.href, false);
+        });
+        history.replaceState({ tableau: conteneurId }, '');
+    },
+
+    // Envoyer un formulaire data-ligne sans recharger la page: le serveur renvoie
+    // la ligne créée ou modifiée (ou 204 après suppression), remplacée dans le <tbody>
+    envoyerLigne: function(form) {
+        const tbody = document.getElementById(form.dataset.ligne);
+
+        return fetch(form.action, {
+            method: 'POST',
+            body: new FormData(form),
+            headers: { 'X-Fragment': 'ligne' },
+            credentials: 'same-origin'
+        })
+            .then(response => {
+                if (!response.ok) {
+                    return response.json()
+                        .catch(() => ({}))
+                        .then(data => { throw new Error(data.message || 'Erreur lors de l\'enregistrement'); });
+                }
+                return response.status === 204 ? '' : response.text();
+            })
+            .then(html => {
+                if (!html) {
+                    const ligne = form.closest('tr[data-id]');
+                    if (ligne) ligne.remove();
+                } else if (!tbody) {
+                    // Tableau vide jusqu'ici: la page complète affiche la nouvelle ligne
+                    window.location.reload();
+                    return;
+                } else {
+                    const modele = document.createElement('template');
+                    modele.innerHTML = html.trim();
+                    const ligne = modele.content.firstElementChild;
+                    const existante = tbody.querySelector(`tr[data-id="${ligne.dataset.id}"]`);
+                    if (existante) {
+                        existante.replaceWith(ligne);
+                    } else {
+                        tbody.prepend(ligne);
+                    }
+                    this.checkStockAlerts();
+                }
+
+                const modal = form.closest('.modal');
+                if (modal) {
+                    bootstrap.Modal.getOrCreateInstance(modal).hide();
+                    form.reset();
+                    form.classList.remove('was-validated');
+                }
+                if (form.dataset.succes) this.showToast(form.dataset.succes, 'success');
+            })
+            .catch(error => this.showToast(error.message, 'danger'));
+    },
+
+    // Flux en direct (/flux, Server-Sent Events): les ventes, stocks, statuts et
+    // alertes publiés par le serveur sont appliqués à la page sans la recharger.
+    // Éléments mis à jour: [data-flux-stock], [data-flux-ligne-produit], [data-flux-statut-stock],
+    // [data-flux-compteur], [data-flux-montant] (filtré par [data-flux-periode]), #ventes-recentes
+    flux: function(url = '/flux') {
+        if (!window.EventSource) return;
+
+        const source = new EventSource(url);
+        const toutes = (selecteur) => document.querySelectorAll(selecteur);
+        const lire = (e) => JSON.parse(e.data);
+
+        const ajouterCompteur = (nom, increment) => {
+            toutes(`[data-flux-compteur="${nom}"]`).forEach(el => {
+                el.textContent = parseInt(el.textContent || 0) + increment;
+            });
+        };
+        // Montant d'une période ([data-flux-periode], préfixe de date: jour ou mois):
+        // une vente synchronisée après coup, datée d'une autre période, n'y entre pas
+        const dansPeriode = (el, date) => !el.dataset.fluxPeriode || date.startsWith(el.dataset.fluxPeriode);
+        const ajouterMontant = (nom, montant, date) => {
+            toutes(`[data-flux-montant="${nom}"]`).forEach(el => {
+                if (date && !dansPeriode(el, date)) return;
+                el.dataset.valeur = parseFloat(el.dataset.valeur || 0) + montant;
+                el.textContent = this.formatCurrency(parseFloat(el.dataset.valeur));
+            });
+        };
+
+        source.addEventListener('vente', (e) => {
+            const vente = lire(e);
+            ajouterCompteur('ventes', 1);
+            ['total_ventes', 'ventes_jour', 'ventes_mois'].forEach(nom => ajouterMontant(nom, vente.total, vente.date_vente));
+            ajouterMontant('total_benefices', vente.benefice);
+
+            const tbody = document.getElementById('ventes-recentes');
+            if (tbody && dansPeriode(tbody, vente.date_vente)) {
+                const [jour, heure] = vente.date_vente.split('T');
+                const [annee, mois, j] = jour.split('-');
+                const ligne = document.createElement('tr');
+                [vente.produit_nom, vente.client_nom || 'Client direct', vente.quantite,
+                 this.formatCurrency(vente.total), `${j}/${mois}/${annee} ${heure.slice(0, 5)}`].forEach(valeur => {
+                    const cellule = document.createElement('td');
+                    cellule.textContent = valeur;
+                    ligne.appendChild(cellule);
+                });
+                ligne.classList.add('table-info');
+                tbody.prepend(ligne);
+                while (tbody.rows.length > 5) tbody.lastElementChild.remove();
+            }
+        });
+
+        source.addEventListener('stock', (e) => {
+            const stock = lire(e);
+            toutes(`[data-flux-stock="${stock.produit_id}"]`).forEach(el => {
+                el.textContent = stock.stock;
+                if (el.classList.contains('badge')) {
+                    el.classList.toggle('bg-danger', stock.stock_bas);
+                    el.classList.toggle('bg-success', !stock.stock_bas);
+                }
+            });
+            toutes(`[data-flux-ligne-produit="${stock.produit_id}"]`).forEach(el => {
+                el.classList.toggle('table-warning', stock.stock_bas);
+            });
+            toutes(`[data-flux-statut-stock="${stock.produit_id}"]`).forEach(el => {
+                el.textContent = stock.stock_bas ? 'Stock bas' : 'Suffisant';
+                el.classList.toggle('bg-warning', stock.stock_bas);
+                el.classList.toggle('bg-success', !stock.stock_bas);
+            });
+        });
+
+        source.addEventListener('livraison', (e) => {
+            const livraison = lire(e);
+            const avant = livraison.ancien_statut === 'En cours';
+            const apres = livraison.statut === 'En cours';
+            if (avant !== apres) ajouterCompteur('livraisons_en_cours', apres ? 1 : -1);
+        });
+
+        source.addEventListener('alerte', (e) => {
+            const alerte = lire(e);
+            const nom = document.createElement('span');
+            nom.textContent = alerte.produit_nom;  // showToast insère du HTML
+            if (alerte.type_alerte === 'stock_bas') {
+                this.showToast(`Stock bas : ${nom.innerHTML} (${alerte.stock} restant(s))`, 'warning');
+            } else {
+                this.showToast(`Stock rétabli : ${nom.innerHTML}`, 'success');
+            }
+        });
+
+        // Trop d'événements d'un coup, ou client en retard: repartir d'une page à jour
+        source.addEventListener('rafraichir', () => {
+            if (!document.querySelector('.modal.show')) window.location.reload();
+        });
+
+        // Refus du serveur (503, session expirée): EventSource abandonne, on réessaie plus tard
+        source.addEventListener('error', () => {
+            if (source.readyState === EventSource.CLOSED) setTimeout(() => this.flux(url), 30000);
+        });
+    },
+
     // Gestion des alertes de stock
     checkStockAlerts: function() {
         const stockElements = document.querySelectorAll('[data-stock-level]');
@@ -187,7 +432,12 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Vérifier les alertes de stock
     RuineGestion.checkStockAlerts();
-    
+
+    // Pages suivies en direct (tableau de bord, stocks)
+    if (document.querySelector('[data-flux]')) {
+        RuineGestion.flux();
+    }
+
     // Auto-fermeture des alertes après 5 secondes
     const alerts = document.querySelectorAll('.alert:not(.alert-no-dismiss)');
     alerts.forEach(alert => {
@@ -222,6 +472,15 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
+    // Formulaires des tableaux: seule la ligne concernée est renvoyée et remplacée
+    // (écouteur sur le document: les lignes sont remplacées après chaque envoi)
+    document.addEventListener('submit', function(e) {
+        const form = e.target;
+        if (!form.dataset || !form.dataset.ligne || e.defaultPrevented) return;
+        e.preventDefault();
+        RuineGestion.envoyerLigne(form);
+    });
+    
     // Validation en temps réel des formulaires
     const forms = document.querySelectorAll('.needs-validation');
     forms.forEach(form => {
@@ -1,11 +1,17 @@
 import os
 import logging
+import tempfile
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
+from sqlalchemy import event, inspect, text
+from sqlalchemy.schema import CreateIndex, CreateColumn
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from services.replica_service import SessionRoutee
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -13,32 +19,174 @@ logging.basicConfig(level=logging.DEBUG)
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': SessionRoutee})
 bcrypt = Bcrypt()
 jwt = JWTManager()
 
-def create_app():
-    app = Flask(__name__)
+def pragmas_sqlite():
+    """Réglages SQLite appliqués à chaque connexion (profil production)"""
+    return {
+        "journal_mode": "WAL",  # lecteurs et écrivain simultanés
+        "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),  # fsync au checkpoint seulement
+        "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000)),  # ms d'attente du verrou
+        "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -64000)),  # négatif = Kio
+        "foreign_keys": "ON",
+        "temp_store": "MEMORY",
+    }
+
+def options_moteur(uri):
+    """Options du moteur SQLAlchemy selon le dialecte de DATABASE_URL"""
+    if make_url(uri).get_backend_name() == 'sqlite':
+        # Fichier local: ni pre_ping ni recyclage, l'attente du verrou passe par busy_timeout
+        return {}
     
-    # Configuration
-    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///ruine_gestion.db")
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    # PostgreSQL: pool dimensionné par worker gunicorn
+    # (workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) doit rester sous max_connections)
+    return {
         "pool_recycle": 300,
         "pool_pre_ping": True,
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 5)),
         "connect_args": {
             "sslmode": "prefer",
             "application_name": "RuineGestion"
         }
     }
+
+def appliquer_pragmas_sqlite(engine, pragmas):
+    """Exécuter les PRAGMA à l'ouverture de chaque connexion SQLite"""
+    @event.listens_for(engine, 'connect')
+    def connexion_sqlite(dbapi_connection, connection_record):
+        curseur = dbapi_connection.cursor()
+        for nom, valeur in pragmas.items():
+            curseur.execute(f"PRAGMA {nom}={valeur}")
+        curseur.close()
+
+def initialiser_base(app):
+    """Créer le schéma et l'utilisateur par défaut"""
+    with app.app_context():
+        db.create_all()
+        
+        # Colonnes ajoutées aux tables existantes (create_all ne modifie pas une table
+        # existante). Colonnes facultatives seulement, sans contrainte de clé étrangère.
+        inspecteur = inspect(db.engine)
+        with db.engine.begin() as conn:
+            for table in db.metadata.sorted_tables:
+                existantes = {c['name'] for c in inspecteur.get_columns(table.name)}
+                for colonne in table.columns:
+                    if colonne.name not in existantes:
+                        conn.execute(text('ALTER TABLE {} ADD COLUMN {}'.format(
+                            conn.dialect.identifier_preparer.format_table(table),
+                            CreateColumn(colonne).compile(dialect=conn.dialect)
+                        )))
+        
+        # Index ajoutés après la création des tables existantes
+        # (IF NOT EXISTS: la réflexion ignore les index sur expression)
+        with db.engine.begin() as conn:
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+        
+        # Create default admin user if it doesn't exist
+        from services.auth_service import AuthService
+        AuthService.create_default_user()
+        
+        from services.version_service import VersionService
+        VersionService.initialiser()
+        
+        from services.emplacement_service import EmplacementService
+        EmplacementService.initialiser()
+        
+        from services.valorisation_service import ValorisationService
+        ValorisationService.initialiser()
+        
+        from services.alerte_service import AlerteService
+        AlerteService.initialiser()
+        
+        from services.archive_service import ArchiveService
+        ArchiveService.initialiser()
+        
+        # Ne pas transmettre de connexions ouvertes aux workers forkés (gunicorn --preload)
+        db.engine.dispose()
+
+def create_app():
+    app = Flask(__name__)
+    
+    # Configuration
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///ruine_gestion.db")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options_moteur(app.config['SQLALCHEMY_DATABASE_URI'])
+    
+    # Réplica en lecture facultatif (tableaux de bord, statistiques, exports)
+    replica_url = os.environ.get("DATABASE_REPLICA_URL")
+    if replica_url:
+        app.config['SQLALCHEMY_BINDS'] = {'replica': {'url': replica_url, **options_moteur(replica_url)}}
+    # Durée pendant laquelle un client lit sur le primaire après une écriture
+    app.config['REPLICA_RETARD_MAX'] = int(os.environ.get("REPLICA_RETARD_MAX", 5))
     app.config['JWT_SECRET_KEY'] = os.environ.get("JWT_SECRET_KEY", "jwt-secret-change-in-production")
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False  # For simplicity, tokens don't expire
     
+    # Politique de hachage des mots de passe (bcrypt, pbkdf2:sha256 ou scrypt)
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    app.config['PASSWORD_HASH_COST'] = int(os.environ.get("PASSWORD_HASH_COST", 0)) or None
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get("PASSWORD_HASH_QUEUE", 16))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 5))  # secondes d'attente d'une place
+    
+    # Planification des tournées de livraison
+    app.config['TOURNEE_TABLE_DISTANCES'] = os.environ.get("TOURNEE_TABLE_DISTANCES", "distances_livraison.csv")
+    app.config['TOURNEE_DEPOT'] = os.environ.get("TOURNEE_DEPOT")  # "latitude,longitude"
+    
+    # Métriques Prometheus exposées sur /metrics
+    app.config['METRICS_ENABLED'] = os.environ.get("METRICS_ENABLED", "1") == "1"
+    app.config['METRICS_TOKEN'] = os.environ.get("METRICS_TOKEN")
+    
+    # Profilage SQL par requête (développement et tests): off, warn ou raise
+    app.config['QUERY_PROFILER'] = os.environ.get("QUERY_PROFILER", "off")
+    
+    # Prévision de la demande et points de commande (flask prevision)
+    app.config['PREVISION_DELAI'] = int(os.environ.get("PREVISION_DELAI", 7))  # délai fournisseur, jours
+    app.config['PREVISION_COUVERTURE'] = int(os.environ.get("PREVISION_COUVERTURE", 14))  # jours couverts par une commande
+    app.config['PREVISION_NIVEAU_SERVICE'] = float(os.environ.get("PREVISION_NIVEAU_SERVICE", 0.95))
+    app.config['PREVISION_METHODE'] = os.environ.get("PREVISION_METHODE", "lissage")  # lissage ou moyenne
+    
+    # Flux en direct /flux (Server-Sent Events): sockets des workers, flux
+    # simultanés par worker (un thread chacun) et durée avant reconnexion
+    app.config['FLUX_DOSSIER'] = os.environ.get("FLUX_DOSSIER", os.path.join(tempfile.gettempdir(), "ruinegestion-flux"))
+    app.config['FLUX_CONNEXIONS_MAX'] = int(os.environ.get("FLUX_CONNEXIONS_MAX", 4))
+    app.config['FLUX_DUREE_MAX'] = int(os.environ.get("FLUX_DUREE_MAX", 300))
+    
+    # Synchronisation des caisses hors ligne (POST /api/ventes/synchroniser)
+    app.config['VENTES_SYNC_LOT_MAX'] = int(os.environ.get("VENTES_SYNC_LOT_MAX", 5000))
+    
+    # Report des variations de stock sur Produit.stock: thread (différé, hors
+    # des requêtes, écritures regroupées sur le délai en secondes) ou off
+    # (tâche du planificateur seulement)
+    app.config['STOCK_CONSOLIDATION'] = os.environ.get("STOCK_CONSOLIDATION", "thread")
+    app.config['STOCK_CONSOLIDATION_DELAI'] = float(os.environ.get("STOCK_CONSOLIDATION_DELAI", 0.5))
+    
+    # Archivage des périodes closes (ventes, mouvements): mois gardés dans les
+    # tables actives (0: pas d'archivage nocturne), lignes par lot, pause entre lots (s)
+    app.config['ARCHIVE_CONSERVATION_MOIS'] = int(os.environ.get("ARCHIVE_CONSERVATION_MOIS", 12))
+    app.config['ARCHIVE_LOT'] = int(os.environ.get("ARCHIVE_LOT", 900))
+    app.config['ARCHIVE_PAUSE'] = float(os.environ.get("ARCHIVE_PAUSE", 0.2))
+    
+    # Compression à la volée des réponses HTML, JSON et CSV (0 pour désactiver)
+    app.config['COMPRESSION_MIN_TAILLE'] = int(os.environ.get("COMPRESSION_MIN_TAILLE", 1024))
+    
     app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
     
     # Initialize extensions
     db.init_app(app)
+    with app.app_context():
+        for cle, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite':
+                pragmas = pragmas_sqlite()
+                if cle == 'replica':
+                    pragmas['query_only'] = 'ON'  # aucune écriture ne doit atteindre le réplica
+                appliquer_pragmas_sqlite(engine, pragmas)
     bcrypt.init_app(app)
     jwt.init_app(app)
     
@@ -52,6 +200,9 @@ def create_app():
     from routes.livraisons_routes import livraisons_bp
     from routes.reservations_routes import reservations_bp
     from routes.exports_routes import exports_bp
+    from routes.flux_routes import flux_bp
+    from routes.emplacements_routes import emplacements_bp
+    from routes.changements_routes import changements_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
@@ -62,15 +213,143 @@ def create_app():
     app.register_blueprint(livraisons_bp)
     app.register_blueprint(reservations_bp)
     app.register_blueprint(exports_bp)
+    app.register_blueprint(flux_bp)
+    app.register_blueprint(emplacements_bp)
+    app.register_blueprint(changements_bp)
     
-    with app.app_context():
-        import models
-        db.create_all()
-        
-        # Create default admin user if it doesn't exist
-        from services.auth_service import AuthService
-        AuthService.create_default_user()
-        
+    if app.config['METRICS_ENABLED']:
+        from services.metrics_service import MetricsService
+        from routes.metrics_routes import metrics_bp
+        MetricsService.init_app(app)
+        app.register_blueprint(metrics_bp)
+    
+    from services.password_service import PasswordService
+    PasswordService.init_app(app)
+    
+    from services.query_profiler_service import QueryProfiler
+    QueryProfiler.init_app(app)
+    
+    from services.replica_service import ReplicaService
+    ReplicaService.init_app(app)
+    
+    from services.version_service import VersionService
+    VersionService.init_app(app)
+    
+    from services.alerte_service import AlerteService
+    AlerteService.init_app(app)
+    
+    from services.flux_service import FluxService
+    FluxService.init_app(app)
+    
+    from services.emplacement_service import EmplacementService
+    EmplacementService.init_app(app)
+    
+    from services.changement_service import ChangementService
+    ChangementService.init_app(app)
+    
+    from services.assets_service import AssetsService
+    AssetsService.init_app(app)
+    
+    from services.tableau_service import TableauService
+    TableauService.init_app(app)
+    
+    import models
+    
+    # Modes de démarrage:
+    # - auto: schéma et utilisateur par défaut créés au démarrage (développement)
+    # - release: rien au démarrage, lancer `flask --app main init-db` à chaque déploiement
+    app.config['STARTUP_MODE'] = os.environ.get("STARTUP_MODE", "auto")
+    # Planificateur: thread (dans ce processus), gunicorn (maître gunicorn) ou off
+    app.config['SCHEDULER_MODE'] = os.environ.get("SCHEDULER_MODE", "thread")
+    
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Créer le schéma et l'utilisateur par défaut (étape de release)"""
+        initialiser_base(app)
+    
+    @app.cli.command('replica-sync')
+    def replica_sync_command():
+        """Copier la base SQLite primaire vers le réplica SQLite (test en local)"""
+        chemin = ReplicaService.synchroniser_sqlite(app)
+        print(f"Réplica synchronisé: {chemin}")
+    
+    @app.cli.command('prevision')
+    @click.option('--appliquer', is_flag=True, help="Écrire seuil_alerte et quantite_cible")
+    def prevision_command(appliquer):
+        """Calculer les points de commande de tous les produits"""
+        import time
+        from services.prevision_service import PrevisionService
+        debut = time.perf_counter()
+        plan = PrevisionService.planifier(**PrevisionService.parametres(app.config))
+        resume = PrevisionService.resume(plan, limite=10)
+        print(f"{resume['produits']} produits, {resume['avec_historique']} avec historique, "
+              f"{resume['a_commander']} à commander ({time.perf_counter() - debut:.1f}s)")
+        for s in resume['suggestions']:
+            print(f"  produit {s['id']}: demande {s['demande_journaliere']}/jour, "
+                  f"seuil {s['seuil_alerte']}, cible {s['quantite_cible']}, à commander {s['a_commander']}")
+        if appliquer:
+            print(f"{PrevisionService.appliquer(plan)} produits mis à jour")
+    
+    @app.cli.command('purger-changements')
+    @click.option('--jours', default=30, show_default=True, help="Âge des changements à supprimer")
+    def purger_changements_command(jours):
+        """Supprimer les anciens changements du flux /api/changes"""
+        from services.changement_service import ChangementService
+        print(f"{ChangementService.purger(jours)} changements supprimés")
+    
+    @app.cli.command('archiver')
+    @click.option('--mois', type=int, help="Mois gardés dans les tables actives (défaut: ARCHIVE_CONSERVATION_MOIS)")
+    @click.option('--simulation', is_flag=True, help="Compter les lignes à archiver sans rien déplacer")
+    def archiver_command(mois, simulation):
+        """Archiver les ventes et mouvements de stock des périodes closes"""
+        from services.archive_service import ArchiveService
+        parametres = ArchiveService.parametres(app.config)
+        if mois is not None:
+            parametres['mois'] = mois
+        resume = ArchiveService.archiver(simulation=simulation, **parametres)
+        print(f"{'À archiver' if simulation else 'Archivés'} avant le {resume['limite']}: "
+              f"{resume['ventes']} ventes, {resume['mouvements']} mouvements")
+    
+    @app.cli.command('sauvegarder')
+    @click.argument('fichier', required=False)
+    @click.option('--niveau', default=6, show_default=True, help="Compression gzip (1 rapide, 9 compact)")
+    def sauvegarder_command(fichier, niveau):
+        """Sauvegarde cohérente et compressée de toutes les tables (- : sortie standard)"""
+        import sys
+        import time
+        from datetime import datetime
+        from services.sauvegarde_service import SauvegardeService
+        fichier = fichier or os.path.join('sauvegardes', f"ruinegestion-{datetime.now():%Y%m%d-%H%M%S}.gz")
+        debut = time.perf_counter()
+        comptes = SauvegardeService.sauvegarder(sys.stdout.buffer if fichier == '-' else fichier, niveau)
+        duree = time.perf_counter() - debut
+        click.echo(f"{sum(comptes.values())} lignes, {len(comptes)} tables sauvegardées dans {fichier} "
+                   f"({duree:.1f}s, {sum(comptes.values()) / max(duree, 1e-9):.0f} lignes/s)", err=fichier == '-')
+    
+    @app.cli.command('restaurer')
+    @click.argument('fichier')
+    @click.confirmation_option(prompt="Remplacer toutes les données de la base par cette sauvegarde ?")
+    def restaurer_command(fichier):
+        """Restaurer une sauvegarde (application arrêtée; - : entrée standard)"""
+        import sys
+        from services.sauvegarde_service import SauvegardeService
+        resume = SauvegardeService.restaurer(sys.stdin.buffer if fichier == '-' else fichier)
+        lignes = sum(resume['tables'].values())
+        print(f"{lignes} lignes restaurées en {resume['chargement']:.1f}s "
+              f"({lignes / max(resume['chargement'], 1e-9):.0f} lignes/s), index en {resume['index']:.1f}s")
+    
+    @app.cli.command('scheduler')
+    def scheduler_command():
+        """Exécuter le planificateur de tâches au premier plan"""
+        from services.scheduler_service import scheduler_service
+        scheduler_service.app = app
+        scheduler_service.setup_schedules()
+        scheduler_service.run_scheduler()
+    
+    if app.config['STARTUP_MODE'] == 'auto':
+        initialiser_base(app)
+    
+    if app.config['SCHEDULER_MODE'] == 'thread':
         # Démarrer le planificateur de tâches automatiques (en différé)
         def start_scheduler_delayed():
             import threading
@@ -78,7 +357,7 @@ def create_app():
             def delayed_start():
                 time.sleep(2)  # Attendre que l'app soit complètement initialisée
                 from services.scheduler_service import start_scheduler
-                start_scheduler()
+                start_scheduler(app)
             thread = threading.Thread(target=delayed_start, daemon=True)
             thread.start()
         
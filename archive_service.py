@@ -0,0 +1,148 @@
+import logging
+import time
+from datetime import datetime
+from sqlalchemy import select, insert, delete, func, exists, text
+from models import Vente, VenteArchive, MouvementStock, MouvementStockArchive, CoucheStock, requete_complete, db
+
+logger = logging.getLogger(__name__)
+
+class ArchiveService:
+    """Archivage des périodes closes de Vente et MouvementStock
+
+    Les mois antérieurs aux `mois` derniers sont déplacés, avec leurs id,
+    vers vente_archive et mouvement_stock_archive: les tables actives (vente,
+    tableau de bord, valorisation) et leurs index ne gardent que la période
+    récente. Chaque lot est une courte transaction, suivie d'une pause: les
+    écritures des caisses passent entre deux lots. Une vente part avec ses
+    mouvements; une entrée dont une couche FIFO reste en stock n'est pas
+    archivée. Le déplacement n'est pas un changement métier: il n'apparaît
+    pas dans /api/changes.
+
+    Les historiques, statistiques et exports lisent VenteComplete et
+    MouvementStockComplete (models.py), qui réunissent les deux tables; les
+    vues vente_complete et mouvement_stock_complete en font autant en SQL.
+    """
+    VUES = {
+        'vente_complete': (Vente, VenteArchive),
+        'mouvement_stock_complete': (MouvementStock, MouvementStockArchive),
+    }
+
+    @staticmethod
+    def parametres(config):
+        """Paramètres de l'archivage lus dans la configuration de l'application"""
+        return {
+            'mois': config['ARCHIVE_CONSERVATION_MOIS'],
+            'lot': config['ARCHIVE_LOT'],
+            'pause': config['ARCHIVE_PAUSE'],
+        }
+
+    @staticmethod
+    def limite(mois, maintenant=None):
+        """Premier jour du plus ancien mois conservé dans les tables actives"""
+        maintenant = maintenant or datetime.now()
+        rang = maintenant.year * 12 + maintenant.month - 1 - max(mois, 1)
+        return datetime(rang // 12, rang % 12 + 1, 1)
+
+    @staticmethod
+    def requete_ventes(limite):
+        return select(Vente.id).where(Vente.date_vente < limite)
+
+    @staticmethod
+    def requete_mouvements(limite):
+        """Mouvements hors vente à archiver (ceux d'une vente partent avec elle)"""
+        return select(MouvementStock.id).where(
+            MouvementStock.date_mouvement < limite,
+            MouvementStock.vente_id.is_(None),
+            ~exists().where(CoucheStock.mouvement_id == MouvementStock.id)
+        )
+
+    @staticmethod
+    def archiver(mois=12, lot=900, pause=0.2, simulation=False):
+        """Déplacer les ventes et mouvements antérieurs à limite(mois), par lots
+
+        simulation=True: compter seulement. Retourne le résumé.
+        """
+        limite = ArchiveService.limite(mois)
+        resume = {'limite': limite.date().isoformat(), 'simulation': simulation, 'ventes': 0, 'mouvements': 0}
+        if simulation:
+            resume['ventes'] = db.session.scalar(
+                select(func.count()).select_from(ArchiveService.requete_ventes(limite).subquery())
+            )
+            resume['mouvements'] = db.session.scalar(
+                select(func.count()).select_from(ArchiveService.requete_mouvements(limite).subquery())
+            )
+            return resume
+
+        debut = time.perf_counter()
+        while True:
+            ids = db.session.scalars(ArchiveService.requete_ventes(limite).order_by(Vente.id).limit(lot)).all()
+            if not ids:
+                break
+            resume['ventes'] += len(ids)
+            resume['mouvements'] += ArchiveService._deplacer_ventes(ids)
+            time.sleep(pause)
+
+        while True:
+            ids = db.session.scalars(
+                ArchiveService.requete_mouvements(limite).order_by(MouvementStock.id).limit(lot)
+            ).all()
+            if not ids:
+                break
+            resume['mouvements'] += ArchiveService._deplacer_mouvements(ids)
+            time.sleep(pause)
+
+        logger.info("Archivage avant le %s: %d ventes, %d mouvements (%.1fs)",
+                    resume['limite'], resume['ventes'], resume['mouvements'], time.perf_counter() - debut)
+        return resume
+
+    @staticmethod
+    def initialiser():
+        """(Re)créer les vues SQL des tables actives et archivées (étape init-db)
+
+        Recréées à chaque init-db: elles suivent les colonnes ajoutées aux modèles.
+        """
+        with db.engine.begin() as conn:
+            for vue, (modele, archive) in ArchiveService.VUES.items():
+                requete = requete_complete(modele, archive)
+                conn.execute(text(f"DROP VIEW IF EXISTS {vue}"))
+                conn.execute(text(f"CREATE VIEW {vue} AS {requete.compile(dialect=conn.dialect)}"))
+
+    @staticmethod
+    def _deplacer_ventes(ids):
+        """Un lot de ventes et leurs mouvements, en une transaction; retourne le nombre de mouvements"""
+        try:
+            # Copies d'abord, suppressions ensuite: les clés étrangères restent valides
+            ArchiveService._copier(Vente, VenteArchive, Vente.id.in_(ids))
+            ArchiveService._copier(MouvementStock, MouvementStockArchive, MouvementStock.vente_id.in_(ids))
+            mouvements = ArchiveService._supprimer(MouvementStock, MouvementStock.vente_id.in_(ids))
+            ArchiveService._supprimer(Vente, Vente.id.in_(ids))
+            db.session.commit()
+            return mouvements
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def _deplacer_mouvements(ids):
+        """Un lot de mouvements hors vente, en une transaction"""
+        try:
+            ArchiveService._copier(MouvementStock, MouvementStockArchive, MouvementStock.id.in_(ids))
+            mouvements = ArchiveService._supprimer(MouvementStock, MouvementStock.id.in_(ids))
+            db.session.commit()
+            return mouvements
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def _copier(modele, archive, condition):
+        colonnes = [c.name for c in modele.__table__.columns]
+        db.session.execute(insert(archive).from_select(
+            colonnes, select(*[modele.__table__.c[nom] for nom in colonnes]).where(condition)
+        ))
+
+    @staticmethod
+    def _supprimer(modele, condition):
+        return db.session.execute(
+            delete(modele).where(condition).execution_options(synchronize_session=False)
+        ).rowcount
@@ -0,0 +1,193 @@
+"""Application ASGI: API de lecture asynchrone montée à côté de l'application Flask.
+
+Usage:
+    uvicorn asgi:application --host 0.0.0.0 --port 8000 --workers 2
+
+Les GET de /api/produits, /api/stocks, /api/ventes (statistiques comprises)
+et /api/reservations sont servis par Starlette avec le moteur asynchrone de
+SQLAlchemy (asyncpg ou aiosqlite), sur le réplica s'il est configuré. Les
+modèles, les requêtes des services et les sérialiseurs sont ceux de l'API
+Flask. Toutes les autres routes (pages, écritures) passent par
+l'application Flask via a2wsgi. Un worker attend ainsi des centaines de
+lectures lentes sans bloquer.
+"""
+import logging
+import os
+from contextlib import asynccontextmanager
+from functools import wraps
+from a2wsgi import WSGIMiddleware
+from flask_jwt_extended import decode_token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import joinedload
+from werkzeug.http import parse_etags, http_date
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route, Mount
+
+from app import app, db, pragmas_sqlite, appliquer_pragmas_sqlite
+from models import Produit, Client, Vente, VenteComplete, MouvementStock, Reservation, StockEmplacement
+from serializers import produit_json, stock_json, stock_bas_json, mouvement_json, vente_json, reservation_json
+from services.vente_service import VenteService
+from services.stock_service import StockService
+from services.version_service import VersionService
+
+# aiosqlite journalise chaque opération en DEBUG (niveau global de app.py)
+logging.getLogger('aiosqlite').setLevel(logging.INFO)
+
+PILOTES_ASYNC = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+def moteur_async():
+    """Moteur asynchrone sur la même base que Flask (réplica en priorité)"""
+    with app.app_context():
+        url = db.engines.get('replica', db.engine).url
+    backend = url.get_backend_name()
+    url = url.set(drivername=PILOTES_ASYNC[backend])
+    options = {
+        "pool_size": int(os.environ.get("ASYNC_POOL_SIZE", 20)),
+        "max_overflow": int(os.environ.get("ASYNC_MAX_OVERFLOW", 10)),
+    }
+
+    if backend == 'sqlite':
+        moteur = create_async_engine(url, **options)
+        appliquer_pragmas_sqlite(moteur.sync_engine, {**pragmas_sqlite(), 'query_only': 'ON'})
+        return moteur
+
+    # asyncpg ne connaît pas sslmode: il passe par l'argument ssl
+    connect_args = {"server_settings": {"application_name": "RuineGestion-async"}}
+    if 'sslmode' in url.query:
+        connect_args['ssl'] = url.query['sslmode']
+        url = url.difference_update_query(['sslmode'])
+    return create_async_engine(url, pool_pre_ping=True, pool_recycle=300,
+                               connect_args=connect_args, **options)
+
+moteur = moteur_async()
+Session = async_sessionmaker(moteur, expire_on_commit=False)
+
+def jwt_required(f):
+    """Équivalent asynchrone de flask_jwt_extended.jwt_required"""
+    @wraps(f)
+    async def decorated_function(request):
+        entete = request.headers.get('Authorization', '')
+        if not entete.startswith('Bearer '):
+            return JSONResponse({'msg': 'Missing Authorization Header'}, status_code=401)
+        try:
+            with app.app_context():
+                decode_token(entete.removeprefix('Bearer '))
+        except Exception as e:
+            return JSONResponse({'msg': str(e)}, status_code=422)
+        return await f(request)
+    return decorated_function
+
+def conditionnel(*modeles):
+    """Équivalent asynchrone de version_service.conditionnel (mêmes ETags que Flask)"""
+    tables = sorted(m.__tablename__ for m in modeles)
+
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(request):
+            async with Session() as session:
+                versions = (await session.execute(VersionService.requete_versions(tables))).all()
+            etag, modifie_le = VersionService.etag(versions, f"{request.url.path}?{request.url.query}")
+
+            if parse_etags(request.headers.get('If-None-Match')).contains_weak(etag):
+                reponse = Response(status_code=304)
+            else:
+                reponse = await f(request)
+            reponse.headers['ETag'] = f'"{etag}"'
+            if modifie_le:
+                reponse.headers['Last-Modified'] = http_date(modifie_le)
+            reponse.headers['Cache-Control'] = 'no-cache, private'
+            return reponse
+        return decorated_function
+    return decorator
+
+@jwt_required
+@conditionnel(Produit)
+async def api_liste_produits(request):
+    async with Session() as session:
+        produits = await session.scalars(select(Produit))
+        return JSONResponse([produit_json(p) for p in produits])
+
+@jwt_required
+@conditionnel(Produit, StockEmplacement)
+async def api_etat_stocks(request):
+    async with Session() as session:
+        lignes = await session.execute(StockService.requete_etat_stocks())
+        return JSONResponse([stock_json(p, stock) for p, stock in lignes])
+
+@jwt_required
+@conditionnel(MouvementStock, Produit)
+async def api_mouvements_stock(request):
+    async with Session() as session:
+        mouvements = await session.scalars(
+            select(MouvementStock).options(joinedload(MouvementStock.produit))
+            .order_by(MouvementStock.date_mouvement.desc()).limit(50)
+        )
+        return JSONResponse([mouvement_json(m) for m in mouvements])
+
+@jwt_required
+@conditionnel(Produit)
+async def api_stocks_bas(request):
+    async with Session() as session:
+        produits = await session.scalars(StockService.requete_produits_stock_bas())
+        return JSONResponse([stock_bas_json(p) for p in produits])
+
+@jwt_required
+@conditionnel(Vente, Produit, Client)
+async def api_liste_ventes(request):
+    async with Session() as session:
+        ventes = await session.scalars(
+            select(VenteComplete).options(joinedload(VenteComplete.produit), joinedload(VenteComplete.client))
+            .order_by(VenteComplete.date_vente.desc())
+        )
+        return JSONResponse([vente_json(v) for v in ventes])
+
+@jwt_required
+async def api_stats_ventes(request):
+    periode = request.query_params.get('periode', 'mensuel')
+    async with Session() as session:
+        stats = await session.execute(VenteService.requete_statistiques_par_periode(periode))
+        return JSONResponse(VenteService.formater_statistiques_par_periode(stats))
+
+@jwt_required
+async def api_stats_financiers(request):
+    async with Session() as session:
+        valeurs = {nom: (await session.execute(requete)).scalar()
+                   for nom, requete in VenteService.requetes_statistiques_financieres().items()}
+        return JSONResponse(VenteService.formater_statistiques_financieres(valeurs))
+
+@jwt_required
+@conditionnel(Reservation, Produit, Client)
+async def api_liste_reservations(request):
+    async with Session() as session:
+        reservations = await session.scalars(
+            select(Reservation).options(joinedload(Reservation.produit), joinedload(Reservation.client))
+            .order_by(Reservation.date_reservation.desc())
+        )
+        return JSONResponse([reservation_json(r) for r in reservations])
+
+@asynccontextmanager
+async def cycle_de_vie(application):
+    yield
+    await moteur.dispose()
+
+# Les autres méthodes sur ces chemins (POST, PUT...) retombent sur Flask
+application = Starlette(
+    routes=[
+        Route('/api/produits', api_liste_produits, methods=['GET']),
+        Route('/api/stocks', api_etat_stocks, methods=['GET']),
+        Route('/api/stocks/mouvements', api_mouvements_stock, methods=['GET']),
+        Route('/api/stocks/bas', api_stocks_bas, methods=['GET']),
+        Route('/api/ventes', api_liste_ventes, methods=['GET']),
+        Route('/api/ventes/stats', api_stats_ventes, methods=['GET']),
+        Route('/api/ventes/financiers', api_stats_financiers, methods=['GET']),
+        Route('/api/reservations', api_liste_reservations, methods=['GET']),
+        Mount('/', app=WSGIMiddleware(app)),
+    ],
+    lifespan=cycle_de_vie,
+    # Les réponses Flask déjà compressées (Content-Encoding) ne sont pas recompressées
+    middleware=[Middleware(GZipMiddleware, minimum_size=app.config['COMPRESSION_MIN_TAILLE'] or 2 ** 31)],
+)
@@ -0,0 +1,93 @@
+import gzip
+import json
+import mimetypes
+import os
+from flask import request, current_app, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # brotli facultatif: gzip seul
+    brotli = None
+
+DOSSIER_BUILD = 'build'
+UN_AN = 365 * 24 * 3600
+TYPES_COMPRESSIBLES = {'text/html', 'application/json', 'text/csv'}
+
+class AssetsService:
+    """Fichiers statiques construits par build_assets.py et compression des réponses
+
+    - url_for('static', filename='css/custom.css') pointe vers la version à
+      empreinte si static/build/manifest.json existe (sinon fichier d'origine)
+    - les fichiers à empreinte sont servis précompressés (br, gzip) avec
+      Cache-Control: immutable
+    - les réponses HTML, JSON et CSV de plus de COMPRESSION_MIN_TAILLE octets
+      sont compressées à la volée
+    """
+    manifeste = {}
+
+    @staticmethod
+    def init_app(app):
+        chemin = os.path.join(app.static_folder, DOSSIER_BUILD, 'manifest.json')
+        if os.path.exists(chemin):
+            with open(chemin, encoding='utf-8') as f:
+                AssetsService.manifeste = json.load(f)
+
+        app.url_defaults(AssetsService._url_statique)
+        app.view_functions['static'] = AssetsService.servir_statique
+
+        if app.config.get('COMPRESSION_MIN_TAILLE'):
+            app.after_request(AssetsService.compresser)
+
+    @staticmethod
+    def _url_statique(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in AssetsService.manifeste:
+            values['filename'] = AssetsService.manifeste[values['filename']]
+
+    @staticmethod
+    def servir_statique(filename):
+        if not filename.startswith(DOSSIER_BUILD + '/'):
+            return current_app.send_static_file(filename)
+
+        dossier = current_app.static_folder
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encodage, extension in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[encodage] and os.path.exists(os.path.join(dossier, filename + extension)):
+                reponse = send_from_directory(dossier, filename + extension, mimetype=mimetype)
+                reponse.content_encoding = encodage
+                break
+        else:
+            reponse = send_from_directory(dossier, filename, mimetype=mimetype)
+
+        # Le nom change avec le contenu: le navigateur ne revalide jamais
+        reponse.vary.add('Accept-Encoding')
+        reponse.cache_control.no_cache = None
+        reponse.cache_control.public = True
+        reponse.cache_control.max_age = UN_AN
+        reponse.cache_control.immutable = True
+        return reponse
+
+    @staticmethod
+    def compresser(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in TYPES_COMPRESSIBLES):
+            return response
+
+        donnees = response.get_data()
+        if len(donnees) < current_app.config['COMPRESSION_MIN_TAILLE']:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if brotli is not None and request.accept_encodings['br']:
+            response.set_data(brotli.compress(donnees, quality=4))
+            response.content_encoding = 'br'
+        elif request.accept_encodings['gzip']:
+            response.set_data(gzip.compress(donnees, compresslevel=6))
+            response.content_encoding = 'gzip'
+        else:
+            return response
+
+        # Le corps compressé n'est plus identique octet pour octet: ETag faible
+        etag, faible = response.get_etag()
+        if etag and not faible:
+            response.set_etag(etag, weak=True)
+        return response
@@ -2,6 +2,7 @@ from functools import wraps
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from services.auth_service import AuthService
+from services.password_service import AuthentificationSaturee
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -26,11 +27,16 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
-        user = AuthService.authenticate_user(username, password)
+        try:
+            user = AuthService.authenticate_user(username, password)
+        except AuthentificationSaturee as e:
+            flash(str(e), 'error')
+            return render_template('login.html'), 503
+        
         if user:
             session['user_id'] = user.id
             session['username'] = user.username
-            access_token = create_access_token(identity=user.id)
+            access_token = create_access_token(identity=str(user.id))
             session['access_token'] = access_token
             flash('Connexion réussie', 'success')
             return redirect(url_for('dashboard.dashboard'))
@@ -65,9 +71,13 @@ def api_login():
     username = request.json.get('username')
     password = request.json.get('password')
     
-    user = AuthService.authenticate_user(username, password)
+    try:
+        user = AuthService.authenticate_user(username, password)
+    except AuthentificationSaturee as e:
+        return {'message': str(e)}, 503, {'Retry-After': '1'}
+    
     if user:
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=str(user.id))
         return {'access_token': access_token, 'user_id': user.id}
     
     return {'message': 'Invalid credentials'}, 401
@@ -1,4 +1,8 @@
+import logging
 from models import User, db
+from services.password_service import PasswordService
+
+logger = logging.getLogger(__name__)
 
 class AuthService:
     @staticmethod
@@ -23,7 +27,16 @@ class AuthService:
     def authenticate_user(username, password):
         """Authentifier un utilisateur"""
         user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        if user and PasswordService.verifier_hors_thread(user.password_hash, password):
+            # Mettre à niveau le hachage stocké si la politique a changé
+            if PasswordService.doit_rehacher(user.password_hash):
+                try:
+                    user.password_hash = PasswordService.hacher_hors_thread(password)
+                    db.session.commit()
+                except Exception as e:
+                    # La connexion reste valide: le hachage sera mis à niveau à la prochaine
+                    db.session.rollback()
+                    logger.warning("Mise à niveau du hachage de %s impossible: %s", user.username, e)
             return user
         return None
     
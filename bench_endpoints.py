@@ -0,0 +1,147 @@
+"""Benchmark des endpoints principaux sur une base peuplée par seed_data.py.
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python bench_endpoints.py
+    DATABASE_URL=postgresql://localhost/ruine_bench python bench_endpoints.py --repetitions 50
+    python bench_endpoints.py --enregistrer          # fixe la référence
+    python bench_endpoints.py --scenarios dashboard api_ventes_post
+
+Chaque scénario est joué via le client de test Flask (sans réseau). On
+mesure p50/p95/p99 et le nombre de requêtes SQL par appel, puis on
+compare le p95 à la référence enregistrée dans bench_baseline.json pour
+le même dialecte. Le code de sortie vaut 1 si un scénario régresse au-delà
+de la tolérance.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+os.environ.setdefault("SCHEDULER_MODE", "off")
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, select, func
+from app import app, db
+from models import Produit, Client, User
+
+FICHIER_REFERENCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+def scenarios(rng, produits, termes_produits, termes_clients):
+    """Scénarios: nom -> (méthode, url ou fabrique d'url, corps JSON, authentification)"""
+    aujourd_hui = datetime.now().strftime('%Y-%m-%d')
+    return {
+        'dashboard': ('GET', '/dashboard', None, 'session'),
+        'api_ventes_get': ('GET', '/api/ventes', None, 'jwt'),
+        'api_ventes_post': ('POST', '/api/ventes',
+                            lambda: {'produit_id': rng.choice(produits), 'quantite': 1}, 'jwt'),
+        'api_ventes_stats': ('GET', '/api/ventes/stats?periode=mensuel', None, 'jwt'),
+        'api_ventes_financiers': ('GET', '/api/ventes/financiers', None, 'jwt'),
+        'export_csv_ventes': ('GET', f'/exports/download/csv/sales/{aujourd_hui}', None, 'session'),
+        'recherche_produits': ('GET', lambda: f'/produits?search={rng.choice(termes_produits)}', None, 'session'),
+        'recherche_clients': ('GET', lambda: f'/clients?search={rng.choice(termes_clients)}', None, 'session'),
+    }
+
+def percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    rang = min(len(valeurs) - 1, max(0, round(p / 100 * len(valeurs) + 0.5) - 1))
+    return valeurs[rang]
+
+def jouer(client, scenario, repetitions, jeton, compteur):
+    methode, url, corps, authentification = scenario
+    entetes = {'Authorization': f'Bearer {jeton}'} if authentification == 'jwt' else {}
+    durees, requetes, erreurs = [], [], 0
+    for _ in range(repetitions):
+        compteur[0] = 0
+        debut = time.perf_counter()
+        reponse = client.open(
+            url() if callable(url) else url,
+            method=methode,
+            json=corps() if callable(corps) else corps,
+            headers=entetes
+        )
+        durees.append(time.perf_counter() - debut)
+        requetes.append(compteur[0])
+        if reponse.status_code >= 400:
+            erreurs += 1
+    return {
+        'p50': percentile(durees, 50) * 1000,
+        'p95': percentile(durees, 95) * 1000,
+        'p99': percentile(durees, 99) * 1000,
+        'requetes_sql': statistics.mean(requetes),
+        'erreurs': erreurs,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des endpoints principaux")
+    parser.add_argument('--repetitions', type=int, default=20)
+    parser.add_argument('--scenarios', nargs='*')
+    parser.add_argument('--enregistrer', action='store_true', help="enregistrer les résultats comme référence")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="régression p95 tolérée (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    app.config['TESTING'] = True
+    compteur = [0]
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: compteur.__setitem__(0, compteur[0] + 1))
+        dialecte = db.engine.dialect.name
+        utilisateur = db.session.scalars(select(User.id)).first()
+        jeton = create_access_token(identity=str(utilisateur))
+        produits = list(db.session.scalars(
+            select(Produit.id).where(Produit.stock > 1000).order_by(func.random()).limit(500)
+        ))
+        termes_produits = [n.split()[0][:3] for n in db.session.scalars(select(Produit.nom).limit(50))] or ['a']
+        termes_clients = [n.split()[-1][:4] for n in db.session.scalars(select(Client.nom).limit(50))] or ['a']
+
+    if not produits:
+        sys.exit("Aucun produit avec du stock: lancer d'abord seed_data.py")
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = utilisateur
+
+    tous = scenarios(rng, produits, termes_produits, termes_clients)
+    noms = args.scenarios or list(tous)
+
+    reference = {}
+    if os.path.exists(FICHIER_REFERENCE):
+        with open(FICHIER_REFERENCE, encoding='utf-8') as f:
+            reference = json.load(f).get(dialecte, {})
+
+    resultats = {}
+    regressions = []
+    print(f"Dialecte: {dialecte}, {args.repetitions} répétitions")
+    print(f"{'Scénario':<24} {'p50':>9} {'p95':>9} {'p99':>9} {'SQL':>6} {'err':>4} {'vs réf.':>9}")
+    for nom in noms:
+        mesure = jouer(client, tous[nom], args.repetitions, jeton, compteur)
+        resultats[nom] = mesure
+        comparaison = ''
+        if nom in reference:
+            ecart = mesure['p95'] / reference[nom]['p95'] - 1
+            comparaison = f"{ecart:+.0%}"
+            if ecart > args.tolerance:
+                regressions.append(nom)
+        print(f"{nom:<24} {mesure['p50']:>7.1f}ms {mesure['p95']:>7.1f}ms {mesure['p99']:>7.1f}ms "
+              f"{mesure['requetes_sql']:>6.1f} {mesure['erreurs']:>4} {comparaison:>9}")
+
+    if args.enregistrer:
+        toutes = {}
+        if os.path.exists(FICHIER_REFERENCE):
+            with open(FICHIER_REFERENCE, encoding='utf-8') as f:
+                toutes = json.load(f)
+        toutes.setdefault(dialecte, {}).update(resultats)
+        with open(FICHIER_REFERENCE, 'w', encoding='utf-8') as f:
+            json.dump(toutes, f, indent=2, sort_keys=True)
+        print(f"Référence enregistrée dans {FICHIER_REFERENCE}")
+
+    if regressions:
+        print(f"Régressions au-delà de {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
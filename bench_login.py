@@ -0,0 +1,64 @@
+"""Benchmark des connexions par seconde et par worker.
+
+Usage: python bench_login.py [nombre_de_connexions] [threads]
+
+Mesure /api/auth/login pour chaque politique de hachage, en séquentiel
+(worker sync) puis avec plusieurs threads (worker gthread), sur une base
+SQLite temporaire.
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_login.db"))
+
+from app import app, db
+from models import User
+
+POLITIQUES = [
+    ('scrypt', 32768),
+    ('scrypt', 16384),
+    ('pbkdf2:sha256', 600000),
+    ('pbkdf2:sha256', 100000),
+    ('bcrypt', 12),
+    ('bcrypt', 10),
+]
+
+def mesurer(client, nombre, threads):
+    """Retourner le nombre de connexions réussies par seconde"""
+    def connexion(_):
+        reponse = client.post('/api/auth/login', json={'username': 'bench', 'password': 'bench-motdepasse'})
+        return reponse.status_code == 200
+
+    debut = time.perf_counter()
+    if threads == 1:
+        reussies = sum(connexion(i) for i in range(nombre))
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executeur:
+            reussies = sum(executeur.map(connexion, range(nombre)))
+    return reussies / (time.perf_counter() - debut)
+
+def main():
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    client = app.test_client()
+
+    print(f"{'Politique':<24} {'séquentiel':>12} {f'{threads} threads':>12}")
+    for methode, cout in POLITIQUES:
+        app.config['PASSWORD_HASH_METHOD'] = methode
+        app.config['PASSWORD_HASH_COST'] = cout
+        with app.app_context():
+            User.query.filter_by(username='bench').delete()
+            user = User(username='bench')
+            user.set_password('bench-motdepasse')
+            db.session.add(user)
+            db.session.commit()
+
+        sequentiel = mesurer(client, nombre, 1)
+        parallele = mesurer(client, nombre, threads)
+        print(f"{methode + ':' + str(cout):<24} {sequentiel:>10.1f}/s {parallele:>10.1f}/s")
+
+if __name__ == '__main__':
+    main()
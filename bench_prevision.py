@@ -0,0 +1,130 @@
+"""Benchmark du planificateur de réapprovisionnement (PrevisionService) sur un gros catalogue.
+
+Usage: python bench_prevision.py [--produits 50000] [--ventes 2000000] [--jours 730]
+
+Crée une base SQLite temporaire (produits, ventes réparties sur l'historique
+avec une popularité de Zipf), puis mesure séparément la lecture groupée de
+l'historique, le calcul vectorisé et l'écriture des seuils. Les résultats
+d'un échantillon de produits sont comparés à un calcul naïf, produit par
+produit et jour par jour.
+"""
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+
+DOSSIER = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DOSSIER, 'bench.db')}"
+os.environ.setdefault("STARTUP_MODE", "release")
+os.environ.setdefault("SCHEDULER_MODE", "off")
+
+import numpy as np
+from sqlalchemy import insert, select
+from app import app, db
+from models import Produit, Vente
+from services.prevision_service import PrevisionService
+
+PARAMETRES = {'delai': 7, 'couverture': 14, 'niveau_service': 0.95, 'methode': 'lissage',
+              'historique': 730, 'fenetre': 56, 'alpha': 0.1}
+
+def preparer(args, aujourd_hui):
+    rng = random.Random(42)
+    debut = datetime.combine(aujourd_hui, datetime.min.time()) - timedelta(days=args.jours)
+    db.create_all()
+    db.session.execute(insert(Produit), [
+        {'nom': f"Produit {i}", 'prix_achat': 1000, 'prix_unitaire': 1500, 'stock': rng.randint(0, 200),
+         'seuil_alerte': 10, 'created_at': debut + timedelta(days=rng.choice([0, 0, 0, rng.randint(0, args.jours)]))}
+        for i in range(args.produits)
+    ])
+    poids = [1 / (rang + 1) for rang in range(args.produits)]
+    cumul = list(np.cumsum(poids))
+    lot = []
+    for _ in range(args.ventes):
+        produit_id = rng.choices(range(1, args.produits + 1), cum_weights=cumul)[0]
+        quantite = max(1, int(rng.expovariate(0.4)))
+        lot.append({'produit_id': produit_id, 'quantite': quantite, 'prix_unitaire': 1500,
+                    'total': 1500 * quantite,
+                    'date_vente': debut + timedelta(seconds=rng.randrange(args.jours * 86400))})
+        if len(lot) == 100_000:
+            db.session.execute(insert(Vente), lot)
+            lot = []
+    if lot:
+        db.session.execute(insert(Vente), lot)
+    db.session.commit()
+
+def calcul_naif(produit, ventes, aujourd_hui):
+    """Même planification, jour par jour, pour un seul produit"""
+    p = PARAMETRES
+    fin = datetime.combine(aujourd_hui, datetime.min.time())
+    debut = fin - timedelta(days=p['historique'])
+    serie = [0.0] * p['historique']
+    premier = min(max((produit.created_at - debut).days, 0), p['historique'] - 1)
+    for v in ventes:
+        if debut <= v.date_vente < fin:
+            jour = (v.date_vente - debut).days
+            serie[jour] += v.quantite
+            premier = min(premier, jour)
+    serie = serie[premier:]
+    fenetre = serie[-p['fenetre']:]
+    moyenne = sum(fenetre) / len(fenetre)
+    ecart_type = math.sqrt(max(sum(x * x for x in fenetre) / len(fenetre) - moyenne ** 2, 0))
+    niveau, poids_total = 0.0, 0.0
+    for x in serie:
+        niveau = p['alpha'] * x + (1 - p['alpha']) * niveau
+        poids_total = p['alpha'] + (1 - p['alpha']) * poids_total
+    demande = niveau / poids_total
+    securite = NormalDist().inv_cdf(p['niveau_service']) * ecart_type * math.sqrt(p['delai'])
+    return math.ceil(demande * p['delai'] + securite), math.ceil(demande * (p['delai'] + p['couverture']) + securite)
+
+def main():
+    parser = argparse.ArgumentParser(description="Planificateur de réapprovisionnement")
+    parser.add_argument('--produits', type=int, default=50000)
+    parser.add_argument('--ventes', type=int, default=2000000)
+    parser.add_argument('--jours', type=int, default=730)
+    parser.add_argument('--echantillon', type=int, default=200)
+    args = parser.parse_args()
+    PARAMETRES['historique'] = args.jours
+    aujourd_hui = date.today()
+
+    with app.app_context():
+        debut = time.perf_counter()
+        preparer(args, aujourd_hui)
+        print(f"Données: {args.produits} produits, {args.ventes} ventes sur {args.jours} jours "
+              f"({time.perf_counter() - debut:.1f}s)")
+
+        fin = datetime.combine(aujourd_hui, datetime.min.time())
+        debut_historique = fin - timedelta(days=args.jours)
+        debut = time.perf_counter()
+        produits = db.session.execute(
+            select(Produit.id, Produit.stock, Produit.created_at).order_by(Produit.id)
+        ).all()
+        ventes = PrevisionService.lire_historique(debut_historique, fin)
+        print(f"Lecture groupée:   {time.perf_counter() - debut:6.2f}s ({len(ventes[0])} lignes produit × jour)")
+
+        debut = time.perf_counter()
+        plan = PrevisionService.calculer(produits, ventes, debut_historique, **PARAMETRES)
+        print(f"Calcul vectorisé:  {time.perf_counter() - debut:6.2f}s")
+
+        debut = time.perf_counter()
+        ecrits = PrevisionService.appliquer(plan)
+        print(f"Écriture:          {time.perf_counter() - debut:6.2f}s ({ecrits} produits)")
+
+        rng = random.Random(7)
+        ecarts = 0
+        echantillon = rng.sample(range(args.produits), min(args.echantillon, args.produits))
+        debut = time.perf_counter()
+        for i in echantillon:
+            produit = db.session.get(Produit, int(plan['ids'][i]))
+            attendu = calcul_naif(produit, Vente.query.filter_by(produit_id=produit.id).all(), aujourd_hui)
+            if attendu != (plan['seuil_alerte'][i], plan['quantite_cible'][i]):
+                ecarts += 1
+        naif = (time.perf_counter() - debut) / len(echantillon)
+        print(f"Calcul naïf:       {naif * 1000:6.1f}ms par produit, soit ~{naif * args.produits:.0f}s pour le catalogue")
+        print(f"Vérification:      {len(echantillon) - ecarts}/{len(echantillon)} produits identiques")
+
+if __name__ == '__main__':
+    main()
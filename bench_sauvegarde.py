@@ -0,0 +1,116 @@
+"""Benchmark de la sauvegarde et de la restauration (SauvegardeService).
+
+Usage: python bench_sauvegarde.py [--produits 20000] [--clients 5000] [--ventes 1000000] [--niveau 6]
+
+Crée une base SQLite temporaire (produits, clients, ventes avec leur
+mouvement de stock), la sauvegarde puis la restaure, et affiche le débit de
+chaque étape en lignes par seconde. La restauration est comparée à un
+chargement dans des tables qui gardent leurs index pendant l'insertion.
+Le contenu restauré est comparé à l'original (nombre de lignes et sommes).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DOSSIER = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DOSSIER, 'bench.db')}"
+os.environ.setdefault("STARTUP_MODE", "release")
+os.environ.setdefault("SCHEDULER_MODE", "off")
+
+from sqlalchemy import insert, select, func
+from app import app, db, initialiser_base
+from models import Produit, Client, Vente, MouvementStock
+from services.sauvegarde_service import SauvegardeService
+
+def preparer(args):
+    rng = random.Random(42)
+    debut = datetime.now() - timedelta(days=365)
+    initialiser_base(app)
+    db.session.execute(insert(Produit), [
+        {'nom': f"Produit {i}", 'prix_achat': 1000, 'prix_unitaire': 1500, 'stock': rng.randint(0, 200),
+         'seuil_alerte': 10, 'stock_bas': False}
+        for i in range(args.produits)
+    ])
+    db.session.execute(insert(Client), [
+        {'nom': f"Client {i}", 'contact': f"034 {i:07d}", 'adresse': f"Lot {i}\tAntananarivo"}
+        for i in range(args.clients)
+    ])
+    for premier in range(0, args.ventes, 100_000):
+        n = min(100_000, args.ventes - premier)
+        ventes = []
+        for i in range(n):
+            quantite = max(1, int(rng.expovariate(0.4)))
+            ventes.append({'id': premier + i + 1, 'produit_id': rng.randint(1, args.produits),
+                           'client_id': rng.choice([None, rng.randint(1, args.clients)]),
+                           'quantite': quantite, 'prix_unitaire': 1500, 'total': 1500 * quantite,
+                           'date_vente': debut + timedelta(seconds=rng.randrange(365 * 86400))})
+        db.session.execute(insert(Vente), ventes)
+        db.session.execute(insert(MouvementStock), [
+            {'produit_id': v['produit_id'], 'type_mouvement': 'sortie', 'quantite': v['quantite'],
+             'motif': 'Vente', 'date_mouvement': v['date_vente'], 'vente_id': v['id'],
+             'cout_fifo': 1000 * v['quantite'], 'cout_cmp': 1000 * v['quantite']}
+            for v in ventes
+        ])
+    db.session.commit()
+
+def empreinte():
+    """Nombre de lignes et sommes de contrôle des tables principales"""
+    return (
+        db.session.scalar(select(func.count()).select_from(Produit)),
+        db.session.scalar(select(func.count()).select_from(Client)),
+        db.session.execute(select(func.count(), func.sum(Vente.total), func.sum(Vente.client_id))).one(),
+        db.session.execute(select(func.count(), func.sum(MouvementStock.cout_fifo))).one(),
+        db.session.scalar(select(func.count()).where(Client.adresse.contains('\t'))),
+    )
+
+def restaurer_index_maintenus(fichier):
+    """Même chargement, index créés avant l'insertion (référence)"""
+    ddl_tables, ddl_index = SauvegardeService._ddl_tables, SauvegardeService._ddl_index
+    SauvegardeService._ddl_tables = staticmethod(lambda dialecte: ddl_tables(dialecte) + ddl_index(dialecte)[:-1])
+    SauvegardeService._ddl_index = staticmethod(lambda dialecte: ["ANALYZE"])
+    try:
+        return SauvegardeService.restaurer(fichier)
+    finally:
+        SauvegardeService._ddl_tables, SauvegardeService._ddl_index = ddl_tables, ddl_index
+
+def main():
+    parser = argparse.ArgumentParser(description="Sauvegarde et restauration")
+    parser.add_argument('--produits', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--ventes', type=int, default=1000000)
+    parser.add_argument('--niveau', type=int, default=6)
+    args = parser.parse_args()
+    fichier = os.path.join(DOSSIER, 'sauvegarde.gz')
+
+    with app.app_context():
+        debut = time.perf_counter()
+        preparer(args)
+        original = empreinte()
+        db.session.remove()
+        taille_base = os.path.getsize(os.path.join(DOSSIER, 'bench.db'))
+        print(f"Données: {args.produits} produits, {args.clients} clients, {args.ventes} ventes et mouvements "
+              f"({time.perf_counter() - debut:.1f}s, base {taille_base / 1e6:.0f} Mo)")
+
+        debut = time.perf_counter()
+        comptes = SauvegardeService.sauvegarder(fichier, args.niveau)
+        duree = time.perf_counter() - debut
+        lignes = sum(comptes.values())
+        print(f"Sauvegarde:        {duree:6.2f}s  {lignes / duree:10.0f} lignes/s  "
+              f"(fichier {os.path.getsize(fichier) / 1e6:.0f} Mo, gzip {args.niveau})")
+
+        for nom, restaurer in (("Restauration", SauvegardeService.restaurer),
+                               ("Index maintenus", restaurer_index_maintenus)):
+            debut = time.perf_counter()
+            resume = restaurer(fichier)
+            duree = time.perf_counter() - debut
+            print(f"{nom + ':':<18} {duree:6.2f}s  {lignes / duree:10.0f} lignes/s  "
+                  f"(chargement {resume['chargement']:.2f}s, index {resume['index']:.2f}s)")
+            db.session.remove()
+            print(f"Vérification:      {'identique' if empreinte() == original else 'DIFFÉRENT'}")
+            db.session.remove()
+
+if __name__ == '__main__':
+    main()
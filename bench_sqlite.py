@@ -0,0 +1,124 @@
+"""Benchmark des écritures concurrentes sur SQLite: réglages par défaut contre profil production.
+
+Usage: python bench_sqlite.py [--ecrivains 4] [--lecteurs 2] [--duree 10]
+
+Chaque écrivain est un processus distinct (comme un worker gunicorn) qui
+enregistre des ventes en boucle: lecture du produit, décrément du stock,
+insertion de la vente et du mouvement, commit. Les lecteurs agrègent le
+chiffre d'affaires comme le tableau de bord. On compare ventes validées
+par seconde, latence et erreurs « database is locked » entre le mode
+journal par défaut et WAL + pragmas de app.pragmas_sqlite().
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("STARTUP_MODE", "release")
+os.environ.setdefault("SCHEDULER_MODE", "off")
+
+from sqlalchemy import create_engine, insert, select, update, func
+from sqlalchemy.exc import OperationalError
+from app import db, options_moteur, pragmas_sqlite, appliquer_pragmas_sqlite
+from models import Produit, Vente, MouvementStock
+
+NB_PRODUITS = 200
+
+def moteur(url, profil):
+    if profil == 'défaut':
+        return create_engine(url)
+    engine = create_engine(url, **options_moteur(url))
+    appliquer_pragmas_sqlite(engine, pragmas_sqlite())
+    return engine
+
+def ecrivain(url, profil, fin, file_resultats):
+    engine = moteur(url, profil)
+    rng = random.Random(os.getpid())
+    durees, erreurs = [], 0
+    while time.time() < fin:
+        produit_id = rng.randint(1, NB_PRODUITS)
+        debut = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                prix = conn.execute(select(Produit.prix_unitaire).where(Produit.id == produit_id)).scalar_one()
+                conn.execute(update(Produit).where(Produit.id == produit_id).values(stock=Produit.stock - 1))
+                conn.execute(insert(Vente).values(produit_id=produit_id, quantite=1, prix_unitaire=prix,
+                                                  total=prix, date_vente=datetime.now()))
+                conn.execute(insert(MouvementStock).values(produit_id=produit_id, type_mouvement='sortie',
+                                                           quantite=1, motif='Vente',
+                                                           date_mouvement=datetime.now()))
+        except OperationalError:
+            erreurs += 1
+            continue
+        durees.append(time.perf_counter() - debut)
+    file_resultats.put(('ecriture', durees, erreurs))
+
+def lecteur(url, profil, fin, file_resultats):
+    engine = moteur(url, profil)
+    lectures, erreurs = 0, 0
+    while time.time() < fin:
+        try:
+            with engine.connect() as conn:
+                conn.execute(select(func.sum(Vente.total), func.count(Vente.id))).one()
+            lectures += 1
+        except OperationalError:
+            erreurs += 1
+    file_resultats.put(('lecture', lectures, erreurs))
+
+def preparer(chemin):
+    url = f"sqlite:///{chemin}"
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Produit), [
+            {'nom': f"Produit {i}", 'prix_achat': 1000, 'prix_unitaire': 1500, 'stock': 10 ** 6,
+             'seuil_alerte': 10, 'created_at': datetime.now()}
+            for i in range(NB_PRODUITS)
+        ])
+    engine.dispose()
+    return url
+
+def jouer(profil, args):
+    with tempfile.TemporaryDirectory() as dossier:
+        url = preparer(os.path.join(dossier, 'bench.db'))
+        file_resultats = multiprocessing.Queue()
+        fin = time.time() + args.duree
+        processus = (
+            [multiprocessing.Process(target=ecrivain, args=(url, profil, fin, file_resultats))
+             for _ in range(args.ecrivains)] +
+            [multiprocessing.Process(target=lecteur, args=(url, profil, fin, file_resultats))
+             for _ in range(args.lecteurs)]
+        )
+        for p in processus:
+            p.start()
+        resultats = [file_resultats.get() for _ in processus]
+        for p in processus:
+            p.join()
+
+    durees = sorted(d for genre, d_, _ in resultats if genre == 'ecriture' for d in d_)
+    erreurs_ecriture = sum(e for genre, _, e in resultats if genre == 'ecriture')
+    lectures = sum(n for genre, n, _ in resultats if genre == 'lecture')
+    erreurs_lecture = sum(e for genre, _, e in resultats if genre == 'lecture')
+    p = lambda q: durees[min(len(durees) - 1, int(q * len(durees)))] * 1000 if durees else float('nan')
+    print(f"{profil:<12} {len(durees) / args.duree:>9.0f}/s {p(0.5):>7.1f}ms {p(0.95):>7.1f}ms "
+          f"{p(0.99):>7.1f}ms {erreurs_ecriture:>8} {lectures / args.duree:>9.0f}/s {erreurs_lecture:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Écritures concurrentes SQLite")
+    parser.add_argument('--ecrivains', type=int, default=4)
+    parser.add_argument('--lecteurs', type=int, default=2)
+    parser.add_argument('--duree', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"SQLite {sqlite3.sqlite_version}, {args.ecrivains} écrivains, {args.lecteurs} lecteurs, {args.duree:.0f}s")
+    print(f"{'Profil':<12} {'ventes':>11} {'p50':>9} {'p95':>9} {'p99':>9} {'verrous':>8} "
+          f"{'lectures':>11} {'verrous':>8}")
+    for profil in ('défaut', 'production'):
+        jouer(profil, args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark du temps de démarrage d'un worker.
+
+Usage: python bench_startup.py [répétitions]
+
+Mesure, dans des processus neufs, le temps d'import de `main` selon le
+mode de démarrage, et vérifie que reportlab n'est pas chargé au boot.
+Pour le détail par module: python -X importtime -c "import main".
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SCRIPT = (
+    "import sys, time\n"
+    "debut = time.perf_counter()\n"
+    "import main\n"
+    "print(time.perf_counter() - debut, 'reportlab' in sys.modules)\n"
+)
+
+MODES = [
+    ('auto (schéma + utilisateur au boot)', {'STARTUP_MODE': 'auto'}),
+    ('release (rien au boot)', {'STARTUP_MODE': 'release'}),
+]
+
+def mesurer(env_mode, repetitions):
+    durees = []
+    reportlab = False
+    for _ in range(repetitions):
+        env = dict(os.environ, SCHEDULER_MODE='off', **env_mode)
+        sortie = subprocess.run(
+            [sys.executable, '-c', SCRIPT], env=env, capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip().splitlines()[-1]
+        duree, charge = sortie.split()
+        durees.append(float(duree))
+        reportlab = reportlab or charge == 'True'
+    return durees, reportlab
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_startup.db"))
+
+    print(f"{'Mode':<38} {'médiane':>9} {'min':>9} {'reportlab':>10}")
+    for libelle, env_mode in MODES:
+        durees, reportlab = mesurer(env_mode, repetitions)
+        print(f"{libelle:<38} {statistics.median(durees) * 1000:>7.0f}ms "
+              f"{min(durees) * 1000:>7.0f}ms {'chargé' if reportlab else 'non':>10}")
+
+if __name__ == '__main__':
+    main()
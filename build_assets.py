@@ -0,0 +1,68 @@
+"""Construction des fichiers statiques: empreinte de contenu et précompression.
+
+Usage: python build_assets.py   (étape de build, avant le démarrage)
+
+Pour chaque fichier CSS/JS de static/, écrit dans static/build/ une copie
+nommée d'après son empreinte (custom.3f9c2a1b7e4d.css) avec ses variantes
+.gz et .br, puis static/build/manifest.json. AssetsService réécrit alors
+les url_for('static', ...) des templates vers ces fichiers, servis avec
+Cache-Control: immutable.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RACINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+BUILD = os.path.join(RACINE, 'build')
+EXTENSIONS = ('.css', '.js')
+
+def sources():
+    for dossier, sous_dossiers, fichiers in os.walk(RACINE):
+        if os.path.abspath(dossier).startswith(BUILD):
+            continue
+        for fichier in sorted(fichiers):
+            if fichier.endswith(EXTENSIONS):
+                chemin = os.path.join(dossier, fichier)
+                yield os.path.relpath(chemin, RACINE).replace(os.sep, '/'), chemin
+
+def main():
+    if os.path.isdir(BUILD):
+        shutil.rmtree(BUILD)
+    manifeste = {}
+    for relatif, chemin in sources():
+        with open(chemin, 'rb') as f:
+            contenu = f.read()
+        base, extension = os.path.splitext(relatif)
+        cible = f"{base}.{hashlib.sha256(contenu).hexdigest()[:12]}{extension}"
+        destination = os.path.join(BUILD, cible)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        with open(destination, 'wb') as f:
+            f.write(contenu)
+        # mtime=0: archive identique d'un build à l'autre
+        compresse = gzip.compress(contenu, compresslevel=9, mtime=0)
+        with open(destination + '.gz', 'wb') as f:
+            f.write(compresse)
+        tailles = f"gzip {len(compresse)}"
+        if brotli is not None:
+            compresse = brotli.compress(contenu, quality=11)
+            with open(destination + '.br', 'wb') as f:
+                f.write(compresse)
+            tailles += f", br {len(compresse)}"
+
+        manifeste[relatif] = f"build/{cible}"
+        print(f"{relatif} -> build/{cible} ({len(contenu)} octets, {tailles})")
+
+    os.makedirs(BUILD, exist_ok=True)
+    with open(os.path.join(BUILD, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifeste, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
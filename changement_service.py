@@ -0,0 +1,124 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, insert, delete, inspect, func, tuple_
+from models import Vente, MouvementStock, Produit, Client, Reservation, Livraison, Changement, db
+from services.replica_service import SessionRoutee
+
+class ChangementService:
+    """Outbox des écritures sur les ventes, mouvements, produits, clients, réservations et livraisons
+
+    Après chaque flush, les objets ajoutés, modifiés ou supprimés de ces
+    tables sont inscrits dans Changement sur la même connexion: le journal
+    est validé ou annulé avec l'écriture. Les écritures en masse
+    (db.session.execute) déclarent leurs lignes avec enregistrer(). Les
+    étapes d'init-db et seed_data.py ne sont pas journalisées.
+
+    Le curseur est (transaction, id). Sous PostgreSQL, deux transactions
+    peuvent valider leurs lignes dans le désordre des id: lire() ne rend que
+    les lignes des transactions terminées avant la plus ancienne encore en
+    cours, triées par transaction. Aucune ligne ne peut alors apparaître
+    derrière un curseur déjà rendu; une transaction longue retarde le flux
+    sans y faire de trou. SQLite sérialise les écritures: l'ordre des id suffit.
+    """
+    MODELES = (Vente, MouvementStock, Produit, Client, Reservation, Livraison)
+    _ecouteur_installe = False
+
+    @staticmethod
+    def init_app(app):
+        if not ChangementService._ecouteur_installe:
+            event.listen(SessionRoutee, 'after_flush', ChangementService._apres_flush)
+            ChangementService._ecouteur_installe = True
+
+    @staticmethod
+    def enregistrer(session, modele, operation, lignes):
+        """Journaliser une écriture en masse: lignes = dicts avec 'id' et les colonnes écrites"""
+        ChangementService._inscrire(session, [
+            (modele.__tablename__, operation, ligne['id'], {c: v for c, v in ligne.items() if c != 'id'})
+            for ligne in lignes
+        ])
+
+    @staticmethod
+    def lire_curseur(curseur):
+        """(transaction, id) d'un curseur rendu par lire() (absent: début du journal)"""
+        if not curseur:
+            return 0, 0
+        try:
+            transaction, dernier = curseur.split('-')
+            return int(transaction), int(dernier)
+        except ValueError:
+            raise ValueError("Curseur invalide")
+
+    @staticmethod
+    def lire(curseur=None, limite=500, tables=None):
+        """Changements suivant le curseur: (changements, curseur suivant, encore)"""
+        transaction, dernier = ChangementService.lire_curseur(curseur)
+        requete = select(Changement).where(
+            tuple_(Changement.transaction_id, Changement.id) > tuple_(transaction, dernier)
+        )
+        if tables:
+            requete = requete.where(Changement.table_nom.in_(tables))
+        if db.engine.dialect.name == 'postgresql':
+            # Transactions toutes terminées: plus aucune ligne ne s'insérera avant
+            requete = requete.where(
+                Changement.transaction_id < func.txid_snapshot_xmin(func.txid_current_snapshot())
+            )
+        changements = db.session.scalars(
+            requete.order_by(Changement.transaction_id, Changement.id).limit(limite + 1)
+        ).all()
+
+        encore = len(changements) > limite
+        changements = changements[:limite]
+        if changements:
+            transaction, dernier = changements[-1].transaction_id, changements[-1].id
+        return changements, f"{transaction}-{dernier}", encore
+
+    @staticmethod
+    def purger(jours):
+        """Supprimer les changements de plus de `jours` jours; retourne le nombre supprimé"""
+        try:
+            resultat = db.session.execute(
+                delete(Changement).where(Changement.created_at < datetime.utcnow() - timedelta(days=jours))
+            )
+            db.session.commit()
+            return resultat.rowcount
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def _inscrire(session, changements):
+        if not changements:
+            return
+        connexion = session.connection()
+        requete = insert(Changement)
+        if connexion.dialect.name == 'postgresql':
+            requete = requete.values(transaction_id=func.txid_current())
+        maintenant = datetime.utcnow()
+        connexion.execute(requete, [{
+            'table_nom': table,
+            'operation': operation,
+            'ligne_id': ligne_id,
+            'donnees': json.dumps(donnees, default=str) if donnees else None,
+            'created_at': maintenant
+        } for table, operation, ligne_id, donnees in changements])
+
+    @staticmethod
+    def _apres_flush(session, flush_context):
+        # Historique des attributs encore disponible: colonnes modifiées seulement
+        changements = []
+        for objet in session.new:
+            if isinstance(objet, ChangementService.MODELES):
+                changements.append((objet.__tablename__, 'insert', objet.id, {
+                    a.key: getattr(objet, a.key) for a in inspect(objet).mapper.column_attrs if a.key != 'id'
+                }))
+        for objet in session.dirty:
+            if isinstance(objet, ChangementService.MODELES) and session.is_modified(objet, include_collections=False):
+                etat = inspect(objet)
+                donnees = {a.key: etat.attrs[a.key].value for a in etat.mapper.column_attrs
+                           if etat.attrs[a.key].history.has_changes()}
+                if donnees:
+                    changements.append((objet.__tablename__, 'update', objet.id, donnees))
+        for objet in session.deleted:
+            if isinstance(objet, ChangementService.MODELES):
+                changements.append((objet.__tablename__, 'delete', objet.id, None))
+        ChangementService._inscrire(session, changements)
@@ -0,0 +1,29 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from serializers import changement_json
+from services.changement_service import ChangementService
+
+changements_bp = Blueprint('changements', __name__)
+
+# API Routes
+@changements_bp.route('/api/changes', methods=['GET'])
+@jwt_required()
+def api_changements():
+    """Changements postérieurs au curseur ?after=<curseur> (absent: depuis le début)
+
+    ?tables=vente,produit limite le flux à ces tables. Le curseur renvoyé
+    se passe tel quel à l'appel suivant; encore=true: relire sans attendre.
+    """
+    limite = min(request.args.get('limite', 500, type=int), 5000)
+    tables = [t for t in request.args.get('tables', '').split(',') if t]
+
+    try:
+        changements, curseur, encore = ChangementService.lire(request.args.get('after'), limite, tables)
+    except ValueError as e:
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
+
+    return jsonify({
+        'changes': [changement_json(c) for c in changements],
+        'curseur': curseur,
+        'encore': encore
+    })
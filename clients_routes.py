@@ -1,6 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Client, db
+from sqlalchemy import func
+from models import Client, Vente, VenteComplete, db
+from services.query_profiler_service import query_budget
+from services.version_service import conditionnel
+from services.recherche_service import RechercheService
+from services.tableau_service import TableauService
 
 clients_bp = Blueprint('clients', __name__)
 
@@ -12,16 +17,61 @@ def login_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+# Colonnes triables du tableau (index ix_client_nom_lower, ix_client_created_at)
+COLONNES_TRI = {'nom': func.lower(Client.nom), 'created_at': Client.created_at}
+
+def totaux_achats(client_ids=None):
+    """Total des achats par client (ventes archivées comprises), en une seule requête groupée"""
+    query = db.session.query(VenteComplete.client_id, func.sum(VenteComplete.total))
+    if client_ids is not None:
+        query = query.filter(VenteComplete.client_id.in_(client_ids))
+    return dict(query.group_by(VenteComplete.client_id).all())
+
+def contexte_tableau():
+    """Page de clients demandée et totaux d'achats de ces seuls clients"""
+    search = request.args.get('search', '')
+    query = Client.query
+    if search:
+        query = query.filter(Client.nom.contains(search))
+    
+    clients, tri = TableauService.paginer(query, COLONNES_TRI, 'nom')
+    return {
+        'clients': clients,
+        'tri': tri,
+        'search': search,
+        'totaux_achats': totaux_achats([c.id for c in clients.items])
+    }
+
 @clients_bp.route('/clients')
 @login_required
+@conditionnel(Client, Vente)
 def liste_clients():
-    search = request.args.get('search', '')
-    if search:
-        clients = Client.query.filter(Client.nom.contains(search)).all()
-    else:
-        clients = Client.query.all()
+    return render_template('clients.html', **contexte_tableau())
+
+@clients_bp.route('/clients/tableau')
+@login_required
+@conditionnel(Client, Vente)
+def tableau_clients():
+    """Fragment: tableau seul (changement de page ou de tri)"""
+    return render_template('clients_tableau.html', **contexte_tableau())
+
+@clients_bp.route('/clients/recherche')
+@login_required
+def recherche_clients():
+    """Suggestions par préfixe du nom pour les sélecteurs des formulaires"""
+    terme = request.args.get('q', '').strip()
+    if not terme:
+        return jsonify([])
     
-    return render_template('clients.html', clients=clients, search=search)
+    clients = Client.query.filter(RechercheService.filtre_prefixe(Client.nom, terme)).order_by(
+        func.lower(Client.nom)
+    ).limit(RechercheService.limite(request.args.get('limit', type=int))).all()
+    return jsonify([{
+        'id': c.id,
+        'nom': c.nom,
+        'contact': c.contact,
+        'adresse': c.adresse
+    } for c in clients])
 
 @clients_bp.route('/clients/ajouter', methods=['POST'])
 @login_required
@@ -41,11 +91,13 @@ def ajouter_client():
     try:
         db.session.add(client)
         db.session.commit()
-        flash(f'Client "{nom}" ajouté avec succès', 'success')
     except Exception as e:
         db.session.rollback()
-        flash('Erreur lors de l\'ajout du client', 'error')
+        return TableauService.erreur('Erreur lors de l\'ajout du client', 'clients.liste_clients')
     
+    if TableauService.fragment():
+        return render_template('clients_ligne.html', client=client, totaux_achats={}), 201
+    flash(f'Client "{nom}" ajouté avec succès', 'success')
     return redirect(url_for('clients.liste_clients'))
 
 @clients_bp.route('/clients/modifier/<int:client_id>', methods=['POST'])
@@ -60,11 +112,14 @@ def modifier_client(client_id):
     
     try:
         db.session.commit()
-        flash('Client modifié avec succès', 'success')
     except Exception as e:
         db.session.rollback()
-        flash('Erreur lors de la modification du client', 'error')
+        return TableauService.erreur('Erreur lors de la modification du client', 'clients.liste_clients')
     
+    if TableauService.fragment():
+        return render_template('clients_ligne.html', client=client,
+                             totaux_achats=totaux_achats([client.id]))
+    flash('Client modifié avec succès', 'success')
     return redirect(url_for('clients.liste_clients'))
 
 @clients_bp.route('/clients/supprimer/<int:client_id>', methods=['POST'])
@@ -75,25 +130,27 @@ def supprimer_client(client_id):
     try:
         db.session.delete(client)
         db.session.commit()
-        flash('Client supprimé avec succès', 'success')
     except Exception as e:
         db.session.rollback()
-        flash('Erreur lors de la suppression du client', 'error')
+        return TableauService.erreur('Erreur lors de la suppression du client', 'clients.liste_clients')
     
-    return redirect(url_for('clients.liste_clients'))
+    return TableauService.supprime('Client supprimé avec succès', 'clients.liste_clients')
 
 # API Routes
 @clients_bp.route('/api/clients', methods=['GET'])
+@query_budget(3)
 @jwt_required()
+@conditionnel(Client, Vente)
 def api_liste_clients():
     clients = Client.query.all()
+    totaux = totaux_achats()
     return jsonify([{
         'id': c.id,
         'nom': c.nom,
         'contact': c.contact,
         'adresse': c.adresse,
         'email': c.email,
-        'total_achats': c.total_achats,
+        'total_achats': totaux.get(c.id, 0),
         'created_at': c.created_at.isoformat()
     } for c in clients])
 
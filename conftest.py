@@ -0,0 +1,66 @@
+"""Configuration pytest: application sur une base SQLite temporaire
+
+Les variables d'environnement sont fixées avant l'import de app.py, qui
+crée l'application au chargement. Le profileur SQL est en mode raise: un
+endpoint qui dépasse son @query_budget fait échouer le test. Pas de thread
+de consolidation: les tests appellent EmplacementService.consolider().
+"""
+import os
+import tempfile
+
+import pytest
+
+DOSSIER = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DOSSIER, 'tests.db')}"
+os.environ["STARTUP_MODE"] = "release"
+os.environ["SCHEDULER_MODE"] = "off"
+os.environ["QUERY_PROFILER"] = "raise"
+os.environ["STOCK_CONSOLIDATION"] = "off"
+os.environ["FLUX_DOSSIER"] = os.path.join(DOSSIER, "flux")
+os.environ.pop("DATABASE_REPLICA_URL", None)
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from app import app as application, db, initialiser_base
+from models import User
+
+# Générateur de charge contre un serveur lancé, pas un module de tests
+collect_ignore = ['load_test.py']
+
+def recreer_schema():
+    """Schéma vide, comme après un premier init-db"""
+    with application.app_context():
+        from services.archive_service import ArchiveService
+        with db.engine.begin() as conn:
+            for vue in ArchiveService.VUES:
+                conn.execute(text(f"DROP VIEW IF EXISTS {vue}"))
+        db.session.remove()
+        db.drop_all()
+    initialiser_base(application)
+
+@pytest.fixture
+def app():
+    """Application sur un schéma recréé pour chaque test"""
+    application.config['TESTING'] = True
+    recreer_schema()
+    with application.app_context():
+        yield application
+        db.session.remove()
+
+@pytest.fixture
+def reinitialiser(app):
+    """Repartir d'un schéma vide au cours d'un test (comparaison de deux chemins d'écriture)"""
+    def reinitialiser():
+        db.session.remove()
+        recreer_schema()
+    return reinitialiser
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def entetes(app):
+    """En-têtes de l'API pour l'utilisateur par défaut"""
+    utilisateur = User.query.filter_by(username='admin').first()
+    return {'Authorization': f"Bearer {create_access_token(identity=str(utilisateur.id))}"}
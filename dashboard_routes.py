@@ -1,7 +1,10 @@
+from datetime import datetime
 from flask import Blueprint, render_template, session, redirect, url_for
+from sqlalchemy.orm import joinedload
 from services.vente_service import VenteService
 from services.stock_service import StockService
-from models import Produit, Client, Vente, Livraison
+from services.replica_service import lecture_replica
+from models import Produit, Client, Vente, VenteComplete, Livraison, db
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -14,12 +17,13 @@ def login_required(f):
     return decorated_function
 
 @dashboard_bp.route('/dashboard')
+@lecture_replica
 @login_required
 def dashboard():
     # Statistiques générales
     total_produits = Produit.query.count()
     total_clients = Client.query.count()
-    total_ventes = Vente.query.count()
+    total_ventes = db.session.query(VenteComplete).count()
     livraisons_en_cours = Livraison.query.filter_by(statut='En cours').count()
     
     # Statistiques financières
@@ -29,7 +33,9 @@ def dashboard():
     produits_stock_bas = StockService.get_produits_stock_bas()
     
     # Ventes récentes
-    ventes_recentes = Vente.query.order_by(Vente.date_vente.desc()).limit(5).all()
+    ventes_recentes = Vente.query.options(
+        joinedload(Vente.produit), joinedload(Vente.client)
+    ).order_by(Vente.date_vente.desc()).limit(5).all()
     
     return render_template('dashboard.html', 
                          total_produits=total_produits,
@@ -38,4 +44,7 @@ def dashboard():
                          livraisons_en_cours=livraisons_en_cours,
                          stats_financieres=stats_financieres,
                          produits_stock_bas=produits_stock_bas,
-                         ventes_recentes=ventes_recentes)
+                         ventes_recentes=ventes_recentes,
+                         # Périodes des montants mis à jour par le flux (préfixes de date_vente)
+                         periode_jour=datetime.now().strftime('%Y-%m-%d'),
+                         periode_mois=datetime.now().strftime('%Y-%m'))
@@ -0,0 +1,348 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, select, insert, update, delete, func, exists, literal
+from sqlalchemy.orm import aliased
+from models import Produit, Emplacement, StockEmplacement, VariationStock, MouvementStock, CoucheStock, db
+from services.replica_service import SessionRoutee
+from services.valorisation_service import ValorisationService
+from services.alerte_service import AlerteService
+from services.flux_service import FluxService
+from services.changement_service import ChangementService
+
+logger = logging.getLogger(__name__)
+
+class EmplacementService:
+    """Stock par emplacement (magasins, entrepôt central)
+
+    Une vente ou un mouvement porte sur un emplacement: il verrouille et
+    modifie sa ligne StockEmplacement et ses couches FIFO, et ajoute la
+    variation du total à VariationStock. Les écritures de deux emplacements
+    ne touchent jamais la même ligne. consolider() reporte ensuite les
+    variations sur Produit.stock (total des vues catalogue) dans une courte
+    transaction, puis met à jour le drapeau stock bas et publie les nouveaux
+    totaux; une consolidation manquée est reprise par la suivante.
+
+    La consolidation est hors du chemin des requêtes: une écriture réveille
+    le thread de consolidation du processus (STOCK_CONSOLIDATION=thread), qui
+    regroupe les écritures de STOCK_CONSOLIDATION_DELAI secondes en un seul
+    report; le planificateur reprend chaque minute les variations restées en
+    attente. Produit.stock peut donc retarder de quelques instants: un calcul
+    qui dépend du total exact le lit par stock_total().
+
+    Sans emplacement précisé, une opération porte sur l'emplacement par
+    défaut, créé par init-db avec le stock existant.
+    """
+    LOT_CONSOLIDATION = 500  # produits par requête IN
+    _defaut = None
+    _ecouteur_installe = False
+    _app = None
+    _demande = threading.Event()
+    _thread = None
+    _verrou = threading.Lock()
+
+    @staticmethod
+    def init_app(app):
+        EmplacementService._app = app
+        if not EmplacementService._ecouteur_installe:
+            event.listen(SessionRoutee, 'before_flush', EmplacementService._avant_flush)
+            EmplacementService._ecouteur_installe = True
+
+    @staticmethod
+    def defaut():
+        """Identifiant de l'emplacement par défaut"""
+        if EmplacementService._defaut is None:
+            EmplacementService._defaut = db.session.scalar(
+                select(Emplacement.id).where(Emplacement.par_defaut.is_(True))
+            )
+            if EmplacementService._defaut is None:
+                raise ValueError("Aucun emplacement par défaut (lancer flask --app main init-db)")
+        return EmplacementService._defaut
+
+    @staticmethod
+    def creer_emplacement(nom, type_emplacement='magasin'):
+        try:
+            if type_emplacement not in ('magasin', 'entrepot'):
+                raise ValueError("Type d'emplacement invalide (magasin ou entrepot)")
+            emplacement = Emplacement(nom=nom, type_emplacement=type_emplacement)
+            db.session.add(emplacement)
+            db.session.commit()
+            return emplacement
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def ligne(produit_id, emplacement_id):
+        """Stock du produit dans l'emplacement, verrouillé (ligne créée à zéro au besoin)"""
+        stock = db.session.scalar(
+            select(StockEmplacement).where(
+                StockEmplacement.produit_id == produit_id,
+                StockEmplacement.emplacement_id == emplacement_id
+            ).with_for_update()
+        )
+        if stock is None:
+            if not db.session.get(Emplacement, emplacement_id):
+                raise ValueError("Emplacement non trouvé")
+            stock = StockEmplacement(produit_id=produit_id, emplacement_id=emplacement_id, quantite=0)
+            db.session.add(stock)
+        return stock
+
+    @staticmethod
+    def modifier(stock, variation):
+        """Appliquer une variation au stock d'un emplacement et au journal du total"""
+        stock.quantite += variation
+        db.session.add(VariationStock(produit_id=stock.produit_id, variation=variation))
+
+    @staticmethod
+    def transferer(produit_id, source_id, destination_id, quantite, motif=""):
+        """Déplacer du stock d'un emplacement à un autre (total inchangé)
+
+        Les couches FIFO suivent la marchandise avec leur coût d'origine.
+        """
+        try:
+            if source_id == destination_id:
+                raise ValueError("Emplacements source et destination identiques")
+            if quantite <= 0:
+                raise ValueError("Quantité invalide")
+            produit = db.session.get(Produit, produit_id)
+            if not produit:
+                raise ValueError("Produit non trouvé")
+
+            # Verrous toujours pris dans le même ordre: deux transferts croisés
+            # ne s'attendent pas mutuellement
+            stocks = {e: EmplacementService.ligne(produit_id, e) for e in sorted((source_id, destination_id))}
+            if stocks[source_id].quantite < quantite:
+                raise ValueError("Stock insuffisant à l'emplacement source")
+
+            mouvement = MouvementStock(
+                produit_id=produit_id,
+                type_mouvement='transfert',
+                quantite=quantite,
+                motif=motif or 'Transfert',
+                emplacement_id=source_id,
+                destination_id=destination_id
+            )
+            ValorisationService.transfert(produit, quantite, mouvement)
+            stocks[source_id].quantite -= quantite
+            stocks[destination_id].quantite += quantite
+
+            db.session.add(mouvement)
+            db.session.commit()
+            return mouvement
+
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def stock_total(produit_id=None):
+        """Stock total à jour: somme des emplacements, sans attendre la consolidation
+
+        Avec produit_id, le total de ce produit; sans, une sous-requête
+        corrélée à Produit pour les requêtes en masse.
+        """
+        stocks = aliased(StockEmplacement)
+        total = select(func.coalesce(func.sum(stocks.quantite), 0))
+        if produit_id is not None:
+            return db.session.scalar(total.where(stocks.produit_id == produit_id))
+        return total.where(stocks.produit_id == Produit.id).scalar_subquery()
+
+    @staticmethod
+    def demander_consolidation():
+        """Demander une consolidation, faite par le thread du processus après la requête
+
+        STOCK_CONSOLIDATION=off: les variations attendent la tâche du
+        planificateur (ou un appel à consolider()).
+        """
+        app = EmplacementService._app
+        if app is None or app.config.get('STOCK_CONSOLIDATION') != 'thread':
+            return
+        thread = EmplacementService._thread
+        if thread is None or not thread.is_alive():
+            # Premier appel du processus (ou du worker après le fork)
+            with EmplacementService._verrou:
+                if EmplacementService._thread is None or not EmplacementService._thread.is_alive():
+                    EmplacementService._thread = threading.Thread(
+                        target=EmplacementService._consolider_en_continu, daemon=True, name='consolidation'
+                    )
+                    EmplacementService._thread.start()
+        EmplacementService._demande.set()
+
+    @staticmethod
+    def _consolider_en_continu():
+        app = EmplacementService._app
+        while True:
+            EmplacementService._demande.wait()
+            # Les écritures de la fenêtre sont reportées ensemble
+            time.sleep(app.config.get('STOCK_CONSOLIDATION_DELAI', 0.5))
+            EmplacementService._demande.clear()
+            try:
+                with app.app_context():
+                    EmplacementService.consolider()
+            except Exception:
+                logger.exception("Thread de consolidation: erreur")
+
+    @staticmethod
+    def consolider():
+        """Reporter les variations en attente sur Produit.stock, dans une transaction à part
+
+        Les variations sont prises par DELETE ... RETURNING: deux consolidations
+        simultanées ne reportent jamais la même ligne. Retourne le nombre de
+        produits mis à jour.
+        """
+        try:
+            totaux = defaultdict(int)
+            for produit_id, variation in db.session.execute(
+                delete(VariationStock).returning(VariationStock.produit_id, VariationStock.variation)
+            ):
+                totaux[produit_id] += variation
+            produit_ids = sorted(p for p, v in totaux.items() if v)
+
+            lignes = []
+            for i in range(0, len(produit_ids), EmplacementService.LOT_CONSOLIDATION):
+                lignes.extend(db.session.execute(
+                    select(Produit.id, Produit.stock, Produit.seuil_alerte)
+                    .where(Produit.id.in_(produit_ids[i:i + EmplacementService.LOT_CONSOLIDATION]))
+                    .order_by(Produit.id).with_for_update()
+                ))
+            if lignes:
+                stocks = {l.id: (l.stock or 0) + totaux[l.id] for l in lignes}
+                valeurs = [{'id': p, 'stock': s} for p, s in stocks.items()]
+                db.session.execute(update(Produit), valeurs)
+                ChangementService.enregistrer(db.session, Produit, 'update', valeurs)
+                AlerteService.synchroniser(
+                    list(stocks) if len(stocks) <= EmplacementService.LOT_CONSOLIDATION else None
+                )
+                FluxService.ajouter(db.session, [
+                    {'type': 'stock', 'produit_id': l.id, 'stock': stocks[l.id],
+                     'stock_bas': AlerteService.est_stock_bas(stocks[l.id], l.seuil_alerte)}
+                    for l in lignes
+                ])
+            db.session.commit()
+            return len(lignes)
+
+        except Exception:
+            # Variations conservées: la prochaine consolidation les reportera
+            db.session.rollback()
+            logger.exception("Consolidation du stock total en échec")
+            return 0
+
+    @staticmethod
+    def requete_stocks(emplacement_id, stock_bas=False):
+        """Stock de chaque produit présent dans l'emplacement, avec son seuil effectif
+
+        stock_bas=True: seulement les produits sous leur seuil dans l'emplacement.
+        """
+        seuil = func.coalesce(StockEmplacement.seuil_alerte, Produit.seuil_alerte)
+        requete = select(
+            Produit.id.label('produit_id'),
+            Produit.nom,
+            StockEmplacement.quantite,
+            seuil.label('seuil_alerte'),
+            (StockEmplacement.quantite <= seuil).label('stock_bas')
+        ).join(StockEmplacement, StockEmplacement.produit_id == Produit.id).where(
+            StockEmplacement.emplacement_id == emplacement_id
+        ).order_by(func.lower(Produit.nom))
+        if stock_bas:
+            requete = requete.where(StockEmplacement.quantite <= seuil)
+        return requete
+
+    @staticmethod
+    def liste():
+        """Emplacements, celui par défaut en premier"""
+        return db.session.scalars(
+            select(Emplacement).order_by(Emplacement.par_defaut.desc(), Emplacement.nom)
+        ).all()
+
+    @staticmethod
+    def get_emplacements():
+        """Emplacements avec leur quantité totale et leur nombre de produits en stock bas"""
+        seuil = func.coalesce(StockEmplacement.seuil_alerte, Produit.seuil_alerte)
+        resume = select(
+            StockEmplacement.emplacement_id,
+            func.sum(StockEmplacement.quantite).label('quantite'),
+            func.count().filter(StockEmplacement.quantite <= seuil).label('produits_stock_bas')
+        ).join(Produit, Produit.id == StockEmplacement.produit_id).group_by(StockEmplacement.emplacement_id).subquery()
+
+        return [{
+            'id': e.id,
+            'nom': e.nom,
+            'type_emplacement': e.type_emplacement,
+            'par_defaut': e.par_defaut,
+            'quantite': quantite or 0,
+            'produits_stock_bas': stock_bas or 0
+        } for e, quantite, stock_bas in db.session.execute(
+            select(Emplacement, resume.c.quantite, resume.c.produits_stock_bas)
+            .outerjoin(resume, resume.c.emplacement_id == Emplacement.id)
+            .order_by(Emplacement.par_defaut.desc(), Emplacement.nom)
+        )]
+
+    @staticmethod
+    def get_repartition():
+        """{produit_id: [(emplacement, quantité), ...]} des quantités non nulles"""
+        repartition = defaultdict(list)
+        for produit_id, nom, quantite in db.session.execute(
+            select(StockEmplacement.produit_id, Emplacement.nom, StockEmplacement.quantite)
+            .join(Emplacement).where(StockEmplacement.quantite != 0)
+            .order_by(Emplacement.par_defaut.desc(), Emplacement.nom)
+        ):
+            repartition[produit_id].append((nom, quantite))
+        return repartition
+
+    @staticmethod
+    def modifier_seuil(produit_id, emplacement_id, seuil_alerte):
+        """Seuil d'alerte propre à l'emplacement (None: seuil du produit)"""
+        try:
+            stock = EmplacementService.ligne(produit_id, emplacement_id)
+            stock.seuil_alerte = seuil_alerte
+            db.session.commit()
+            return stock
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def initialiser():
+        """Emplacement par défaut et reprise du stock existant (étape init-db)
+
+        Les ventes et mouvements antérieurs gardent un emplacement NULL.
+        """
+        with db.engine.begin() as conn:
+            defaut = conn.scalar(select(Emplacement.id).where(Emplacement.par_defaut.is_(True)))
+            if defaut is None:
+                defaut = conn.execute(insert(Emplacement).values(
+                    nom='Entrepôt central', type_emplacement='entrepot', par_defaut=True,
+                    created_at=datetime.utcnow()
+                )).inserted_primary_key[0]
+            conn.execute(insert(StockEmplacement).from_select(
+                ['produit_id', 'emplacement_id', 'quantite'],
+                select(Produit.id, literal(defaut), func.coalesce(Produit.stock, 0)).where(
+                    ~exists().where(StockEmplacement.produit_id == Produit.id)
+                )
+            ))
+            conn.execute(update(CoucheStock).where(CoucheStock.emplacement_id.is_(None)).values(emplacement_id=defaut))
+        EmplacementService._defaut = defaut
+        EmplacementService.consolider()
+
+    @staticmethod
+    def _avant_flush(session, flush_context, instances):
+        # Stock initial d'un nouveau produit: à l'emplacement par défaut, avec
+        # sa couche d'ouverture (la plus ancienne du produit) au prix d'achat
+        for produit in session.new:
+            if isinstance(produit, Produit) and not produit.stocks_emplacement:
+                if produit.cout_moyen is None:
+                    produit.cout_moyen = produit.prix_achat
+                session.add(StockEmplacement(
+                    produit=produit,
+                    emplacement_id=EmplacementService.defaut(),
+                    quantite=produit.stock or 0
+                ))
+                if produit.stock and produit.stock > 0:
+                    produit.couches_stock.append(CoucheStock(
+                        emplacement_id=EmplacementService.defaut(),
+                        quantite_restante=produit.stock,
+                        cout_unitaire=produit.cout_moyen
+                    ))
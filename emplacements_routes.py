@@ -0,0 +1,108 @@
+from flask import Blueprint, request, redirect, url_for, flash, session, jsonify
+from flask_jwt_extended import jwt_required
+from models import Produit, Emplacement, StockEmplacement, db
+from serializers import stock_emplacement_json
+from services.emplacement_service import EmplacementService
+from services.version_service import conditionnel
+
+emplacements_bp = Blueprint('emplacements', __name__)
+
+def login_required(f):
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+@emplacements_bp.route('/emplacements/ajouter', methods=['POST'])
+@login_required
+def ajouter_emplacement():
+    try:
+        EmplacementService.creer_emplacement(
+            request.form['nom'].strip(),
+            request.form.get('type_emplacement', 'magasin')
+        )
+        flash('Emplacement ajouté avec succès', 'success')
+    except Exception as e:
+        flash(f'Erreur: {str(e)}', 'error')
+
+    return redirect(url_for('stocks.gestion_stocks'))
+
+@emplacements_bp.route('/stocks/transfert', methods=['POST'])
+@login_required
+def transferer():
+    try:
+        EmplacementService.transferer(
+            int(request.form['produit_id']),
+            int(request.form['source_id']),
+            int(request.form['destination_id']),
+            int(request.form['quantite']),
+            request.form.get('motif', '')
+        )
+        flash('Transfert enregistré avec succès', 'success')
+    except Exception as e:
+        flash(f'Erreur: {str(e)}', 'error')
+
+    return redirect(url_for('stocks.gestion_stocks'))
+
+# API Routes
+@emplacements_bp.route('/api/emplacements', methods=['GET'])
+@jwt_required()
+@conditionnel(Emplacement, StockEmplacement, Produit)
+def api_liste_emplacements():
+    return jsonify(EmplacementService.get_emplacements())
+
+@emplacements_bp.route('/api/emplacements', methods=['POST'])
+@jwt_required()
+def api_ajouter_emplacement():
+    data = request.get_json()
+
+    try:
+        emplacement = EmplacementService.creer_emplacement(
+            data['nom'],
+            data.get('type_emplacement', 'magasin')
+        )
+        return jsonify({'message': 'Emplacement créé avec succès', 'id': emplacement.id}), 201
+    except Exception as e:
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
+
+@emplacements_bp.route('/api/emplacements/<int:emplacement_id>/stocks', methods=['GET'])
+@jwt_required()
+@conditionnel(StockEmplacement, Produit)
+def api_stocks_emplacement(emplacement_id):
+    """Stock de l'emplacement (?stock_bas=1: produits sous leur seuil seulement)"""
+    Emplacement.query.get_or_404(emplacement_id)
+    lignes = db.session.execute(EmplacementService.requete_stocks(
+        emplacement_id, stock_bas=request.args.get('stock_bas') == '1'
+    ))
+    return jsonify([stock_emplacement_json(l) for l in lignes])
+
+@emplacements_bp.route('/api/emplacements/<int:emplacement_id>/stocks/<int:produit_id>', methods=['PUT'])
+@jwt_required()
+def api_modifier_seuil_emplacement(emplacement_id, produit_id):
+    """Seuil d'alerte du produit dans l'emplacement ({"seuil_alerte": null}: seuil du produit)"""
+    data = request.get_json()
+
+    try:
+        EmplacementService.modifier_seuil(produit_id, emplacement_id, data.get('seuil_alerte'))
+        return jsonify({'message': 'Seuil modifié avec succès'})
+    except Exception as e:
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
+
+@emplacements_bp.route('/api/stocks/transfert', methods=['POST'])
+@jwt_required()
+def api_transferer():
+    data = request.get_json()
+
+    try:
+        mouvement = EmplacementService.transferer(
+            data['produit_id'],
+            data['source_id'],
+            data['destination_id'],
+            data['quantite'],
+            data.get('motif', '')
+        )
+        return jsonify({'message': 'Transfert enregistré avec succès', 'id': mouvement.id}), 201
+    except Exception as e:
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
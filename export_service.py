@@ -2,13 +2,10 @@ import os
 import csv
 import io
 from datetime import datetime, timedelta
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
 from flask import current_app
-from models import Vente, Produit, Client, MouvementStock
+from sqlalchemy.orm import joinedload
+from models import Produit, Client, VenteComplete, MouvementStockComplete
+from services.replica_service import ReplicaService
 
 class ExportService:
     @staticmethod
@@ -21,10 +18,13 @@ class ExportService:
         end_date = datetime.combine(date, datetime.max.time())
         
         from app import db
-        ventes = db.session.query(Vente).filter(
-            Vente.date_vente >= start_date,
-            Vente.date_vente <= end_date
-        ).all()
+        with ReplicaService.lecture():
+            ventes = db.session.query(VenteComplete).options(
+                joinedload(VenteComplete.produit), joinedload(VenteComplete.client)
+            ).filter(
+                VenteComplete.date_vente >= start_date,
+                VenteComplete.date_vente <= end_date
+            ).all()
         
         return ventes
     
@@ -38,10 +38,13 @@ class ExportService:
         end_date = datetime.combine(date, datetime.max.time())
         
         from app import db
-        mouvements = db.session.query(MouvementStock).filter(
-            MouvementStock.date_mouvement >= start_date,
-            MouvementStock.date_mouvement <= end_date
-        ).all()
+        with ReplicaService.lecture():
+            mouvements = db.session.query(MouvementStockComplete).options(
+                joinedload(MouvementStockComplete.produit)
+            ).filter(
+                MouvementStockComplete.date_mouvement >= start_date,
+                MouvementStockComplete.date_mouvement <= end_date
+            ).all()
         
         return mouvements
     
@@ -126,6 +129,13 @@ class ExportService:
     @staticmethod
     def export_sales_to_pdf(date=None):
         """Export des ventes en PDF"""
+        # reportlab est lourd à importer: chargé au premier export seulement
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        
         if not date:
             date = datetime.now().date()
         
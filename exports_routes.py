@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, send_file, render_template, flash, redirect, url_for
+from flask import Blueprint, Response, request, jsonify, send_file, render_template, flash, redirect, url_for
 from datetime import datetime, timedelta
 import os
 import tempfile
@@ -69,23 +69,11 @@ def download_sales_csv(date):
         date_obj = datetime.strptime(date, '%Y-%m-%d').date()
         csv_content = ExportService.export_sales_to_csv(date_obj)
         
-        # Créer un fichier temporaire
-        temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', encoding='utf-8')
-        temp_file.write(csv_content)
-        temp_file.close()
-        
         filename = f'ventes_{date.replace("-", "")}.csv'
         
-        def remove_file(response):
-            os.unlink(temp_file.name)
-            return response
-        
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='text/csv'
-        )
+        # Envoyé depuis la mémoire pour être compressé à la volée
+        return Response(csv_content, mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
     
     except Exception as e:
         flash(f'Erreur lors du téléchargement: {str(e)}', 'error')
@@ -99,19 +87,11 @@ def download_stock_csv(date):
         date_obj = datetime.strptime(date, '%Y-%m-%d').date()
         csv_content = ExportService.export_stock_movements_to_csv(date_obj)
         
-        # Créer un fichier temporaire
-        temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', encoding='utf-8')
-        temp_file.write(csv_content)
-        temp_file.close()
-        
         filename = f'stock_mouvements_{date.replace("-", "")}.csv'
         
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='text/csv'
-        )
+        # Envoyé depuis la mémoire pour être compressé à la volée
+        return Response(csv_content, mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
     
     except Exception as e:
         flash(f'Erreur lors du téléchargement: {str(e)}', 'error')
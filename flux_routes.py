@@ -0,0 +1,29 @@
+from flask import Blueprint, Response, session, redirect, url_for, jsonify, current_app
+from services.flux_service import FluxService
+
+flux_bp = Blueprint('flux', __name__)
+
+def login_required(f):
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+@flux_bp.route('/flux')
+@login_required
+def flux():
+    """Événements en direct (text/event-stream): ventes, stocks, statuts, alertes"""
+    # Chaque flux occupe un thread du worker: en garder pour les pages
+    if FluxService.nombre_clients() >= current_app.config['FLUX_CONNEXIONS_MAX']:
+        reponse = jsonify({'message': 'Trop de flux ouverts, réessayez plus tard'})
+        reponse.status_code = 503
+        reponse.headers['Retry-After'] = '30'
+        return reponse
+    
+    return Response(
+        FluxService.ecouter(current_app.config['FLUX_DUREE_MAX']),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
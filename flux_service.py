@@ -0,0 +1,202 @@
+import glob
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from itertools import chain
+from sqlalchemy import event, inspect
+from models import Produit, Client, Vente, Livraison, Reservation
+from services.replica_service import SessionRoutee
+from services.alerte_service import AlerteService
+
+logger = logging.getLogger(__name__)
+
+class FluxService:
+    """Flux d'événements en direct (Server-Sent Events) pour le tableau de bord et les stocks
+
+    Les événements naissent dans les chemins d'écriture: après chaque flush,
+    les ventes ajoutées, les stocks modifiés et les changements de statut des
+    livraisons et réservations sont mis de côté, puis publiés au commit (rien
+    en cas d'annulation). Les alertes de stock bas (AlerteService) suivent le
+    même chemin.
+
+    Diffusion entre workers gunicorn d'un même hôte: chaque processus qui sert
+    des clients SSE lie une socket Unix datagramme dans FLUX_DOSSIER; publier
+    revient à envoyer le lot à chacune. Sans socket Unix (Windows), la
+    diffusion reste dans le processus.
+    """
+    LOT_MAX = 200  # au-delà, un seul événement « rafraichir » remplace le lot
+
+    _clients = set()
+    _verrou = threading.Lock()
+    _socket = None
+    _dossier = None
+    _ecouteur_installe = False
+
+    @staticmethod
+    def init_app(app):
+        FluxService._dossier = app.config['FLUX_DOSSIER']
+        if not FluxService._ecouteur_installe:
+            event.listen(SessionRoutee, 'after_flush', FluxService._apres_flush)
+            event.listen(SessionRoutee, 'after_commit', FluxService._apres_commit)
+            event.listen(SessionRoutee, 'after_rollback', FluxService._apres_rollback)
+            FluxService._ecouteur_installe = True
+        AlerteService.abonner(FluxService._alertes)
+
+    @staticmethod
+    def ajouter(session, evenements):
+        """Événements à publier au commit de la transaction en cours (écritures en masse)"""
+        session.info.setdefault('flux', []).extend(evenements)
+
+    @staticmethod
+    def publier(evenements):
+        """Envoyer un lot d'événements à tous les processus à l'écoute"""
+        if len(evenements) > FluxService.LOT_MAX:
+            evenements = [{'type': 'rafraichir'}]
+        message = json.dumps(evenements, default=str).encode()
+
+        if not hasattr(socket, 'AF_UNIX'):
+            FluxService._distribuer(evenements)
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as emetteur:
+            emetteur.setblocking(False)
+            for chemin in glob.glob(os.path.join(FluxService._dossier, '*.sock')):
+                try:
+                    emetteur.sendto(message, chemin)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    FluxService._supprimer(chemin)  # worker arrêté
+                except OSError:
+                    logger.warning("Flux: lot non transmis à %s (file pleine)", chemin)
+
+    @staticmethod
+    def ecouter(duree_max=300, battement=15):
+        """Générateur SSE d'un client, fermé après duree_max secondes (le navigateur se reconnecte)"""
+        file = queue.Queue(maxsize=100)
+        FluxService._demarrer_reception()
+        with FluxService._verrou:
+            FluxService._clients.add(file)
+        try:
+            yield 'retry: 3000\n\n'
+            fin = time.monotonic() + duree_max
+            while time.monotonic() < fin:
+                try:
+                    lot = file.get(timeout=battement)
+                except queue.Empty:
+                    yield ': battement\n\n'  # détecte aussi les clients partis
+                    continue
+                for evenement in lot:
+                    yield f"event: {evenement['type']}\ndata: {json.dumps(evenement, default=str)}\n\n"
+        finally:
+            with FluxService._verrou:
+                FluxService._clients.discard(file)
+
+    @staticmethod
+    def nombre_clients():
+        return len(FluxService._clients)
+
+    @staticmethod
+    def _distribuer(evenements):
+        with FluxService._verrou:
+            clients = list(FluxService._clients)
+        for file in clients:
+            try:
+                file.put_nowait(evenements)
+            except queue.Full:
+                # Client trop lent: il repartira d'une page à jour
+                with file.mutex:
+                    file.queue.clear()
+                file.put_nowait([{'type': 'rafraichir'}])
+
+    @staticmethod
+    def _demarrer_reception():
+        if FluxService._socket is not None or not hasattr(socket, 'AF_UNIX'):
+            return
+        with FluxService._verrou:
+            if FluxService._socket is not None:
+                return
+            os.makedirs(FluxService._dossier, exist_ok=True)
+            chemin = os.path.join(FluxService._dossier, f"{os.getpid()}.sock")
+            FluxService._supprimer(chemin)
+            recepteur = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            recepteur.bind(chemin)
+            FluxService._socket = recepteur
+        threading.Thread(target=FluxService._recevoir, args=(recepteur,), daemon=True, name='flux').start()
+
+    @staticmethod
+    def _recevoir(recepteur):
+        while True:
+            message = recepteur.recv(1 << 20)
+            try:
+                FluxService._distribuer(json.loads(message))
+            except Exception:
+                logger.exception("Flux: lot illisible")
+
+    @staticmethod
+    def _supprimer(chemin):
+        try:
+            os.unlink(chemin)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _apres_flush(session, flush_context):
+        evenements = []
+        for objet in session.new:
+            if isinstance(objet, Vente):
+                # Vente créée avec les seuls identifiants: relations non chargées ici,
+                # session.get les prend dans la carte d'identité (le produit l'est déjà)
+                produit = session.get(Produit, objet.produit_id)
+                client = session.get(Client, objet.client_id) if objet.client_id else None
+                evenements.append({
+                    'type': 'vente',
+                    'id': objet.id,
+                    'produit_id': objet.produit_id,
+                    'produit_nom': produit.nom if produit else None,
+                    'client_nom': client.nom if client else None,
+                    'quantite': objet.quantite,
+                    'total': objet.total,
+                    'benefice': (objet.prix_unitaire - produit.prix_achat) * objet.quantite if produit else 0,
+                    'date_vente': objet.date_vente.isoformat()
+                })
+
+        for objet in chain(session.new, session.dirty):
+            etat = inspect(objet)
+            if isinstance(objet, Produit) and (objet in session.new or etat.attrs.stock.history.has_changes()):
+                evenements.append({
+                    'type': 'stock',
+                    'produit_id': objet.id,
+                    'stock': objet.stock,
+                    'stock_bas': bool(objet.stock_bas)
+                })
+            elif isinstance(objet, (Livraison, Reservation)):
+                historique = etat.attrs.statut.history
+                if objet in session.new or historique.has_changes():
+                    evenements.append({
+                        'type': objet.__tablename__,
+                        'id': objet.id,
+                        'statut': objet.statut,
+                        'ancien_statut': historique.deleted[0] if historique.deleted else None
+                    })
+
+        if evenements:
+            FluxService.ajouter(session, evenements)
+
+    @staticmethod
+    def _apres_commit(session):
+        evenements = session.info.pop('flux', None)
+        if evenements:
+            try:
+                FluxService.publier(evenements)
+            except Exception:
+                logger.exception("Flux: publication en échec")
+
+    @staticmethod
+    def _apres_rollback(session):
+        session.info.pop('flux', None)
+
+    @staticmethod
+    def _alertes(alertes):
+        FluxService.publier([dict(alerte, type='alerte') for alerte in alertes])
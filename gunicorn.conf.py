@@ -0,0 +1,23 @@
+"""Configuration gunicorn: application préchargée dans le maître (partage copy-on-write)"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+preload_app = True
+# Threads: un flux /flux (Server-Sent Events) occupe un thread pendant sa durée
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+def when_ready(server):
+    """Démarrer le planificateur une seule fois, dans le processus maître"""
+    from app import app
+    if app.config['SCHEDULER_MODE'] == 'gunicorn':
+        from services.scheduler_service import start_scheduler
+        start_scheduler(app)
+
+def post_fork(server, worker):
+    """Chaque worker ouvre ses propres connexions à la base"""
+    from app import app, db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
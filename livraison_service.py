@@ -1,7 +1,15 @@
 from models import Livraison, Client, db
+from services.statut_service import StatutService
 from datetime import datetime
 
 class LivraisonService:
+    # Transitions autorisées pour les changements en masse: statut cible -> statuts de départ
+    TRANSITIONS_STATUT = {
+        "Livré": ("En cours",),
+        "Annulé": ("En cours",),
+        "En cours": ("Annulé",)
+    }
+    
     @staticmethod
     def creer_livraison(client_id, adresse, date_prevue=None, notes=""):
         """Créer une nouvelle livraison"""
@@ -49,6 +57,16 @@ class LivraisonService:
             db.session.rollback()
             raise e
     
+    @staticmethod
+    def modifier_statuts_en_masse(mises_a_jour):
+        """Modifier le statut de plusieurs livraisons en une seule transaction"""
+        return StatutService.appliquer_transitions(
+            Livraison,
+            mises_a_jour,
+            LivraisonService.TRANSITIONS_STATUT,
+            {"Livré": "date_livraison"}
+        )
+    
     @staticmethod
     def get_livraisons_par_statut(statut):
         """Obtenir les livraisons par statut"""
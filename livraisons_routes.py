@@ -1,7 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import joinedload
 from models import Livraison, Client, db
 from services.livraison_service import LivraisonService
+from services.statut_service import StatutService
+from services.tournee_service import TourneeService
+from services.query_profiler_service import query_budget
+from services.version_service import conditionnel
+from services.tableau_service import TableauService
 from datetime import datetime
 
 livraisons_bp = Blueprint('livraisons', __name__)
@@ -14,20 +20,39 @@ def login_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
-@livraisons_bp.route('/livraisons')
-@login_required
-def liste_livraisons():
+# Colonnes triables du tableau (index ix_livraison_created_at, ix_livraison_date_prevue)
+COLONNES_TRI = {
+    'created_at': Livraison.created_at,
+    'date_prevue': Livraison.date_prevue
+}
+
+def contexte_tableau():
     statut_filtre = request.args.get('statut', '')
     
-    query = Livraison.query
+    query = Livraison.query.options(joinedload(Livraison.client))
     if statut_filtre:
         query = query.filter_by(statut=statut_filtre)
     
-    livraisons = query.order_by(Livraison.created_at.desc()).all()
-    clients = Client.query.all()
-    
-    return render_template('livraisons.html', livraisons=livraisons, 
-                         clients=clients, statut_filtre=statut_filtre)
+    livraisons, tri = TableauService.paginer(query, COLONNES_TRI, '-created_at')
+    return {'livraisons': livraisons, 'tri': tri, 'statut_filtre': statut_filtre}
+
+def ligne_livraison(livraison_id, statut=200):
+    """Fragment: ligne d'une livraison créée ou modifiée"""
+    livraison = db.session.get(Livraison, livraison_id, options=[joinedload(Livraison.client)])
+    return render_template('livraisons_ligne.html', livraison=livraison), statut
+
+@livraisons_bp.route('/livraisons')
+@login_required
+@conditionnel(Livraison, Client)
+def liste_livraisons():
+    return render_template('livraisons.html', **contexte_tableau())
+
+@livraisons_bp.route('/livraisons/tableau')
+@login_required
+@conditionnel(Livraison, Client)
+def tableau_livraisons():
+    """Fragment: tableau seul (changement de page ou de tri)"""
+    return render_template('livraisons_tableau.html', **contexte_tableau())
 
 @livraisons_bp.route('/livraisons/ajouter', methods=['POST'])
 @login_required
@@ -43,10 +68,12 @@ def ajouter_livraison():
     
     try:
         livraison = LivraisonService.creer_livraison(client_id, adresse, date_prevue, notes)
-        flash('Livraison programmée avec succès', 'success')
     except Exception as e:
-        flash(f'Erreur lors de la programmation: {str(e)}', 'error')
+        return TableauService.erreur(f'Erreur lors de la programmation: {str(e)}', 'livraisons.liste_livraisons')
     
+    if TableauService.fragment():
+        return ligne_livraison(livraison.id, 201)
+    flash('Livraison programmée avec succès', 'success')
     return redirect(url_for('livraisons.liste_livraisons'))
 
 @livraisons_bp.route('/livraisons/modifier/<int:livraison_id>', methods=['POST'])
@@ -56,13 +83,15 @@ def modifier_statut_livraison(livraison_id):
     notes = request.form.get('notes', '')
     
     try:
-        if LivraisonService.modifier_statut_livraison(livraison_id, nouveau_statut, notes):
-            flash('Statut de livraison modifié avec succès', 'success')
-        else:
-            flash('Erreur lors de la modification', 'error')
+        succes = LivraisonService.modifier_statut_livraison(livraison_id, nouveau_statut, notes)
     except Exception as e:
-        flash(f'Erreur: {str(e)}', 'error')
+        return TableauService.erreur(f'Erreur: {str(e)}', 'livraisons.liste_livraisons')
     
+    if not succes:
+        return TableauService.erreur('Erreur lors de la modification', 'livraisons.liste_livraisons')
+    if TableauService.fragment():
+        return ligne_livraison(livraison_id)
+    flash('Statut de livraison modifié avec succès', 'success')
     return redirect(url_for('livraisons.liste_livraisons'))
 
 @livraisons_bp.route('/livraisons/supprimer/<int:livraison_id>', methods=['POST'])
@@ -73,18 +102,21 @@ def supprimer_livraison(livraison_id):
     try:
         db.session.delete(livraison)
         db.session.commit()
-        flash('Livraison supprimée avec succès', 'success')
     except Exception as e:
         db.session.rollback()
-        flash('Erreur lors de la suppression', 'error')
+        return TableauService.erreur('Erreur lors de la suppression', 'livraisons.liste_livraisons')
     
-    return redirect(url_for('livraisons.liste_livraisons'))
+    return TableauService.supprime('Livraison supprimée avec succès', 'livraisons.liste_livraisons')
 
 # API Routes
 @livraisons_bp.route('/api/livraisons', methods=['GET'])
+@query_budget(2)
 @jwt_required()
+@conditionnel(Livraison, Client)
 def api_liste_livraisons():
-    livraisons = Livraison.query.order_by(Livraison.created_at.desc()).all()
+    livraisons = Livraison.query.options(
+        joinedload(Livraison.client)
+    ).order_by(Livraison.created_at.desc()).all()
     return jsonify([{
         'id': l.id,
         'client_nom': l.client.nom,
@@ -140,3 +172,45 @@ def api_modifier_statut(livraison_id):
             
     except Exception as e:
         return jsonify({'message': f'Erreur: {str(e)}'}), 400
+
+@livraisons_bp.route('/api/livraisons/statuts', methods=['POST'])
+@jwt_required()
+def api_modifier_statuts():
+    try:
+        mises_a_jour = StatutService.lire_mises_a_jour(
+            request.get_json(silent=True),
+            request.files.get('fichier')
+        )
+        resultats = LivraisonService.modifier_statuts_en_masse(mises_a_jour)
+        
+        return jsonify({
+            'mis_a_jour': sum(1 for r in resultats if r['succes']),
+            'echecs': sum(1 for r in resultats if not r['succes']),
+            'resultats': resultats
+        })
+        
+    except Exception as e:
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
+
+@livraisons_bp.route('/api/livraisons/tournees', methods=['GET'])
+@jwt_required()
+def api_tournees():
+    date_str = request.args.get('date')
+    
+    try:
+        date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else None
+        
+        depot = None
+        if current_app.config.get('TOURNEE_DEPOT'):
+            latitude, longitude = current_app.config['TOURNEE_DEPOT'].split(',')
+            depot = (float(latitude), float(longitude))
+        
+        tournees = TourneeService.planifier_tournees(
+            date,
+            current_app.config.get('TOURNEE_TABLE_DISTANCES'),
+            depot
+        )
+        return jsonify(tournees)
+        
+    except Exception as e:
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
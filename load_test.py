@@ -0,0 +1,214 @@
+"""Test de charge d'une instance gunicorn de main:app simulant le trafic des caisses.
+
+Usage:
+    gunicorn --preload --workers 4 --bind 127.0.0.1:8000 main:app
+    python load_test.py --url http://127.0.0.1:8000 --caissiers 40 --gerants 3 --duree 120 --montee 30
+
+Chaque caissier se connecte une fois (/api/auth/login) puis enchaîne des
+POST /api/ventes sur un petit ensemble de produits « chauds », avec de
+temps en temps un GET /api/stocks/bas. Les gérants se connectent par le
+formulaire et consultent /dashboard et l'export CSV du jour.
+
+Le rapport donne débit, percentiles de latence et taux d'erreur par type
+de requête. Les anomalies de stock (ventes perdues ou stock négatif) sont
+détectées en comparant le stock final de chaque produit chaud au stock
+initial moins les ventes acceptées. GET /api/stocks lit la somme des
+emplacements: le stock final est à jour dès la fin du test, sans attendre
+le report différé sur Produit.stock.
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+class Statistiques:
+    def __init__(self):
+        self.verrou = threading.Lock()
+        self.durees = {}
+        self.erreurs = {}
+        self.refus_stock = 0
+        self.ventes = {}  # produit_id -> quantité vendue acceptée
+
+    def enregistrer(self, nom, duree, erreur):
+        with self.verrou:
+            self.durees.setdefault(nom, []).append(duree)
+            if erreur:
+                self.erreurs[nom] = self.erreurs.get(nom, 0) + 1
+
+    def vente(self, produit_id, quantite):
+        with self.verrou:
+            self.ventes[produit_id] = self.ventes.get(produit_id, 0) + quantite
+
+class Session:
+    """Connexion HTTP persistante (keep-alive) d'un utilisateur virtuel"""
+
+    def __init__(self, url):
+        morceaux = urlsplit(url)
+        classe = http.client.HTTPSConnection if morceaux.scheme == 'https' else http.client.HTTPConnection
+        self.connexion = classe(morceaux.hostname, morceaux.port, timeout=30)
+        self.entetes = {}
+
+    def requete(self, methode, chemin, corps=None, formulaire=None):
+        entetes = dict(self.entetes)
+        donnees = None
+        if corps is not None:
+            donnees = json.dumps(corps)
+            entetes['Content-Type'] = 'application/json'
+        elif formulaire is not None:
+            donnees = urlencode(formulaire)
+            entetes['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.connexion.request(methode, chemin, body=donnees, headers=entetes)
+            reponse = self.connexion.getresponse()
+            contenu = reponse.read()
+        except (http.client.HTTPException, OSError):
+            self.connexion.close()
+            return 599, b'', None
+        cookie = reponse.getheader('Set-Cookie')
+        if cookie and cookie.startswith('session='):
+            self.entetes['Cookie'] = cookie.split(';', 1)[0]
+        return reponse.status, contenu, reponse
+
+    def chronometrer(self, stats, nom, methode, chemin, **kwargs):
+        debut = time.perf_counter()
+        statut, contenu, reponse = self.requete(methode, chemin, **kwargs)
+        erreur = statut >= 500 or statut in (401, 404, 599)
+        stats.enregistrer(nom, time.perf_counter() - debut, erreur)
+        return statut, contenu
+
+def connexion_api(session, utilisateur, mot_de_passe):
+    statut, contenu, _ = session.requete('POST', '/api/auth/login',
+                                         corps={'username': utilisateur, 'password': mot_de_passe})
+    if statut != 200:
+        raise RuntimeError(f"Connexion API impossible ({statut})")
+    session.entetes['Authorization'] = f"Bearer {json.loads(contenu)['access_token']}"
+
+def reflechir(moyenne):
+    """Pause de durée exponentielle; aucune pause pour une moyenne nulle (débit maximal)"""
+    if moyenne > 0:
+        time.sleep(random.expovariate(1 / moyenne))
+
+def caissier(args, stats, produits, fin):
+    session = Session(args.url)
+    debut = time.perf_counter()
+    try:
+        connexion_api(session, args.utilisateur, args.mot_de_passe)
+    except RuntimeError:
+        stats.enregistrer('login', time.perf_counter() - debut, True)
+        return
+    stats.enregistrer('login', time.perf_counter() - debut, False)
+    while time.time() < fin:
+        produit_id = random.choice(produits)
+        quantite = random.randint(1, 3)
+        statut, contenu = session.chronometrer(stats, 'POST /api/ventes', 'POST', '/api/ventes',
+                                               corps={'produit_id': produit_id, 'quantite': quantite})
+        if statut == 201:
+            stats.vente(produit_id, quantite)
+        elif statut == 400 and b'Stock insuffisant' in contenu:
+            with stats.verrou:
+                stats.refus_stock += 1
+        if random.random() < args.part_stocks_bas:
+            session.chronometrer(stats, 'GET /api/stocks/bas', 'GET', '/api/stocks/bas')
+        reflechir(args.reflexion)
+
+def gerant(args, stats, fin):
+    session = Session(args.url)
+    session.chronometrer(stats, 'login (formulaire)', 'POST', '/login',
+                         formulaire={'username': args.utilisateur, 'password': args.mot_de_passe})
+    aujourd_hui = datetime.now().strftime('%Y-%m-%d')
+    while time.time() < fin:
+        session.chronometrer(stats, 'GET /dashboard', 'GET', '/dashboard')
+        if random.random() < 0.2:
+            session.chronometrer(stats, 'GET export CSV', 'GET', f'/exports/download/csv/sales/{aujourd_hui}')
+        reflechir(args.reflexion * 10)
+
+def stocks(session, produits):
+    statut, contenu, _ = session.requete('GET', '/api/stocks')
+    if statut != 200:
+        raise RuntimeError(f"Lecture des stocks impossible ({statut})")
+    par_id = {p['id']: p['stock'] for p in json.loads(contenu)}
+    return {i: par_id.get(i) for i in produits}
+
+def percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(p / 100 * len(valeurs)))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge simulant les caisses")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--utilisateur', default='admin')
+    parser.add_argument('--mot-de-passe', default='admin123')
+    parser.add_argument('--caissiers', type=int, default=20)
+    parser.add_argument('--gerants', type=int, default=2)
+    parser.add_argument('--duree', type=float, default=60, help="durée en secondes, montée comprise")
+    parser.add_argument('--montee', type=float, default=10, help="durée de la montée en charge")
+    parser.add_argument('--reflexion', type=float, default=0.5, help="temps de réflexion moyen d'un caissier (s), 0 pour aucun")
+    parser.add_argument('--part-stocks-bas', type=float, default=0.05)
+    parser.add_argument('--produits-chauds', type=int, default=20)
+    args = parser.parse_args()
+    if args.reflexion < 0:
+        parser.error("--reflexion doit être positif ou nul")
+
+    controle = Session(args.url)
+    connexion_api(controle, args.utilisateur, args.mot_de_passe)
+    statut, contenu, _ = controle.requete('GET', '/api/produits')
+    catalogue = [p['id'] for p in json.loads(contenu) if p['stock'] > 0]
+    if not catalogue:
+        raise SystemExit("Aucun produit en stock sur l'instance testée")
+    produits = random.sample(catalogue, min(args.produits_chauds, len(catalogue)))
+    stock_initial = stocks(controle, produits)
+
+    stats = Statistiques()
+    debut = time.time()
+    fin = debut + args.duree
+    roles = ['gerant'] * args.gerants + ['caissier'] * args.caissiers
+    random.shuffle(roles)
+    threads = []
+    for rang, role in enumerate(roles):
+        # Montée en charge linéaire
+        attente = debut + args.montee * rang / len(roles) - time.time()
+        if attente > 0:
+            time.sleep(attente)
+        if role == 'gerant':
+            thread = threading.Thread(target=gerant, args=(args, stats, fin), daemon=True)
+        else:
+            thread = threading.Thread(target=caissier, args=(args, stats, produits, fin), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    duree = time.time() - debut
+
+    stock_final = stocks(controle, produits)
+
+    print(f"\n{args.caissiers} caissiers, {args.gerants} gérants, {duree:.0f}s (montée {args.montee:.0f}s)")
+    print(f"{'Requête':<22} {'nombre':>7} {'débit':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'erreurs':>8}")
+    toutes = 0
+    for nom, durees in sorted(stats.durees.items()):
+        toutes += len(durees)
+        erreurs = stats.erreurs.get(nom, 0)
+        print(f"{nom:<22} {len(durees):>7} {len(durees) / duree:>7.1f}/s "
+              f"{percentile(durees, 50) * 1000:>6.0f}ms {percentile(durees, 95) * 1000:>6.0f}ms "
+              f"{percentile(durees, 99) * 1000:>6.0f}ms {erreurs / len(durees):>7.1%}")
+    print(f"Débit total: {toutes / duree:.1f} requêtes/s, refus pour stock insuffisant: {stats.refus_stock}")
+
+    anomalies = []
+    for produit_id in produits:
+        attendu = stock_initial[produit_id] - stats.ventes.get(produit_id, 0)
+        if stock_final[produit_id] is None:
+            continue
+        if stock_final[produit_id] < 0 or stock_final[produit_id] != attendu:
+            anomalies.append((produit_id, stock_initial[produit_id], attendu, stock_final[produit_id]))
+    if anomalies:
+        print(f"\nAnomalies de stock (course entre ventes concurrentes): {len(anomalies)} produit(s)")
+        for produit_id, initial, attendu, final in anomalies:
+            print(f"  produit {produit_id}: initial {initial}, attendu {attendu}, constaté {final}")
+    else:
+        print("Aucune anomalie de stock")
+
+if __name__ == '__main__':
+    main()
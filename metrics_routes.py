@@ -0,0 +1,20 @@
+import hmac
+from flask import Blueprint, Response, request, current_app
+from models import db
+from services.metrics_service import MetricsService
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    # Jeton facultatif pour restreindre l'accès au collecteur Prometheus
+    jeton = current_app.config.get('METRICS_TOKEN')
+    if jeton:
+        fourni = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(fourni, jeton):
+            return Response('Non autorisé\n', status=401, mimetype='text/plain')
+
+    return Response(
+        MetricsService.exposition(db.engine.pool),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,187 @@
+import bisect
+import threading
+import time
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+class MetricsService:
+    """Métriques des requêtes HTTP, du SQL et du pool de connexions
+
+    Les compteurs sont tenus en mémoire, par processus: chaque worker
+    gunicorn expose ses propres valeurs sur /metrics.
+    """
+    # Bornes (en secondes) de l'histogramme de latence
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    _verrou = threading.Lock()
+    _latences = {}   # (endpoint, méthode) -> [compte par bucket..., +Inf, somme]
+    _requetes = {}   # (endpoint, méthode, statut) -> nombre
+    _sql = {}        # endpoint -> [nombre de requêtes SQL, durée totale]
+    _pool = {'checkouts': 0, 'connexions': 0, 'en_cours': 0}
+    _ecouteurs_installes = False
+
+    @staticmethod
+    def init_app(app):
+        """Installer le middleware de mesure et les écouteurs SQLAlchemy"""
+        app.before_request(MetricsService._debut_requete)
+        app.after_request(MetricsService._fin_requete)
+        app.teardown_request(MetricsService._teardown_requete)
+
+        if not MetricsService._ecouteurs_installes:
+            event.listen(Engine, 'before_cursor_execute', MetricsService._avant_sql)
+            event.listen(Engine, 'after_cursor_execute', MetricsService._apres_sql)
+            event.listen(Pool, 'connect', MetricsService._pool_connexion)
+            event.listen(Pool, 'checkout', MetricsService._pool_checkout)
+            event.listen(Pool, 'checkin', MetricsService._pool_checkin)
+            MetricsService._ecouteurs_installes = True
+
+    @staticmethod
+    def _debut_requete():
+        g.metrics_debut = time.perf_counter()
+        g.metrics_sql = [0, 0.0]
+
+    @staticmethod
+    def _enregistrer(statut):
+        debut = g.pop('metrics_debut', None)
+        if debut is None or request.endpoint == 'metrics.metrics':
+            return
+        duree = time.perf_counter() - debut
+        endpoint = request.endpoint or 'inconnu'
+        methode = request.method
+        nombre_sql, duree_sql = g.pop('metrics_sql', (0, 0.0))
+        rang = bisect.bisect_left(MetricsService.BUCKETS, duree)
+
+        with MetricsService._verrou:
+            cle = (endpoint, methode)
+            histogramme = MetricsService._latences.get(cle)
+            if histogramme is None:
+                histogramme = MetricsService._latences[cle] = [0] * (len(MetricsService.BUCKETS) + 1) + [0.0]
+            histogramme[rang] += 1
+            histogramme[-1] += duree
+
+            cle = (endpoint, methode, statut)
+            MetricsService._requetes[cle] = MetricsService._requetes.get(cle, 0) + 1
+
+            sql = MetricsService._sql.setdefault(endpoint, [0, 0.0])
+            sql[0] += nombre_sql
+            sql[1] += duree_sql
+
+    @staticmethod
+    def _fin_requete(response):
+        MetricsService._enregistrer(response.status_code)
+        return response
+
+    @staticmethod
+    def _teardown_requete(exception=None):
+        # Requête interrompue par une exception: after_request n'a pas été appelé
+        if 'metrics_debut' in g:
+            MetricsService._enregistrer(500)
+
+    @staticmethod
+    def _avant_sql(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_debuts', []).append(time.perf_counter())
+
+    @staticmethod
+    def _apres_sql(conn, cursor, statement, parameters, context, executemany):
+        debuts = conn.info.get('metrics_debuts')
+        if not debuts:
+            return
+        duree = time.perf_counter() - debuts.pop()
+        if has_request_context() and 'metrics_sql' in g:
+            g.metrics_sql[0] += 1
+            g.metrics_sql[1] += duree
+        else:
+            with MetricsService._verrou:
+                sql = MetricsService._sql.setdefault('hors_requete', [0, 0.0])
+                sql[0] += 1
+                sql[1] += duree
+
+    @staticmethod
+    def _pool_connexion(dbapi_connection, connection_record):
+        with MetricsService._verrou:
+            MetricsService._pool['connexions'] += 1
+
+    @staticmethod
+    def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+        with MetricsService._verrou:
+            MetricsService._pool['checkouts'] += 1
+            MetricsService._pool['en_cours'] += 1
+
+    @staticmethod
+    def _pool_checkin(dbapi_connection, connection_record):
+        with MetricsService._verrou:
+            MetricsService._pool['en_cours'] -= 1
+
+    @staticmethod
+    def _etiquettes(**valeurs):
+        paires = []
+        for nom, valeur in valeurs.items():
+            valeur = str(valeur).replace('\\', '\\\\').replace('"', '\\"')
+            paires.append(f'{nom}="{valeur}"')
+        return '{' + ','.join(paires) + '}'
+
+    @staticmethod
+    def exposition(pool=None):
+        """Produire les métriques au format texte Prometheus"""
+        e = MetricsService._etiquettes
+        with MetricsService._verrou:
+            latences = {k: list(v) for k, v in MetricsService._latences.items()}
+            requetes = dict(MetricsService._requetes)
+            sql = {k: list(v) for k, v in MetricsService._sql.items()}
+            stats_pool = dict(MetricsService._pool)
+
+        lignes = [
+            '# HELP ruine_http_request_duration_seconds Latence des requêtes HTTP par endpoint.',
+            '# TYPE ruine_http_request_duration_seconds histogram',
+        ]
+        for (endpoint, methode), histogramme in sorted(latences.items()):
+            cumul = 0
+            for borne, compte in zip(MetricsService.BUCKETS + ('+Inf',), histogramme[:-1]):
+                cumul += compte
+                lignes.append(f'ruine_http_request_duration_seconds_bucket'
+                              f'{e(endpoint=endpoint, method=methode, le=borne)} {cumul}')
+            lignes.append(f'ruine_http_request_duration_seconds_sum{e(endpoint=endpoint, method=methode)} {histogramme[-1]:.6f}')
+            lignes.append(f'ruine_http_request_duration_seconds_count{e(endpoint=endpoint, method=methode)} {cumul}')
+
+        lignes += [
+            '# HELP ruine_http_requests_total Requêtes HTTP par endpoint et code de statut.',
+            '# TYPE ruine_http_requests_total counter',
+        ]
+        for (endpoint, methode, statut), nombre in sorted(requetes.items()):
+            lignes.append(f'ruine_http_requests_total{e(endpoint=endpoint, method=methode, status=statut)} {nombre}')
+
+        lignes += [
+            '# HELP ruine_sql_statements_total Requêtes SQL exécutées par endpoint.',
+            '# TYPE ruine_sql_statements_total counter',
+        ]
+        lignes += [f'ruine_sql_statements_total{e(endpoint=endpoint)} {v[0]}' for endpoint, v in sorted(sql.items())]
+        lignes += [
+            '# HELP ruine_sql_duration_seconds_total Temps passé en SQL par endpoint.',
+            '# TYPE ruine_sql_duration_seconds_total counter',
+        ]
+        lignes += [f'ruine_sql_duration_seconds_total{e(endpoint=endpoint)} {v[1]:.6f}' for endpoint, v in sorted(sql.items())]
+
+        lignes += [
+            '# HELP ruine_db_pool_checkouts_total Connexions empruntées au pool.',
+            '# TYPE ruine_db_pool_checkouts_total counter',
+            f"ruine_db_pool_checkouts_total {stats_pool['checkouts']}",
+            '# HELP ruine_db_pool_connections_total Connexions ouvertes vers la base.',
+            '# TYPE ruine_db_pool_connections_total counter',
+            f"ruine_db_pool_connections_total {stats_pool['connexions']}",
+            '# HELP ruine_db_pool_checked_out Connexions actuellement empruntées.',
+            '# TYPE ruine_db_pool_checked_out gauge',
+            f"ruine_db_pool_checked_out {stats_pool['en_cours']}",
+        ]
+        if pool is not None and hasattr(pool, 'size'):
+            lignes += [
+                '# HELP ruine_db_pool_size Taille configurée du pool.',
+                '# TYPE ruine_db_pool_size gauge',
+                f'ruine_db_pool_size {pool.size()}',
+                '# HELP ruine_db_pool_overflow Connexions en débordement du pool.',
+                '# TYPE ruine_db_pool_overflow gauge',
+                f'ruine_db_pool_overflow {pool.overflow()}',
+            ]
+
+        return '\n'.join(lignes) + '\n'
@@ -1,6 +1,8 @@
 from app import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import aliased
+from services.password_service import PasswordService
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -9,10 +11,18 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = PasswordService.hacher(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return PasswordService.verifier(self.password_hash, password)
+
+SEUIL_ALERTE_DEFAUT = 10
+
+def _stock_bas_initial(context):
+    """Drapeau stock_bas d'un produit inséré (y compris par INSERT en masse)"""
+    valeurs = context.get_current_parameters()
+    seuil = valeurs.get('seuil_alerte')
+    return (valeurs.get('stock') or 0) <= (SEUIL_ALERTE_DEFAUT if seuil is None else seuil)
 
 class Produit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -20,13 +30,30 @@ class Produit(db.Model):
     prix_achat = db.Column(db.Float, nullable=False, default=0)  # Prix d'achat pour calculer le bénéfice
     prix_unitaire = db.Column(db.Float, nullable=False)  # Prix de vente
     stock = db.Column(db.Integer, default=0)
-    seuil_alerte = db.Column(db.Integer, default=10)  # Seuil pour alerte stock bas
+    seuil_alerte = db.Column(db.Integer, default=SEUIL_ALERTE_DEFAUT)  # Seuil pour alerte stock bas
+    cout_moyen = db.Column(db.Float)  # Coût moyen pondéré du stock (voir ValorisationService)
+    demande_journaliere = db.Column(db.Float)  # Prévision (voir PrevisionService)
+    quantite_cible = db.Column(db.Integer)  # Niveau visé par un réapprovisionnement
+    stock_bas = db.Column(db.Boolean, default=_stock_bas_initial)  # stock <= seuil_alerte, tenu par AlerteService
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relations
     ventes = db.relationship('Vente', backref='produit', lazy=True)
     mouvements_stock = db.relationship('MouvementStock', backref='produit', lazy=True)
     reservations = db.relationship('Reservation', backref='produit', lazy=True)
+    alertes_stock = db.relationship('AlerteStock', backref='produit', lazy=True, cascade='all, delete-orphan')
+    stocks_emplacement = db.relationship('StockEmplacement', backref='produit', lazy=True, cascade='all, delete-orphan')
+    variations_stock = db.relationship('VariationStock', lazy=True, cascade='all, delete-orphan')
+    couches_stock = db.relationship('CoucheStock', lazy=True, cascade='all, delete-orphan')
+    
+    # Recherche par préfixe du nom (sélecteurs des formulaires), tri des
+    # tableaux et liste des produits en stock bas
+    __table_args__ = (
+        db.Index('ix_produit_nom_lower', db.func.lower(nom)),
+        db.Index('ix_produit_stock', stock),
+        db.Index('ix_produit_prix_unitaire', prix_unitaire),
+        db.Index('ix_produit_stock_bas', stock_bas),
+    )
     
     @property
     def marge_benefice(self):
@@ -49,6 +76,12 @@ class Client(db.Model):
     livraisons = db.relationship('Livraison', backref='client', lazy=True)
     reservations = db.relationship('Reservation', backref='client', lazy=True)
     
+    # Recherche par préfixe du nom (sélecteurs des formulaires) et tri des tableaux
+    __table_args__ = (
+        db.Index('ix_client_nom_lower', db.func.lower(nom)),
+        db.Index('ix_client_created_at', created_at),
+    )
+    
     @property
     def total_achats(self):
         return sum(vente.total for vente in self.ventes)
@@ -61,6 +94,14 @@ class Vente(db.Model):
     prix_unitaire = db.Column(db.Float, nullable=False)  # Prix au moment de la vente
     total = db.Column(db.Float, nullable=False)
     date_vente = db.Column(db.DateTime, default=datetime.utcnow)
+    emplacement_id = db.Column(db.Integer, db.ForeignKey('emplacement.id'), nullable=True)  # Magasin ou entrepôt
+    cle_idempotence = db.Column(db.String(64))  # Générée par la caisse (synchronisation hors ligne)
+    
+    __table_args__ = (
+        # Historique des ventes par produit (prévision de la demande)
+        db.Index('ix_vente_produit_date', produit_id, date_vente, quantite),
+        db.Index('ix_vente_cle_idempotence', cle_idempotence, unique=True),
+    )
     
     @property
     def benefice(self):
@@ -71,10 +112,134 @@ class Vente(db.Model):
 class MouvementStock(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     produit_id = db.Column(db.Integer, db.ForeignKey('produit.id'), nullable=False)
-    type_mouvement = db.Column(db.String(20), nullable=False)  # 'entree' ou 'sortie'
+    type_mouvement = db.Column(db.String(20), nullable=False)  # 'entree', 'sortie' ou 'transfert'
     quantite = db.Column(db.Integer, nullable=False)
     motif = db.Column(db.String(200))
     date_mouvement = db.Column(db.DateTime, default=datetime.utcnow)
+    vente_id = db.Column(db.Integer, db.ForeignKey('vente.id'), nullable=True)  # Sortie liée à une vente
+    emplacement_id = db.Column(db.Integer, db.ForeignKey('emplacement.id'), nullable=True)
+    destination_id = db.Column(db.Integer, db.ForeignKey('emplacement.id'), nullable=True)  # Transferts
+    
+    # Valorisation: coût unitaire d'achat (entrées) et coût total du mouvement
+    # selon chaque méthode (sorties: coût des marchandises vendues)
+    cout_unitaire = db.Column(db.Float)
+    cout_fifo = db.Column(db.Float)
+    cout_cmp = db.Column(db.Float)
+    
+    vente = db.relationship('Vente', backref=db.backref('mouvements_stock', lazy=True))
+    emplacement = db.relationship('Emplacement', foreign_keys=[emplacement_id])
+    destination = db.relationship('Emplacement', foreign_keys=[destination_id])
+    
+    # Coût des ventes d'une période
+    __table_args__ = (db.Index('ix_mouvement_stock_type_date', type_mouvement, date_mouvement),)
+
+class CoucheStock(db.Model):
+    """Lot entré en stock et pas encore sorti (valorisation FIFO)
+
+    Une couche épuisée est supprimée: la table ne contient que le stock présent.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    produit_id = db.Column(db.Integer, db.ForeignKey('produit.id'), nullable=False)
+    mouvement_id = db.Column(db.Integer, db.ForeignKey('mouvement_stock.id'), nullable=True)  # NULL: stock d'ouverture
+    emplacement_id = db.Column(db.Integer, db.ForeignKey('emplacement.id'), nullable=True)
+    quantite_restante = db.Column(db.Integer, nullable=False)
+    cout_unitaire = db.Column(db.Float, nullable=False)
+    date_entree = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    mouvement = db.relationship('MouvementStock')
+    
+    # Couches d'un produit (et d'un emplacement), de la plus ancienne à la plus récente
+    __table_args__ = (
+        db.Index('ix_couche_stock_produit', produit_id, id),
+        db.Index('ix_couche_stock_emplacement', produit_id, emplacement_id, id),
+    )
+
+class VenteArchive(db.Model):
+    """Vente d'une période close, déplacée par ArchiveService (même id, mêmes colonnes)
+
+    Les références gardent l'historique sans bloquer la suppression d'un
+    produit, d'un client ou d'un emplacement: elles passent à NULL.
+    """
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    produit_id = db.Column(db.Integer, db.ForeignKey('produit.id', ondelete='SET NULL'), nullable=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id', ondelete='SET NULL'), nullable=True)
+    quantite = db.Column(db.Integer, nullable=False)
+    prix_unitaire = db.Column(db.Float, nullable=False)
+    total = db.Column(db.Float, nullable=False)
+    date_vente = db.Column(db.DateTime)
+    emplacement_id = db.Column(db.Integer, db.ForeignKey('emplacement.id', ondelete='SET NULL'), nullable=True)
+    cle_idempotence = db.Column(db.String(64))
+    
+    __table_args__ = (
+        db.Index('ix_vente_archive_produit_date', produit_id, date_vente, quantite),
+        db.Index('ix_vente_archive_cle_idempotence', cle_idempotence, unique=True),
+    )
+
+class MouvementStockArchive(db.Model):
+    """Mouvement d'une période close, déplacé par ArchiveService (même id, mêmes colonnes, références comme VenteArchive)"""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    produit_id = db.Column(db.Integer, db.ForeignKey('produit.id', ondelete='SET NULL'), nullable=True)
+    type_mouvement = db.Column(db.String(20), nullable=False)
+    quantite = db.Column(db.Integer, nullable=False)
+    motif = db.Column(db.String(200))
+    date_mouvement = db.Column(db.DateTime)
+    vente_id = db.Column(db.Integer, db.ForeignKey('vente_archive.id'), nullable=True)  # archivée avec sa vente
+    emplacement_id = db.Column(db.Integer, db.ForeignKey('emplacement.id', ondelete='SET NULL'), nullable=True)
+    destination_id = db.Column(db.Integer, db.ForeignKey('emplacement.id', ondelete='SET NULL'), nullable=True)
+    cout_unitaire = db.Column(db.Float)
+    cout_fifo = db.Column(db.Float)
+    cout_cmp = db.Column(db.Float)
+    
+    __table_args__ = (db.Index('ix_mouvement_stock_archive_type_date', type_mouvement, date_mouvement),)
+
+class Emplacement(db.Model):
+    """Magasin ou entrepôt qui détient du stock"""
+    id = db.Column(db.Integer, primary_key=True)
+    nom = db.Column(db.String(100), unique=True, nullable=False)
+    type_emplacement = db.Column(db.String(20), nullable=False, default='magasin')  # 'magasin' ou 'entrepot'
+    par_defaut = db.Column(db.Boolean, nullable=False, default=False)  # Reçoit les opérations sans emplacement
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StockEmplacement(db.Model):
+    """Quantité d'un produit dans un emplacement
+
+    Les écritures d'un emplacement ne verrouillent que ses lignes; le total
+    Produit.stock suit par VariationStock (voir EmplacementService).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    produit_id = db.Column(db.Integer, db.ForeignKey('produit.id'), nullable=False)
+    emplacement_id = db.Column(db.Integer, db.ForeignKey('emplacement.id'), nullable=False)
+    quantite = db.Column(db.Integer, nullable=False, default=0)
+    seuil_alerte = db.Column(db.Integer)  # NULL: seuil du produit
+    
+    emplacement = db.relationship('Emplacement')
+    
+    __table_args__ = (db.Index('ix_stock_emplacement', emplacement_id, produit_id, unique=True),)
+
+class VariationStock(db.Model):
+    """Variation du stock total d'un produit, en attente de report sur Produit.stock
+
+    Journal en ajout seul: chaque transaction ajoute ses lignes sans toucher
+    à la ligne du produit; EmplacementService.consolider() les reporte.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    produit_id = db.Column(db.Integer, db.ForeignKey('produit.id'), nullable=False)
+    variation = db.Column(db.Integer, nullable=False)
+
+class AlerteStock(db.Model):
+    """Franchissement du seuil d'alerte d'un produit, dans un sens ou dans l'autre
+
+    Journal en ajout seul: les clients suivent les nouvelles alertes par id
+    croissant (GET /api/stocks/alertes?apres=<id>).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    produit_id = db.Column(db.Integer, db.ForeignKey('produit.id'), nullable=False)
+    type_alerte = db.Column(db.String(20), nullable=False)  # 'stock_bas' ou 'stock_retabli'
+    stock = db.Column(db.Integer, nullable=False)
+    seuil_alerte = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_alerte_stock_produit', produit_id),)
 
 class Livraison(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -85,6 +250,13 @@ class Livraison(db.Model):
     date_livraison = db.Column(db.DateTime)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Tri des tableaux, avec ou sans filtre de statut
+    __table_args__ = (
+        db.Index('ix_livraison_created_at', created_at),
+        db.Index('ix_livraison_statut_created_at', statut, created_at),
+        db.Index('ix_livraison_date_prevue', date_prevue),
+    )
 
 class Reservation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -95,3 +267,53 @@ class Reservation(db.Model):
     date_reservation = db.Column(db.DateTime, default=datetime.utcnow)
     date_limite = db.Column(db.DateTime)
     notes = db.Column(db.Text)
+    
+    # Tri des tableaux, avec ou sans filtre de statut
+    __table_args__ = (
+        db.Index('ix_reservation_date_reservation', date_reservation),
+        db.Index('ix_reservation_statut_date_reservation', statut, date_reservation),
+        db.Index('ix_reservation_date_limite', date_limite),
+    )
+
+class VersionTable(db.Model):
+    """Version de chaque table, incrémentée par les écritures (ETag des GET)"""
+    nom = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    modifie_le = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Changement(db.Model):
+    """Création, modification ou suppression d'une ligne des tables suivies (outbox)
+
+    Journal en ajout seul, écrit dans la transaction de l'écriture: les
+    systèmes en aval le suivent par curseur (GET /api/changes?after=<curseur>).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    # PostgreSQL: transaction qui a écrit la ligne (txid_current()), 0 ailleurs
+    transaction_id = db.Column(db.BigInteger, nullable=False, default=0)
+    table_nom = db.Column(db.String(50), nullable=False)
+    operation = db.Column(db.String(10), nullable=False)  # 'insert', 'update' ou 'delete'
+    ligne_id = db.Column(db.Integer, nullable=False)
+    donnees = db.Column(db.Text)  # JSON: colonnes de la ligne créée, ou modifiées
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Ordre de lecture du flux
+    __table_args__ = (db.Index('ix_changement_curseur', transaction_id, id),)
+
+def requete_complete(modele, archive):
+    """UNION ALL des lignes actives et archivées de modele (colonnes de modele)"""
+    table = modele.__table__
+    return union_all(
+        select(*table.columns),
+        select(*[archive.__table__.c[colonne.name] for colonne in table.columns])
+    )
+
+def vue_complete(modele, archive):
+    """Lignes actives et archivées de modele, lues comme des objets modele (lecture seule)
+
+    À utiliser pour les historiques, statistiques et exports qui peuvent
+    remonter avant la limite d'archivage (ArchiveService).
+    """
+    return aliased(modele, requete_complete(modele, archive).subquery(f'{modele.__tablename__}_complete'))
+
+VenteComplete = vue_complete(Vente, VenteArchive)
+MouvementStockComplete = vue_complete(MouvementStock, MouvementStockArchive)
@@ -0,0 +1,131 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import bcrypt
+
+class AuthentificationSaturee(Exception):
+    """Trop de vérifications de mot de passe en attente"""
+
+class PasswordService:
+    # Coût par défaut de chaque algorithme (scrypt correspond au défaut de werkzeug)
+    COUTS_PAR_DEFAUT = {
+        'bcrypt': 12,          # log2 du nombre de tours
+        'pbkdf2:sha256': 600000,  # itérations
+        'scrypt': 32768        # paramètre N
+    }
+
+    # Coûts acceptés: (minimum, maximum), le coût scrypt doit en plus être une puissance de 2
+    BORNES = {
+        'bcrypt': (4, 31),
+        'pbkdf2:sha256': (1, None),
+        'scrypt': (2, None)
+    }
+
+    _executor = None
+    _places = None
+    _verrou = threading.Lock()
+
+    @staticmethod
+    def politique():
+        """Retourner l'algorithme et le coût configurés"""
+        methode = current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+        if methode not in PasswordService.COUTS_PAR_DEFAUT:
+            raise ValueError(f"Algorithme de hachage inconnu: {methode}")
+        cout = current_app.config.get('PASSWORD_HASH_COST') or PasswordService.COUTS_PAR_DEFAUT[methode]
+        return methode, PasswordService.valider(methode, cout)
+
+    @staticmethod
+    def valider(methode, cout):
+        """Vérifier que le coût a un sens pour l'algorithme (ex: 32768 est un N scrypt, pas des tours bcrypt)"""
+        cout = int(cout)
+        minimum, maximum = PasswordService.BORNES[methode]
+        if cout < minimum or (maximum is not None and cout > maximum):
+            bornes = f"entre {minimum} et {maximum}" if maximum is not None else f"au moins {minimum}"
+            raise ValueError(f"Coût {cout} invalide pour {methode}: {bornes} attendu")
+        if methode == 'scrypt' and cout & (cout - 1):
+            raise ValueError(f"Coût {cout} invalide pour scrypt: puissance de 2 attendue")
+        return cout
+
+    @staticmethod
+    def init_app(app):
+        """Refuser au démarrage une politique de hachage invalide plutôt qu'à la première connexion"""
+        with app.app_context():
+            PasswordService.politique()
+
+    @staticmethod
+    def _hacher(password, methode, cout):
+        if methode == 'bcrypt':
+            return bcrypt.generate_password_hash(password, cout).decode('utf-8')
+        if methode == 'scrypt':
+            return generate_password_hash(password, method=f'scrypt:{cout}:8:1')
+        return generate_password_hash(password, method=f'{methode}:{cout}')
+
+    @staticmethod
+    def _verifier(password_hash, password):
+        if password_hash.startswith('$2'):
+            return bcrypt.check_password_hash(password_hash, password)
+        return check_password_hash(password_hash, password)
+
+    @staticmethod
+    def hacher(password):
+        """Hacher un mot de passe selon la politique courante"""
+        methode, cout = PasswordService.politique()
+        return PasswordService._hacher(password, methode, cout)
+
+    @staticmethod
+    def verifier(password_hash, password):
+        """Vérifier un mot de passe, quel que soit l'algorithme du hachage stocké"""
+        return PasswordService._verifier(password_hash, password)
+
+    @staticmethod
+    def doit_rehacher(password_hash):
+        """Indiquer si un hachage stocké ne correspond plus à la politique courante"""
+        methode, cout = PasswordService.politique()
+        if password_hash.startswith('$2'):
+            return methode != 'bcrypt' or int(password_hash.split('$')[2]) != cout
+        parametres = password_hash.split('$', 1)[0]
+        if methode == 'scrypt':
+            return parametres != f'scrypt:{cout}:8:1'
+        return parametres != f'{methode}:{cout}'
+
+    @staticmethod
+    def _executeur():
+        """Créer à la demande l'exécuteur borné dédié au hachage"""
+        with PasswordService._verrou:
+            if PasswordService._executor is None:
+                workers = current_app.config.get('PASSWORD_HASH_WORKERS', 2)
+                file_attente = current_app.config.get('PASSWORD_HASH_QUEUE', 16)
+                PasswordService._executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix='hachage'
+                )
+                PasswordService._places = threading.BoundedSemaphore(workers + file_attente)
+            return PasswordService._executor
+
+    @staticmethod
+    def executer(fonction, *args):
+        """Exécuter un calcul de hachage sur l'exécuteur borné
+
+        Le nombre de calculs simultanés est limité au nombre de workers et
+        la file d'attente est bornée: au-delà, AuthentificationSaturee est
+        levée au lieu de bloquer le thread de requête indéfiniment.
+        """
+        executeur = PasswordService._executeur()
+        attente = current_app.config.get('PASSWORD_HASH_TIMEOUT', 5)
+        if not PasswordService._places.acquire(timeout=attente):
+            raise AuthentificationSaturee("Trop de connexions simultanées, réessayez")
+        try:
+            return executeur.submit(fonction, *args).result()
+        finally:
+            PasswordService._places.release()
+
+    @staticmethod
+    def verifier_hors_thread(password_hash, password):
+        """Vérifier un mot de passe sur l'exécuteur borné"""
+        return PasswordService.executer(PasswordService._verifier, password_hash, password)
+
+    @staticmethod
+    def hacher_hors_thread(password):
+        """Hacher un mot de passe sur l'exécuteur borné"""
+        methode, cout = PasswordService.politique()
+        return PasswordService.executer(PasswordService._hacher, password, methode, cout)
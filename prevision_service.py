@@ -0,0 +1,159 @@
+import math
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+import numpy as np
+from sqlalchemy import select, func, update
+from models import Produit, VenteComplete, db
+from services.replica_service import ReplicaService
+from services.alerte_service import AlerteService
+from services.changement_service import ChangementService
+
+class PrevisionService:
+    """Prévision de la demande et points de commande, pour tout le catalogue à la fois
+
+    L'historique des ventes journalières est lu en une requête groupée
+    (produit, jour, quantité). Chaque statistique est ensuite une somme
+    pondérée par produit, calculée par np.bincount sur ces seules lignes:
+    ni matrice produits × jours, ni boucle par produit.
+
+    - demande journalière: lissage exponentiel simple (alpha) ou moyenne
+      mobile sur la fenêtre
+    - stock de sécurité: z(niveau de service) × écart-type journalier × √délai
+    - point de commande (seuil_alerte): demande × délai + stock de sécurité
+    - quantité cible: demande × (délai + couverture) + stock de sécurité
+    """
+
+    @staticmethod
+    def parametres(config):
+        """Paramètres du planificateur lus dans la configuration de l'application"""
+        return {
+            'delai': config['PREVISION_DELAI'],
+            'couverture': config['PREVISION_COUVERTURE'],
+            'niveau_service': config['PREVISION_NIVEAU_SERVICE'],
+            'methode': config['PREVISION_METHODE'],
+        }
+
+    @staticmethod
+    def lire_historique(debut, fin):
+        """Ventes journalières de [debut, fin[: tableaux produit_id, jour (0 = debut), quantité"""
+        jour = func.date(VenteComplete.date_vente)
+        lignes = db.session.execute(
+            select(VenteComplete.produit_id, jour, func.sum(VenteComplete.quantite))
+            .where(VenteComplete.date_vente >= debut, VenteComplete.date_vente < fin)
+            .group_by(VenteComplete.produit_id, jour)
+        ).all()
+
+        # date() rend une chaîne sous SQLite et une date sous PostgreSQL
+        index_jours = {j: (date.fromisoformat(str(j)[:10]) - debut.date()).days
+                       for j in {ligne[1] for ligne in lignes}}
+        n = len(lignes)
+        return (
+            np.fromiter((ligne[0] for ligne in lignes), dtype=np.int64, count=n),
+            np.fromiter((index_jours[ligne[1]] for ligne in lignes), dtype=np.int64, count=n),
+            np.fromiter((ligne[2] for ligne in lignes), dtype=np.float64, count=n),
+        )
+
+    @staticmethod
+    def planifier(delai=7, couverture=14, niveau_service=0.95, methode='lissage',
+                  historique=730, fenetre=56, alpha=0.1, aujourd_hui=None):
+        """Plan de réapprovisionnement de tous les produits (tableaux NumPy, rien n'est écrit)
+
+        L'historique s'arrête hier: la journée en cours est incomplète.
+        """
+        aujourd_hui = aujourd_hui or date.today()
+        fin = datetime.combine(aujourd_hui, datetime.min.time())
+        debut = fin - timedelta(days=historique)
+
+        with ReplicaService.lecture():
+            produits = db.session.execute(
+                select(Produit.id, Produit.stock, Produit.created_at).order_by(Produit.id)
+            ).all()
+            ventes = PrevisionService.lire_historique(debut, fin)
+
+        return PrevisionService.calculer(produits, ventes, debut, delai, couverture, niveau_service,
+                                         methode, historique, fenetre, alpha)
+
+    @staticmethod
+    def calculer(produits, ventes, debut, delai, couverture, niveau_service, methode, historique, fenetre, alpha):
+        """Calcul du plan à partir des produits (id, stock, created_at) triés par id
+        et de l'historique lu par lire_historique depuis `debut`"""
+        produit_ids, jours, quantites = ventes
+        n = len(produits)
+        ids = np.fromiter((p[0] for p in produits), dtype=np.int64, count=n)
+        stock = np.fromiter((p[1] or 0 for p in produits), dtype=np.float64, count=n)
+
+        # Ventes de produits supprimés depuis: ignorées
+        ligne = np.minimum(np.searchsorted(ids, produit_ids), max(n - 1, 0))
+        connu = ids[ligne] == produit_ids if n else np.zeros(len(ligne), dtype=bool)
+        ligne, jours, quantites = ligne[connu], jours[connu], quantites[connu]
+        somme = lambda poids: np.bincount(ligne, weights=poids, minlength=n)
+
+        # Jours d'historique disponibles: depuis la création du produit (ou sa
+        # première vente si elle est antérieure, produits importés), au plus `historique`
+        creation = np.fromiter(((p[2] - debut).days if p[2] else 0 for p in produits), dtype=np.int64, count=n)
+        premier_jour = np.clip(creation, 0, historique - 1)
+        np.minimum.at(premier_jour, ligne, jours)
+        disponibles = historique - premier_jour
+
+        # Moyenne mobile et écart-type journalier sur la fenêtre (jours sans vente compris)
+        dans_fenetre = (jours >= historique - fenetre).astype(np.float64)
+        jours_fenetre = np.minimum(fenetre, disponibles)
+        moyenne = somme(quantites * dans_fenetre) / jours_fenetre
+        variance = somme(quantites ** 2 * dans_fenetre) / jours_fenetre - moyenne ** 2
+        ecart_type = np.sqrt(np.maximum(variance, 0))
+
+        # Lissage exponentiel: poids alpha(1-alpha)^âge, normalisés sur les jours disponibles
+        poids = alpha * (1 - alpha) ** (historique - 1 - jours)
+        lissage = somme(quantites * poids) / (1 - (1 - alpha) ** disponibles)
+
+        demande = lissage if methode == 'lissage' else moyenne
+        stock_securite = NormalDist().inv_cdf(niveau_service) * ecart_type * math.sqrt(delai)
+        point_commande = np.ceil(demande * delai + stock_securite)
+        cible = np.ceil(demande * (delai + couverture) + stock_securite)
+
+        return {
+            'ids': ids,
+            'avec_historique': somme(quantites) > 0,
+            'demande': demande,
+            'stock_securite': stock_securite,
+            'seuil_alerte': point_commande.astype(np.int64),
+            'quantite_cible': cible.astype(np.int64),
+            'a_commander': np.maximum(cible - stock, 0).astype(np.int64),
+        }
+
+    @staticmethod
+    def appliquer(plan):
+        """Écrire seuil_alerte, quantite_cible et demande_journaliere des produits vendus
+
+        Les produits sans vente sur l'historique gardent leurs valeurs.
+        """
+        masque = plan['avec_historique']
+        lignes = [
+            {'id': int(i), 'seuil_alerte': int(s), 'quantite_cible': int(c), 'demande_journaliere': float(d)}
+            for i, s, c, d in zip(plan['ids'][masque], plan['seuil_alerte'][masque],
+                                  plan['quantite_cible'][masque], plan['demande'][masque])
+        ]
+        if lignes:
+            db.session.execute(update(Produit), lignes)
+            ChangementService.enregistrer(db.session, Produit, 'update', lignes)
+            AlerteService.synchroniser()
+            db.session.commit()
+        return len(lignes)
+
+    @staticmethod
+    def resume(plan, limite=20):
+        """Synthèse du plan et produits ayant le plus à commander"""
+        ordre = np.argsort(-plan['a_commander'], kind='stable')[:limite]
+        return {
+            'produits': int(len(plan['ids'])),
+            'avec_historique': int(plan['avec_historique'].sum()),
+            'a_commander': int((plan['a_commander'] > 0).sum()),
+            'suggestions': [{
+                'id': int(plan['ids'][i]),
+                'demande_journaliere': round(float(plan['demande'][i]), 3),
+                'stock_securite': round(float(plan['stock_securite'][i]), 1),
+                'seuil_alerte': int(plan['seuil_alerte'][i]),
+                'quantite_cible': int(plan['quantite_cible'][i]),
+                'a_commander': int(plan['a_commander'][i]),
+            } for i in ordre if plan['a_commander'][i] > 0]
+        }
@@ -1,7 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func
 from models import Produit, db
+from serializers import produit_json
 from services.stock_service import StockService
+from services.version_service import conditionnel
+from services.recherche_service import RechercheService
+from services.tableau_service import TableauService
 
 produits_bp = Blueprint('produits', __name__)
 
@@ -13,16 +18,55 @@ def login_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+# Colonnes triables du tableau (index ix_produit_nom_lower, ix_produit_prix_unitaire, ix_produit_stock)
+COLONNES_TRI = {
+    'nom': func.lower(Produit.nom),
+    'prix_unitaire': Produit.prix_unitaire,
+    'stock': Produit.stock
+}
+
+def contexte_tableau():
+    search = request.args.get('search', '')
+    query = Produit.query
+    if search:
+        query = query.filter(Produit.nom.contains(search))
+    
+    produits, tri = TableauService.paginer(query, COLONNES_TRI, 'nom')
+    return {'produits': produits, 'tri': tri, 'search': search}
+
 @produits_bp.route('/produits')
 @login_required
+@conditionnel(Produit)
 def liste_produits():
-    search = request.args.get('search', '')
-    if search:
-        produits = Produit.query.filter(Produit.nom.contains(search)).all()
-    else:
-        produits = Produit.query.all()
+    return render_template('produits.html', **contexte_tableau())
+
+@produits_bp.route('/produits/tableau')
+@login_required
+@conditionnel(Produit)
+def tableau_produits():
+    """Fragment: tableau seul (changement de page ou de tri)"""
+    return render_template('produits_tableau.html', **contexte_tableau())
+
+@produits_bp.route('/produits/recherche')
+@login_required
+def recherche_produits():
+    """Suggestions par préfixe du nom pour les sélecteurs des formulaires"""
+    terme = request.args.get('q', '').strip()
+    if not terme:
+        return jsonify([])
     
-    return render_template('produits.html', produits=produits, search=search)
+    requete = Produit.query.filter(RechercheService.filtre_prefixe(Produit.nom, terme))
+    if request.args.get('en_stock'):
+        requete = requete.filter(Produit.stock > 0)
+    produits = requete.order_by(func.lower(Produit.nom)).limit(
+        RechercheService.limite(request.args.get('limit', type=int))
+    ).all()
+    return jsonify([{
+        'id': p.id,
+        'nom': p.nom,
+        'stock': p.stock,
+        'prix_unitaire': p.prix_unitaire
+    } for p in produits])
 
 @produits_bp.route('/produits/ajouter', methods=['POST'])
 @login_required
@@ -44,11 +88,13 @@ def ajouter_produit():
     try:
         db.session.add(produit)
         db.session.commit()
-        flash(f'Produit "{nom}" ajouté avec succès', 'success')
     except Exception as e:
         db.session.rollback()
-        flash('Erreur lors de l\'ajout du produit', 'error')
+        return TableauService.erreur('Erreur lors de l\'ajout du produit', 'produits.liste_produits')
     
+    if TableauService.fragment():
+        return render_template('produits_ligne.html', produit=produit), 201
+    flash(f'Produit "{nom}" ajouté avec succès', 'success')
     return redirect(url_for('produits.liste_produits'))
 
 @produits_bp.route('/produits/modifier/<int:produit_id>', methods=['POST'])
@@ -63,11 +109,13 @@ def modifier_produit(produit_id):
     
     try:
         db.session.commit()
-        flash('Produit modifié avec succès', 'success')
     except Exception as e:
         db.session.rollback()
-        flash('Erreur lors de la modification du produit', 'error')
+        return TableauService.erreur('Erreur lors de la modification du produit', 'produits.liste_produits')
     
+    if TableauService.fragment():
+        return render_template('produits_ligne.html', produit=produit)
+    flash('Produit modifié avec succès', 'success')
     return redirect(url_for('produits.liste_produits'))
 
 @produits_bp.route('/produits/supprimer/<int:produit_id>', methods=['POST'])
@@ -78,28 +126,19 @@ def supprimer_produit(produit_id):
     try:
         db.session.delete(produit)
         db.session.commit()
-        flash('Produit supprimé avec succès', 'success')
     except Exception as e:
         db.session.rollback()
-        flash('Erreur lors de la suppression du produit', 'error')
+        return TableauService.erreur('Erreur lors de la suppression du produit', 'produits.liste_produits')
     
-    return redirect(url_for('produits.liste_produits'))
+    return TableauService.supprime('Produit supprimé avec succès', 'produits.liste_produits')
 
 # API Routes
 @produits_bp.route('/api/produits', methods=['GET'])
 @jwt_required()
+@conditionnel(Produit)
 def api_liste_produits():
     produits = Produit.query.all()
-    return jsonify([{
-        'id': p.id,
-        'nom': p.nom,
-        'prix_achat': p.prix_achat,
-        'prix_unitaire': p.prix_unitaire,
-        'stock': p.stock,
-        'seuil_alerte': p.seuil_alerte,
-        'est_stock_bas': p.est_stock_bas,
-        'marge_benefice': p.marge_benefice
-    } for p in produits])
+    return jsonify([produit_json(p) for p in produits])
 
 @produits_bp.route('/api/produits', methods=['POST'])
 @jwt_required()
@@ -0,0 +1,97 @@
+import logging
+import os
+import traceback
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+class QueryBudgetExceeded(AssertionError):
+    """Un endpoint a exécuté plus de requêtes SQL que son budget déclaré"""
+
+def query_budget(max_requetes):
+    """Déclarer le nombre maximal de requêtes SQL d'un endpoint
+
+    À placer juste sous le décorateur @route pour que l'attribut soit porté
+    par la fonction de vue enregistrée.
+    """
+    def decorator(f):
+        f.query_budget = max_requetes
+        return f
+    return decorator
+
+class QueryProfiler:
+    """Profilage SQL par requête pour le développement et les tests
+
+    Modes (config QUERY_PROFILER):
+    - off: rien n'est installé
+    - warn: requêtes répétées et dépassements de budget journalisés
+    - raise: un dépassement de budget lève QueryBudgetExceeded (fait échouer les tests)
+    """
+    _ecouteur_installe = False
+
+    @staticmethod
+    def init_app(app):
+        if app.config.get('QUERY_PROFILER', 'off') == 'off':
+            return
+
+        app.before_request(QueryProfiler._debut_requete)
+        app.after_request(QueryProfiler._fin_requete)
+
+        if not QueryProfiler._ecouteur_installe:
+            event.listen(Engine, 'before_cursor_execute', QueryProfiler._avant_sql)
+            QueryProfiler._ecouteur_installe = True
+
+    @staticmethod
+    def _site_appel():
+        """Premier appelant situé dans le code de l'application"""
+        racine = current_app.root_path
+        ce_fichier = os.path.abspath(__file__)
+        for frame in reversed(traceback.extract_stack()[:-2]):
+            fichier = os.path.abspath(frame.filename)
+            if fichier.startswith(racine) and fichier != ce_fichier and 'site-packages' not in fichier:
+                return f"{os.path.relpath(fichier, racine)}:{frame.lineno} ({frame.name})"
+        return "inconnu"
+
+    @staticmethod
+    def _debut_requete():
+        g.profiler_requetes = []
+
+    @staticmethod
+    def _avant_sql(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'profiler_requetes' in g:
+            g.profiler_requetes.append((statement, QueryProfiler._site_appel()))
+
+    @staticmethod
+    def _fin_requete(response):
+        requetes = g.pop('profiler_requetes', None)
+        if requetes is None:
+            return response
+
+        endpoint = request.endpoint or 'inconnu'
+        response.headers['X-Query-Count'] = str(len(requetes))
+
+        # Regrouper les requêtes identiques (même SQL, paramètres différents)
+        groupes = {}
+        for statement, site in requetes:
+            groupes.setdefault(statement, []).append(site)
+
+        seuil = current_app.config.get('QUERY_PROFILER_REPEAT', 3)
+        for statement, sites in groupes.items():
+            if len(sites) >= seuil:
+                logger.warning(
+                    "N+1 probable sur %s: %d requêtes identiques depuis %s\n%s",
+                    endpoint, len(sites), ', '.join(sorted(set(sites))), statement
+                )
+
+        vue = current_app.view_functions.get(request.endpoint)
+        budget = getattr(vue, 'query_budget', None)
+        if budget is not None and len(requetes) > budget:
+            message = (f"{endpoint}: {len(requetes)} requêtes SQL pour un budget de {budget}\n" +
+                       '\n'.join(f"  {len(sites)}x {s[:120]} [{sites[0]}]" for s, sites in groupes.items()))
+            if current_app.config.get('QUERY_PROFILER') == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
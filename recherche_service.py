@@ -0,0 +1,24 @@
+from sqlalchemy import func
+
+LIMITE_DEFAUT = 20
+LIMITE_MAX = 50
+
+class RechercheService:
+    @staticmethod
+    def filtre_prefixe(colonne, terme):
+        """Condition « commence par » (insensible à la casse) servie par l'index sur lower(colonne)
+
+        Intervalle [terme, terme suivant[ sur lower(colonne) pour parcourir l'index,
+        complété par LIKE pour les collations où l'intervalle ne suffit pas.
+        """
+        terme = terme.lower()
+        suivant = terme[:-1] + chr(ord(terme[-1]) + 1)
+        expression = func.lower(colonne)
+        return (expression >= terme) & (expression < suivant) & expression.startswith(terme, autoescape=True)
+
+    @staticmethod
+    def limite(valeur):
+        """Nombre de suggestions demandé, borné"""
+        if not valeur or valeur < 1:
+            return LIMITE_DEFAUT
+        return min(valeur, LIMITE_MAX)
@@ -0,0 +1,111 @@
+import sqlite3
+from contextlib import contextmanager
+from flask import g, request, current_app, has_app_context, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+COOKIE_PRIMAIRE = 'lecture_primaire'
+
+def lecture_replica(f):
+    """Envoyer les requêtes SQL d'un endpoint en lecture (GET) vers le réplica
+
+    À placer juste sous le décorateur @route pour que l'attribut soit porté
+    par la fonction de vue enregistrée.
+    """
+    f.lecture_replica = True
+    return f
+
+class SessionRoutee(Session):
+    """Session qui lit sur le réplica quand une lecture est demandée
+
+    Les flush et les INSERT/UPDATE/DELETE restent toujours sur le primaire.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            if ReplicaService.lecture_active():
+                moteur = self._db.engines.get('replica')
+                if moteur is not None:
+                    return moteur
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class ReplicaService:
+    """Routage des lectures vers le réplica (bind 'replica', DATABASE_REPLICA_URL)
+
+    - endpoints GET marqués @lecture_replica et blocs `with ReplicaService.lecture()`
+      lus sur le réplica
+    - lecture de ses propres écritures: après un POST/PUT/DELETE réussi, le cookie
+      lecture_primaire renvoie les lectures du client sur le primaire pendant
+      REPLICA_RETARD_MAX secondes; l'en-tête X-Read-Primary ou
+      `with ReplicaService.primaire()` font de même à la demande
+    """
+
+    @staticmethod
+    def init_app(app):
+        if 'replica' not in app.config.get('SQLALCHEMY_BINDS', {}):
+            return
+        app.before_request(ReplicaService._debut_requete)
+        app.after_request(ReplicaService._fin_requete)
+
+    @staticmethod
+    def lecture_active():
+        if not has_app_context():
+            return False
+        if has_request_context() and request.method not in ('GET', 'HEAD'):
+            return False  # une requête d'écriture relit toujours le primaire
+        return g.get('lecture_replica', 0) > 0 and not g.get('forcer_primaire', 0)
+
+    @staticmethod
+    @contextmanager
+    def lecture():
+        """Lire sur le réplica pendant le bloc (sauf si le primaire est forcé)"""
+        g.lecture_replica = g.get('lecture_replica', 0) + 1
+        try:
+            yield
+        finally:
+            g.lecture_replica -= 1
+
+    @staticmethod
+    @contextmanager
+    def primaire():
+        """Forcer les lectures sur le primaire pendant le bloc"""
+        g.forcer_primaire = g.get('forcer_primaire', 0) + 1
+        try:
+            yield
+        finally:
+            g.forcer_primaire -= 1
+
+    @staticmethod
+    def _debut_requete():
+        if request.cookies.get(COOKIE_PRIMAIRE) or request.headers.get('X-Read-Primary'):
+            g.forcer_primaire = 1
+        vue = current_app.view_functions.get(request.endpoint)
+        if getattr(vue, 'lecture_replica', False) and request.method in ('GET', 'HEAD'):
+            g.lecture_replica = 1
+
+    @staticmethod
+    def _fin_requete(response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(COOKIE_PRIMAIRE, '1', httponly=True, samesite='Lax',
+                                max_age=current_app.config.get('REPLICA_RETARD_MAX', 5))
+        return response
+
+    @staticmethod
+    def synchroniser_sqlite(app):
+        """Copier la base SQLite primaire vers le réplica SQLite (test en local)"""
+        from app import db
+        with app.app_context():
+            source = make_url(str(db.engine.url))
+            cible = make_url(str(db.engines['replica'].url))
+        if source.get_backend_name() != 'sqlite' or cible.get_backend_name() != 'sqlite':
+            raise ValueError("Synchronisation possible uniquement entre deux fichiers SQLite")
+
+        primaire = sqlite3.connect(source.database)
+        replica = sqlite3.connect(cible.database)
+        try:
+            primaire.backup(replica)
+        finally:
+            replica.close()
+            primaire.close()
+        return cible.database
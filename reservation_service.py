@@ -1,8 +1,16 @@
 from models import Reservation, Produit, Client, db
 from services.vente_service import VenteService
+from services.statut_service import StatutService
 from datetime import datetime
 
 class ReservationService:
+    # Transitions autorisées pour les changements en masse: statut cible -> statuts de départ.
+    # La confirmation crée une vente et passe par confirmer_reservation.
+    TRANSITIONS_STATUT = {
+        "Annulé": ("En attente",),
+        "En attente": ("Annulé",)
+    }
+    
     @staticmethod
     def creer_reservation(produit_id, client_id, quantite, date_limite=None, notes=""):
         """Créer une nouvelle réservation"""
@@ -51,6 +59,15 @@ class ReservationService:
             db.session.rollback()
             raise e
     
+    @staticmethod
+    def modifier_statuts_en_masse(mises_a_jour):
+        """Modifier le statut de plusieurs réservations en une seule transaction"""
+        return StatutService.appliquer_transitions(
+            Reservation,
+            mises_a_jour,
+            ReservationService.TRANSITIONS_STATUT
+        )
+    
     @staticmethod
     def confirmer_reservation(reservation_id):
         """Confirmer une réservation et créer la vente correspondante"""
@@ -1,7 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import joinedload
 from models import Reservation, Produit, Client, db
+from serializers import reservation_json
 from services.reservation_service import ReservationService
+from services.statut_service import StatutService
+from services.query_profiler_service import query_budget
+from services.version_service import conditionnel
+from services.tableau_service import TableauService
 from datetime import datetime
 
 reservations_bp = Blueprint('reservations', __name__)
@@ -14,21 +20,47 @@ def login_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
-@reservations_bp.route('/reservations')
-@login_required
-def liste_reservations():
+# Colonnes triables du tableau (index ix_reservation_date_reservation, ix_reservation_date_limite)
+COLONNES_TRI = {
+    'date_reservation': Reservation.date_reservation,
+    'date_limite': Reservation.date_limite
+}
+
+def contexte_tableau():
     statut_filtre = request.args.get('statut', '')
     
-    query = Reservation.query
+    query = Reservation.query.options(joinedload(Reservation.produit), joinedload(Reservation.client))
     if statut_filtre:
         query = query.filter_by(statut=statut_filtre)
     
-    reservations = query.order_by(Reservation.date_reservation.desc()).all()
-    produits = Produit.query.all()
-    clients = Client.query.all()
-    
-    return render_template('reservations.html', reservations=reservations,
-                         produits=produits, clients=clients, statut_filtre=statut_filtre)
+    reservations, tri = TableauService.paginer(query, COLONNES_TRI, '-date_reservation')
+    return {
+        'reservations': reservations,
+        'tri': tri,
+        'statut_filtre': statut_filtre,
+        'maintenant': datetime.utcnow()
+    }
+
+def ligne_reservation(reservation_id, statut=200):
+    """Fragment: ligne d'une réservation créée ou modifiée"""
+    reservation = db.session.get(Reservation, reservation_id, options=[
+        joinedload(Reservation.produit), joinedload(Reservation.client)
+    ])
+    return render_template('reservations_ligne.html', reservation=reservation,
+                         maintenant=datetime.utcnow()), statut
+
+@reservations_bp.route('/reservations')
+@login_required
+@conditionnel(Reservation, Produit, Client)
+def liste_reservations():
+    return render_template('reservations.html', **contexte_tableau())
+
+@reservations_bp.route('/reservations/tableau')
+@login_required
+@conditionnel(Reservation, Produit, Client)
+def tableau_reservations():
+    """Fragment: tableau seul (changement de page ou de tri)"""
+    return render_template('reservations_tableau.html', **contexte_tableau())
 
 @reservations_bp.route('/reservations/ajouter', methods=['POST'])
 @login_required
@@ -47,10 +79,12 @@ def ajouter_reservation():
         reservation = ReservationService.creer_reservation(
             produit_id, client_id, quantite, date_limite, notes
         )
-        flash('Réservation créée avec succès', 'success')
     except Exception as e:
-        flash(f'Erreur lors de la création: {str(e)}', 'error')
+        return TableauService.erreur(f'Erreur lors de la création: {str(e)}', 'reservations.liste_reservations')
     
+    if TableauService.fragment():
+        return ligne_reservation(reservation.id, 201)
+    flash('Réservation créée avec succès', 'success')
     return redirect(url_for('reservations.liste_reservations'))
 
 @reservations_bp.route('/reservations/modifier/<int:reservation_id>', methods=['POST'])
@@ -60,26 +94,30 @@ def modifier_statut_reservation(reservation_id):
     notes = request.form.get('notes', '')
     
     try:
-        if ReservationService.modifier_statut_reservation(reservation_id, nouveau_statut, notes):
-            flash('Statut de réservation modifié avec succès', 'success')
-        else:
-            flash('Erreur lors de la modification', 'error')
+        succes = ReservationService.modifier_statut_reservation(reservation_id, nouveau_statut, notes)
     except Exception as e:
-        flash(f'Erreur: {str(e)}', 'error')
+        return TableauService.erreur(f'Erreur: {str(e)}', 'reservations.liste_reservations')
     
+    if not succes:
+        return TableauService.erreur('Erreur lors de la modification', 'reservations.liste_reservations')
+    if TableauService.fragment():
+        return ligne_reservation(reservation_id)
+    flash('Statut de réservation modifié avec succès', 'success')
     return redirect(url_for('reservations.liste_reservations'))
 
 @reservations_bp.route('/reservations/confirmer/<int:reservation_id>', methods=['POST'])
 @login_required
 def confirmer_reservation(reservation_id):
     try:
-        if ReservationService.confirmer_reservation(reservation_id):
-            flash('Réservation confirmée et vente créée avec succès', 'success')
-        else:
-            flash('Erreur lors de la confirmation (stock insuffisant)', 'error')
+        succes = ReservationService.confirmer_reservation(reservation_id)
     except Exception as e:
-        flash(f'Erreur: {str(e)}', 'error')
+        return TableauService.erreur(f'Erreur: {str(e)}', 'reservations.liste_reservations')
     
+    if not succes:
+        return TableauService.erreur('Erreur lors de la confirmation (stock insuffisant)', 'reservations.liste_reservations')
+    if TableauService.fragment():
+        return ligne_reservation(reservation_id)
+    flash('Réservation confirmée et vente créée avec succès', 'success')
     return redirect(url_for('reservations.liste_reservations'))
 
 @reservations_bp.route('/reservations/supprimer/<int:reservation_id>', methods=['POST'])
@@ -90,28 +128,22 @@ def supprimer_reservation(reservation_id):
     try:
         db.session.delete(reservation)
         db.session.commit()
-        flash('Réservation supprimée avec succès', 'success')
     except Exception as e:
         db.session.rollback()
-        flash('Erreur lors de la suppression', 'error')
+        return TableauService.erreur('Erreur lors de la suppression', 'reservations.liste_reservations')
     
-    return redirect(url_for('reservations.liste_reservations'))
+    return TableauService.supprime('Réservation supprimée avec succès', 'reservations.liste_reservations')
 
 # API Routes
 @reservations_bp.route('/api/reservations', methods=['GET'])
+@query_budget(2)
 @jwt_required()
+@conditionnel(Reservation, Produit, Client)
 def api_liste_reservations():
-    reservations = Reservation.query.order_by(Reservation.date_reservation.desc()).all()
-    return jsonify([{
-        'id': r.id,
-        'produit_nom': r.produit.nom,
-        'client_nom': r.client.nom,
-        'quantite': r.quantite,
-        'statut': r.statut,
-        'date_reservation': r.date_reservation.isoformat(),
-        'date_limite': r.date_limite.isoformat() if r.date_limite else None,
-        'notes': r.notes
-    } for r in reservations])
+    reservations = Reservation.query.options(
+        joinedload(Reservation.produit), joinedload(Reservation.client)
+    ).order_by(Reservation.date_reservation.desc()).all()
+    return jsonify([reservation_json(r) for r in reservations])
 
 @reservations_bp.route('/api/reservations', methods=['POST'])
 @jwt_required()
@@ -152,3 +184,22 @@ def api_confirmer_reservation(reservation_id):
             
     except Exception as e:
         return jsonify({'message': f'Erreur: {str(e)}'}), 400
+
+@reservations_bp.route('/api/reservations/statuts', methods=['POST'])
+@jwt_required()
+def api_modifier_statuts():
+    try:
+        mises_a_jour = StatutService.lire_mises_a_jour(
+            request.get_json(silent=True),
+            request.files.get('fichier')
+        )
+        resultats = ReservationService.modifier_statuts_en_masse(mises_a_jour)
+        
+        return jsonify({
+            'mis_a_jour': sum(1 for r in resultats if r['succes']),
+            'echecs': sum(1 for r in resultats if not r['succes']),
+            'resultats': resultats
+        })
+        
+    except Exception as e:
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
@@ -0,0 +1,309 @@
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import Boolean
+from sqlalchemy.schema import CreateTable, DropTable, CreateIndex
+from models import db
+from services.archive_service import ArchiveService
+
+class _Compteur(io.TextIOBase):
+    """Sortie texte qui compte les lignes écrites (COPY TO STDOUT de psycopg2)"""
+
+    def __init__(self, sortie):
+        self.sortie = sortie
+        self.lignes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, donnees):
+        self.lignes += donnees.count('\n')
+        return self.sortie.write(donnees)
+
+class _Section:
+    """Lignes d'une table dans le flux de sauvegarde, jusqu'à la marque de fin \\."""
+
+    def __init__(self, entree):
+        self.entree = entree
+        self.lignes = 0
+        self.finie = False
+
+    def readline(self, taille=-1):
+        if self.finie:
+            return ''
+        ligne = self.entree.readline()
+        if not ligne.endswith('\n'):
+            # Fin du fichier, ou dernière ligne coupée en cours d'écriture
+            raise ValueError("Sauvegarde tronquée")
+        if ligne == '\\.\n':
+            self.finie = True
+            return ''
+        self.lignes += 1
+        return ligne
+
+    def read(self, taille=-1):
+        # COPY FROM STDIN de psycopg2: blocs d'environ `taille` caractères
+        morceaux = []
+        total = 0
+        while taille < 0 or total < taille:
+            ligne = self.readline()
+            if not ligne:
+                break
+            morceaux.append(ligne)
+            total += len(ligne)
+        return ''.join(morceaux)
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+class SauvegardeService:
+    """Sauvegarde cohérente de toutes les tables et restauration en chargement massif
+
+    Format: flux texte compressé en gzip. Une ligne d'en-tête JSON, puis pour
+    chaque table, dans l'ordre des clés étrangères, une ligne
+    `#table <nom> <colonne,colonne,...>`, ses lignes au format texte de COPY
+    (tabulations, \\N pour NULL, booléens t/f) et la marque de fin `\\.`.
+    Un même fichier se restaure sous SQLite comme sous PostgreSQL.
+
+    Instantané cohérent sans arrêter les écritures:
+    - SQLite: copie par l'API de sauvegarde en ligne dans un fichier
+      temporaire, lue et compressée ensuite;
+    - PostgreSQL: COPY ... TO STDOUT de toutes les tables dans une seule
+      transaction REPEATABLE READ en lecture seule.
+
+    Restauration (application arrêtée), en une seule transaction: tables
+    recréées sans leurs index secondaires, lignes chargées (COPY FROM STDIN,
+    ou executemany par lots sous SQLite), puis index reconstruits, séquences
+    recalées et statistiques du planificateur mises à jour.
+    """
+    FORMAT = 'ruinegestion-sauvegarde'
+    VERSION = 1
+    LOT = 10000  # lignes par executemany (SQLite)
+
+    _ECHAPPEMENTS = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+    _SEQUENCES = re.compile(r'\\(.)')
+    _CARACTERES = {'t': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v'}
+
+    @staticmethod
+    def sauvegarder(fichier, niveau=6):
+        """Écrire la sauvegarde dans fichier (chemin ou flux binaire); retourne {table: lignes}"""
+        if isinstance(fichier, str) and os.path.dirname(fichier):
+            os.makedirs(os.path.dirname(fichier), exist_ok=True)
+        tables = db.metadata.sorted_tables
+        with gzip.open(fichier, 'wt', compresslevel=niveau, encoding='utf-8', newline='\n') as sortie:
+            sortie.write(json.dumps({
+                'format': SauvegardeService.FORMAT,
+                'version': SauvegardeService.VERSION,
+                'dialecte': db.engine.dialect.name,
+                'date': datetime.utcnow().isoformat()
+            }) + '\n')
+            if db.engine.dialect.name == 'postgresql':
+                return SauvegardeService._sauvegarder_postgresql(sortie, tables)
+            return SauvegardeService._sauvegarder_sqlite(sortie, tables)
+
+    @staticmethod
+    def restaurer(fichier):
+        """Remplacer toutes les données par la sauvegarde, en une transaction
+
+        Un échec (fichier tronqué, colonne inconnue) laisse la base intacte.
+        Retourne {'tables': {table: lignes}, 'chargement': s, 'index': s}.
+        """
+        dialecte = db.engine.dialect
+        preparateur = dialecte.identifier_preparer
+        with gzip.open(fichier, 'rt', encoding='utf-8', newline='\n') as entree:
+            entete = json.loads(entree.readline() or '{}')
+            if entete.get('format') != SauvegardeService.FORMAT:
+                raise ValueError("Fichier de sauvegarde invalide")
+
+            connexion = db.engine.raw_connection()
+            try:
+                curseur = connexion.cursor()
+                if dialecte.name == 'sqlite':
+                    curseur.execute("BEGIN")  # sinon le module sqlite3 valide chaque DDL à part
+                for instruction in SauvegardeService._ddl_tables(dialecte):
+                    curseur.execute(instruction)
+
+                debut = time.perf_counter()
+                comptes = {}
+                while True:
+                    ligne = entree.readline()
+                    if not ligne:
+                        break
+                    if not ligne.startswith('#table '):
+                        raise ValueError("Fichier de sauvegarde invalide")
+                    _, nom, colonnes = ligne.rstrip('\n').split(' ', 2)
+                    colonnes = colonnes.split(',')
+                    section = _Section(entree)
+                    table = db.metadata.tables.get(nom)
+                    if table is None:
+                        for _ in section:
+                            pass  # table supprimée depuis la sauvegarde
+                        continue
+                    inconnues = [c for c in colonnes if c not in table.c]
+                    if inconnues:
+                        raise ValueError(f"Colonnes inconnues dans {nom}: {', '.join(inconnues)}")
+
+                    liste = ', '.join(preparateur.quote(c) for c in colonnes)
+                    if dialecte.name == 'postgresql':
+                        curseur.copy_expert(f"COPY {preparateur.format_table(table)} ({liste}) FROM STDIN", section)
+                    else:
+                        SauvegardeService._charger_sqlite(curseur, table, colonnes, liste, section)
+                    comptes[nom] = section.lignes
+                chargement = time.perf_counter() - debut
+
+                for instruction in SauvegardeService._ddl_index(dialecte):
+                    curseur.execute(instruction)
+                connexion.commit()
+            except Exception:
+                connexion.rollback()
+                raise
+            finally:
+                connexion.close()
+
+        index = time.perf_counter() - debut - chargement
+        ArchiveService.initialiser()
+        return {'tables': comptes, 'chargement': chargement, 'index': index}
+
+    @staticmethod
+    def _sauvegarder_postgresql(sortie, tables):
+        comptes = {}
+        connexion = db.engine.raw_connection()
+        try:
+            curseur = connexion.cursor()
+            # Même instantané pour toutes les tables
+            curseur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            preparateur = db.engine.dialect.identifier_preparer
+            for table in tables:
+                colonnes = [c.name for c in table.columns]
+                sortie.write(f"#table {table.name} {','.join(colonnes)}\n")
+                compteur = _Compteur(sortie)
+                curseur.copy_expert(
+                    f"COPY {preparateur.format_table(table)} "
+                    f"({', '.join(preparateur.quote(c) for c in colonnes)}) TO STDOUT",
+                    compteur
+                )
+                sortie.write('\\.\n')
+                comptes[table.name] = compteur.lignes
+            connexion.commit()
+        finally:
+            connexion.close()
+        return comptes
+
+    @staticmethod
+    def _sauvegarder_sqlite(sortie, tables):
+        descripteur, copie = tempfile.mkstemp(suffix='.db')
+        os.close(descripteur)
+        try:
+            # Instantané: la base est copiée d'un bloc, les écrivains ne sont pas bloqués ensuite
+            source = db.engine.raw_connection()
+            destination = sqlite3.connect(copie)
+            try:
+                source.driver_connection.backup(destination)
+            finally:
+                source.close()
+
+            comptes = {}
+            preparateur = db.engine.dialect.identifier_preparer
+            try:
+                for table in tables:
+                    colonnes = [c.name for c in table.columns]
+                    booleens = [i for i, c in enumerate(table.columns) if isinstance(c.type, Boolean)]
+                    sortie.write(f"#table {table.name} {','.join(colonnes)}\n")
+                    curseur = destination.execute(
+                        f"SELECT {', '.join(preparateur.quote(c) for c in colonnes)} "
+                        f"FROM {preparateur.format_table(table)}"
+                    )
+                    lignes = 0
+                    while True:
+                        lot = curseur.fetchmany(SauvegardeService.LOT)
+                        if not lot:
+                            break
+                        sortie.writelines(SauvegardeService._lignes_texte(lot, booleens))
+                        lignes += len(lot)
+                    sortie.write('\\.\n')
+                    comptes[table.name] = lignes
+            finally:
+                destination.close()
+            return comptes
+        finally:
+            os.remove(copie)
+
+    @staticmethod
+    def _charger_sqlite(curseur, table, colonnes, liste, section):
+        booleens = [i for i, c in enumerate(colonnes) if isinstance(table.c[c].type, Boolean)]
+        requete = (f"INSERT INTO {db.engine.dialect.identifier_preparer.format_table(table)} ({liste}) "
+                   f"VALUES ({', '.join('?' * len(colonnes))})")
+        lot = []
+        for ligne in section:
+            champs = ligne[:-1].split('\t')
+            if '\\' in ligne:
+                # NULL ou caractère échappé; sinon les champs sont pris tels quels
+                champs = [None if c == '\\N' else SauvegardeService._depuis_texte(c) if '\\' in c else c
+                          for c in champs]
+            for i in booleens:
+                if champs[i] is not None:
+                    champs[i] = champs[i] in ('t', 'true', '1')
+            lot.append(champs)
+            if len(lot) == SauvegardeService.LOT:
+                curseur.executemany(requete, lot)
+                lot = []
+        if lot:
+            curseur.executemany(requete, lot)
+
+    @staticmethod
+    def _ddl_tables(dialecte):
+        """Tables vidées et recréées sans leurs index secondaires (construits après le chargement)"""
+        instructions = [f"DROP VIEW IF EXISTS {vue}" for vue in ArchiveService.VUES]
+        instructions += [str(DropTable(table, if_exists=True).compile(dialect=dialecte))
+                         for table in reversed(db.metadata.sorted_tables)]
+        instructions += [str(CreateTable(table).compile(dialect=dialecte)) for table in db.metadata.sorted_tables]
+        return instructions
+
+    @staticmethod
+    def _ddl_index(dialecte):
+        instructions = []
+        for table in db.metadata.sorted_tables:
+            instructions += [str(CreateIndex(index).compile(dialect=dialecte)) for index in table.indexes]
+            # PostgreSQL: id chargés tels quels, la séquence doit repartir après le plus grand
+            if dialecte.name == 'postgresql' and table.autoincrement_column is not None:
+                nom = dialecte.identifier_preparer.format_table(table)
+                colonne = dialecte.identifier_preparer.quote(table.autoincrement_column.name)
+                instructions.append(
+                    f"SELECT setval(pg_get_serial_sequence('{nom}', '{table.autoincrement_column.name}'), "
+                    f"COALESCE(MAX({colonne}), 1), MAX({colonne}) IS NOT NULL) FROM {nom}"
+                )
+        instructions.append("ANALYZE")
+        return instructions
+
+    @staticmethod
+    def _lignes_texte(lot, booleens):
+        """Lignes SQLite au format texte de COPY"""
+        for ligne in lot:
+            champs = ['\\N' if v is None else str(v) for v in ligne]
+            for i in booleens:
+                if ligne[i] is not None:
+                    champs[i] = 't' if ligne[i] else 'f'
+            texte = '\t'.join(champs)
+            # Seuls les \ attendus sont ceux des \N: sinon une valeur contient \, tabulation ou fin de ligne
+            if (texte.count('\\') != ligne.count(None) or texte.count('\t') != len(champs) - 1
+                    or '\n' in texte or '\r' in texte):
+                texte = '\t'.join(
+                    c if v is None else c.translate(SauvegardeService._ECHAPPEMENTS) for c, v in zip(champs, ligne)
+                )
+            yield texte + '\n'
+
+    @staticmethod
+    def _depuis_texte(champ):
+        if champ == '\\N':
+            return None
+        if '\\' in champ:
+            return SauvegardeService._SEQUENCES.sub(
+                lambda m: SauvegardeService._CARACTERES.get(m.group(1), m.group(1)), champ
+            )
+        return champ
@@ -11,12 +11,19 @@ class SchedulerService:
     def __init__(self):
         self.scheduler_thread = None
         self.running = False
+        self.app = None
+    
+    def app_context(self):
+        """Contexte d'application pour les tâches (hors requête dans le thread du planificateur)"""
+        from flask import current_app
+        if self.app is not None:
+            return self.app.app_context()
+        return current_app.app_context()
     
     def daily_export_job(self):
         """Tâche d'export quotidien"""
         try:
-            from flask import current_app
-            with current_app.app_context():
+            with self.app_context():
                 # Export des données de la veille
                 yesterday = (datetime.now() - timedelta(days=1)).date()
                 
@@ -39,8 +46,7 @@ class SchedulerService:
     def weekly_summary_job(self):
         """Tâche de résumé hebdomadaire (optionnel)"""
         try:
-            from flask import current_app
-            with current_app.app_context():
+            with self.app_context():
                 logger.info("Génération du résumé hebdomadaire")
                 # Ici, on pourrait générer un résumé de la semaine
                 # Pour l'instant, on log juste
@@ -49,6 +55,30 @@ class SchedulerService:
         except Exception as e:
             logger.error(f"Erreur lors du résumé hebdomadaire: {str(e)}")
     
+    def archive_job(self):
+        """Archivage des périodes closes (ventes et mouvements de stock)"""
+        try:
+            with self.app_context():
+                from flask import current_app
+                from services.archive_service import ArchiveService
+                if not current_app.config['ARCHIVE_CONSERVATION_MOIS']:
+                    return
+                resume = ArchiveService.archiver(**ArchiveService.parametres(current_app.config))
+                logger.info(f"Archivage terminé: {resume['ventes']} ventes, {resume['mouvements']} mouvements")
+                
+        except Exception as e:
+            logger.error(f"Erreur lors de l'archivage: {str(e)}")
+    
+    def consolidation_job(self):
+        """Report des variations de stock restées en attente (processus arrêté, STOCK_CONSOLIDATION=off)"""
+        try:
+            with self.app_context():
+                from services.emplacement_service import EmplacementService
+                EmplacementService.consolider()
+                
+        except Exception as e:
+            logger.error(f"Erreur lors de la consolidation du stock: {str(e)}")
+    
     def setup_schedules(self):
         """Configuration des tâches programmées"""
         # Export quotidien à 23h30
@@ -57,6 +87,12 @@ class SchedulerService:
         # Résumé hebdomadaire le dimanche à 23h45
         schedule.every().sunday.at("23:45").do(self.weekly_summary_job)
         
+        # Archivage des périodes closes à 3h, hors des heures de vente
+        schedule.every().day.at("03:00").do(self.archive_job)
+        
+        # Rattrapage de la consolidation du stock total
+        schedule.every().minute.do(self.consolidation_job)
+        
         # Export de test toutes les 5 minutes (pour les tests)
         # Décommentez la ligne suivante pour tester
         # schedule.every(5).minutes.do(self.daily_export_job)
@@ -64,6 +100,8 @@ class SchedulerService:
         logger.info("Tâches programmées configurées:")
         logger.info("- Export quotidien: tous les jours à 23h30")
         logger.info("- Résumé hebdomadaire: dimanche à 23h45")
+        logger.info("- Archivage: tous les jours à 3h")
+        logger.info("- Consolidation du stock: toutes les minutes")
     
     def run_scheduler(self):
         """Exécute le planificateur en arrière-plan"""
@@ -78,12 +116,14 @@ class SchedulerService:
                 logger.error(f"Erreur dans le planificateur: {str(e)}")
                 time.sleep(60)
     
-    def start(self):
+    def start(self, app=None):
         """Démarre le planificateur dans un thread séparé"""
         if self.scheduler_thread and self.scheduler_thread.is_alive():
             logger.warning("Le planificateur est déjà en cours d'exécution")
             return
         
+        if app is not None:
+            self.app = app
         self.setup_schedules()
         self.scheduler_thread = threading.Thread(target=self.run_scheduler, daemon=True)
         self.scheduler_thread.start()
@@ -99,8 +139,7 @@ class SchedulerService:
     def run_manual_export(self, date=None):
         """Exécute manuellement un export pour une date donnée"""
         try:
-            from flask import current_app
-            with current_app.app_context():
+            with self.app_context():
                 if not date:
                     date = datetime.now().date()
                 
@@ -116,9 +155,9 @@ class SchedulerService:
 # Instance globale du planificateur
 scheduler_service = SchedulerService()
 
-def start_scheduler():
+def start_scheduler(app=None):
     """Fonction utilitaire pour démarrer le planificateur"""
-    scheduler_service.start()
+    scheduler_service.start(app)
 
 def stop_scheduler():
     """Fonction utilitaire pour arrêter le planificateur"""
@@ -0,0 +1,160 @@
+"""Générateur de données synthétiques pour les benchmarks.
+
+Usage:
+    python seed_data.py --echelle moyen
+    python seed_data.py --produits 50000 --clients 200000 --ventes 10000000 --mouvements 20000000
+
+La base cible est celle de DATABASE_URL (SQLite ou PostgreSQL). Les
+insertions se font par lots avec des INSERT multi-lignes. Les données
+sont volontairement déséquilibrées: popularité des produits et des
+clients en loi de Zipf, ventes sans client, saisonnalité hebdomadaire,
+croissance sur la période et heures d'ouverture.
+"""
+import argparse
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+os.environ.setdefault("STARTUP_MODE", "auto")
+os.environ.setdefault("SCHEDULER_MODE", "off")
+
+from sqlalchemy import insert, select
+from app import app, db
+from models import Produit, Client, Vente, MouvementStock
+from services.emplacement_service import EmplacementService
+
+ECHELLES = {
+    'petit': {'produits': 500, 'clients': 2000, 'ventes': 50000, 'mouvements': 100000},
+    'moyen': {'produits': 5000, 'clients': 20000, 'ventes': 1000000, 'mouvements': 2000000},
+    'grand': {'produits': 50000, 'clients': 200000, 'ventes': 10000000, 'mouvements': 20000000},
+}
+
+TAILLE_LOT = 10000
+
+CATEGORIES = ['Riz', 'Huile', 'Sucre', 'Savon', 'Farine', 'Lait', 'Café', 'Thé', 'Biscuit', 'Pâtes',
+              'Sel', 'Bougie', 'Allumettes', 'Sardines', 'Jus', 'Eau', 'Bière', 'Piles', 'Cahier', 'Stylo']
+MARQUES = ['Star', 'Jb', 'Socolait', 'Tiko', 'Dzama', 'Koba', 'Malto', 'Vitasoa', 'Mirana', 'Tsara']
+PRENOMS = ['Rakoto', 'Rabe', 'Rasoa', 'Hery', 'Fara', 'Nirina', 'Tiana', 'Mamy', 'Haja', 'Lova', 'Fidy', 'Voahirana']
+NOMS = ['Andriamanana', 'Randrianarisoa', 'Rakotomalala', 'Razafindrakoto', 'Rasolofo', 'Ravelojaona', 'Rajaonarison']
+QUARTIERS = ['Analakely', 'Behoririka', 'Isotry', 'Ivandry', 'Ankorondrano', 'Ambohijatovo', 'Andravoahangy', 'Itaosy']
+
+def poids_zipf(n, exposant=1.1):
+    """Poids cumulés d'une loi de Zipf sur n éléments"""
+    return list(accumulate(1.0 / (rang ** exposant) for rang in range(1, n + 1)))
+
+def inserer(table, generateur, total, libelle):
+    """Insérer `total` lignes par lots et afficher le débit"""
+    debut = time.perf_counter()
+    inseres = 0
+    while inseres < total:
+        lot = [next(generateur) for _ in range(min(TAILLE_LOT, total - inseres))]
+        with db.engine.begin() as conn:
+            conn.execute(insert(table), lot)
+        inseres += len(lot)
+        duree = time.perf_counter() - debut
+        print(f"\r{libelle}: {inseres}/{total} ({inseres / duree:,.0f} lignes/s)", end='', flush=True)
+    print()
+
+def generer_produits(rng):
+    while True:
+        prix_achat = round(math.exp(rng.gauss(8, 1.2)), -1)
+        yield {
+            'nom': f"{rng.choice(CATEGORIES)} {rng.choice(MARQUES)} {rng.randint(1, 999)}",
+            'prix_achat': prix_achat,
+            'prix_unitaire': round(prix_achat * rng.uniform(1.1, 1.6), -1),
+            'stock': rng.randint(0, 5000),
+            'seuil_alerte': rng.choice([5, 10, 20, 50]),
+            'created_at': datetime.now(),
+        }
+
+def generer_clients(rng):
+    while True:
+        yield {
+            'nom': f"{rng.choice(PRENOMS)} {rng.choice(NOMS)} {rng.randint(1, 99999)}",
+            'contact': f"03{rng.choice('2348')} {rng.randint(10, 99)} {rng.randint(100, 999)} {rng.randint(10, 99)}",
+            'adresse': f"Lot {rng.randint(1, 999)} {rng.choice('ABCDEFGH')}, {rng.choice(QUARTIERS)}",
+            'email': None,
+            'created_at': datetime.now(),
+        }
+
+def tirer_date(rng, jours, cumul_jours):
+    """Date dans la période, plus dense en fin de période et le week-end, aux heures d'ouverture"""
+    jour = rng.choices(range(jours), cum_weights=cumul_jours)[0]
+    minuit = datetime.combine(datetime.now().date(), datetime.min.time())
+    return minuit - timedelta(days=jours - 1 - jour) + timedelta(hours=rng.triangular(7, 19, 11))
+
+def generer_ventes(rng, produits, clients, jours, cumul_jours):
+    cumul_produits = poids_zipf(len(produits))
+    cumul_clients = poids_zipf(len(clients), 0.8)
+    while True:
+        produit_id, prix = produits[rng.choices(range(len(produits)), cum_weights=cumul_produits)[0]]
+        quantite = max(1, int(rng.expovariate(0.5)))
+        client_id = None
+        if rng.random() > 0.35:  # 35% de ventes au comptoir sans client
+            client_id = clients[rng.choices(range(len(clients)), cum_weights=cumul_clients)[0]]
+        yield {
+            'produit_id': produit_id,
+            'client_id': client_id,
+            'quantite': quantite,
+            'prix_unitaire': prix,
+            'total': prix * quantite,
+            'date_vente': tirer_date(rng, jours, cumul_jours),
+        }
+
+def generer_mouvements(rng, produits, jours, cumul_jours):
+    cumul_produits = poids_zipf(len(produits))
+    while True:
+        produit_id, _ = produits[rng.choices(range(len(produits)), cum_weights=cumul_produits)[0]]
+        entree = rng.random() < 0.3
+        yield {
+            'produit_id': produit_id,
+            'type_mouvement': 'entree' if entree else 'sortie',
+            'quantite': rng.randint(20, 500) if entree else max(1, int(rng.expovariate(0.5))),
+            'motif': 'Réception fournisseur' if entree else 'Vente',
+            'date_mouvement': tirer_date(rng, jours, cumul_jours),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Générer des données synthétiques")
+    parser.add_argument('--echelle', choices=ECHELLES, default='petit')
+    parser.add_argument('--produits', type=int)
+    parser.add_argument('--clients', type=int)
+    parser.add_argument('--ventes', type=int)
+    parser.add_argument('--mouvements', type=int)
+    parser.add_argument('--jours', type=int, default=730, help="profondeur de l'historique")
+    parser.add_argument('--graine', type=int, default=42)
+    args = parser.parse_args()
+
+    volumes = dict(ECHELLES[args.echelle])
+    for cle in volumes:
+        if getattr(args, cle) is not None:
+            volumes[cle] = getattr(args, cle)
+
+    rng = random.Random(args.graine)
+    # Croissance de 50% sur la période et pic du samedi
+    aujourd_hui = datetime.now().weekday()
+    cumul_jours = list(accumulate(
+        (1 + 0.5 * j / args.jours) * (1.6 if (aujourd_hui - (args.jours - 1 - j)) % 7 == 5 else 1.0)
+        for j in range(args.jours)
+    ))
+
+    with app.app_context():
+        inserer(Produit, generer_produits(rng), volumes['produits'], 'Produits')
+        EmplacementService.initialiser()  # stock des produits insérés: emplacement par défaut
+        inserer(Client, generer_clients(rng), volumes['clients'], 'Clients')
+
+        produits = db.session.execute(select(Produit.id, Produit.prix_unitaire)).all()
+        clients = list(db.session.scalars(select(Client.id)))
+        rng.shuffle(produits)  # La popularité ne suit pas l'ordre de création
+        rng.shuffle(clients)
+
+        inserer(Vente, generer_ventes(rng, produits, clients, args.jours, cumul_jours),
+                volumes['ventes'], 'Ventes')
+        inserer(MouvementStock, generer_mouvements(rng, produits, args.jours, cumul_jours),
+                volumes['mouvements'], 'Mouvements de stock')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Représentations JSON des modèles, partagées par l'API Flask et l'API asynchrone (asgi.py).
+
+Les relations utilisées (produit, client) doivent être chargées d'avance
+(joinedload): en asynchrone, un chargement paresseux lèverait une erreur.
+"""
+import json
+
+def produit_json(p):
+    return {
+        'id': p.id,
+        'nom': p.nom,
+        'prix_achat': p.prix_achat,
+        'prix_unitaire': p.prix_unitaire,
+        'stock': p.stock,
+        'seuil_alerte': p.seuil_alerte,
+        'est_stock_bas': p.est_stock_bas,
+        'marge_benefice': p.marge_benefice
+    }
+
+def stock_json(p, stock):
+    # stock: total des emplacements (Produit.stock attend la consolidation)
+    return {
+        'id': p.id,
+        'nom': p.nom,
+        'stock': stock,
+        'seuil_alerte': p.seuil_alerte,
+        'est_stock_bas': stock <= p.seuil_alerte,
+        'prix_unitaire': p.prix_unitaire
+    }
+
+def stock_bas_json(p):
+    return {
+        'id': p.id,
+        'nom': p.nom,
+        'stock': p.stock,
+        'seuil_alerte': p.seuil_alerte
+    }
+
+def alerte_json(a):
+    return {
+        'id': a.id,
+        'produit_id': a.produit_id,
+        'produit_nom': a.produit.nom,
+        'type_alerte': a.type_alerte,
+        'stock': a.stock,
+        'seuil_alerte': a.seuil_alerte,
+        'created_at': a.created_at.isoformat()
+    }
+
+def stock_emplacement_json(l):
+    return {
+        'produit_id': l.produit_id,
+        'nom': l.nom,
+        'quantite': l.quantite,
+        'seuil_alerte': l.seuil_alerte,
+        'est_stock_bas': bool(l.stock_bas)
+    }
+
+def mouvement_json(m):
+    return {
+        'id': m.id,
+        'produit_nom': m.produit.nom,
+        'emplacement_id': m.emplacement_id,
+        'destination_id': m.destination_id,
+        'type_mouvement': m.type_mouvement,
+        'quantite': m.quantite,
+        'motif': m.motif,
+        'cout_unitaire': m.cout_unitaire,
+        'cout_fifo': m.cout_fifo,
+        'cout_cmp': m.cout_cmp,
+        'date_mouvement': m.date_mouvement.isoformat()
+    }
+
+def vente_json(v):
+    return {
+        'id': v.id,
+        'produit_nom': v.produit.nom,
+        'client_nom': v.client.nom if v.client else 'Client direct',
+        'quantite': v.quantite,
+        'prix_unitaire': v.prix_unitaire,
+        'total': v.total,
+        'benefice': v.benefice,
+        'date_vente': v.date_vente.isoformat()
+    }
+
+def reservation_json(r):
+    return {
+        'id': r.id,
+        'produit_nom': r.produit.nom,
+        'client_nom': r.client.nom,
+        'quantite': r.quantite,
+        'statut': r.statut,
+        'date_reservation': r.date_reservation.isoformat(),
+        'date_limite': r.date_limite.isoformat() if r.date_limite else None,
+        'notes': r.notes
+    }
+
+def changement_json(c):
+    return {
+        'table': c.table_nom,
+        'operation': c.operation,
+        'id': c.ligne_id,
+        'donnees': json.loads(c.donnees) if c.donnees else None
+    }
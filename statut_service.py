@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import update, select, case
+from models import db
+from services.changement_service import ChangementService
+from services.flux_service import FluxService
+
+class StatutService:
+    # Nombre maximal d'identifiants par requête (limite de variables SQLite)
+    TAILLE_LOT = 900
+
+    @staticmethod
+    def lire_mises_a_jour(donnees=None, fichier=None):
+        """Lire une liste de mises à jour de statut depuis du JSON ou un fichier CSV/JSON
+
+        Formats acceptés:
+        - {"ids": [1, 2], "statut": "Livré", "notes": "..."}
+        - {"mises_a_jour": [{"id": 1, "statut": "Livré", "notes": "..."}]}
+        - une liste [{"id": 1, "statut": "Livré"}]
+        - un fichier CSV `id;statut;notes` (en-tête facultatif) ou JSON
+        """
+        if fichier is not None:
+            contenu = fichier.read()
+            if isinstance(contenu, bytes):
+                contenu = contenu.decode('utf-8-sig')
+            if contenu.lstrip()[:1] in ('[', '{'):
+                donnees = json.loads(contenu)
+            else:
+                dialecte = ';' if contenu.count(';') >= contenu.count(',') else ','
+                donnees = []
+                for ligne in csv.reader(io.StringIO(contenu), delimiter=dialecte):
+                    if not ligne or not ligne[0].strip().isdigit():
+                        continue  # En-tête ou ligne vide
+                    donnees.append({
+                        'id': ligne[0],
+                        'statut': ligne[1].strip() if len(ligne) > 1 else '',
+                        'notes': ligne[2].strip() if len(ligne) > 2 else ''
+                    })
+
+        if isinstance(donnees, dict):
+            if 'ids' in donnees:
+                donnees = [{'id': i, 'statut': donnees.get('statut'), 'notes': donnees.get('notes', '')}
+                           for i in donnees['ids']]
+            else:
+                donnees = donnees.get('mises_a_jour', [])
+
+        if not isinstance(donnees, list):
+            raise ValueError("Format de mise à jour invalide")
+
+        return [{
+            'id': int(d['id']),
+            'statut': d.get('statut'),
+            'notes': d.get('notes') or ''
+        } for d in donnees]
+
+    @staticmethod
+    def appliquer_transitions(modele, mises_a_jour, transitions, dates_statut=None):
+        """Appliquer des changements de statut en masse par des UPDATE ensemblistes
+
+        `transitions` associe chaque statut cible aux statuts de départ
+        autorisés; la vérification est faite dans la clause WHERE, donc un
+        lot de N lignes coûte un SELECT ... FOR UPDATE (statuts de départ,
+        pour le flux en direct et l'explication des refus) et un UPDATE par
+        statut cible, dans une seule transaction.
+        `dates_statut` associe un statut cible à la colonne de date à
+        renseigner (ex: {'Livré': 'date_livraison'}).
+        """
+        dates_statut = dates_statut or {}
+        resultats = {}
+        par_statut = {}
+
+        occurrences = {}
+        for maj in mises_a_jour:
+            occurrences[maj['id']] = occurrences.get(maj['id'], 0) + 1
+
+        for maj in mises_a_jour:
+            if occurrences[maj['id']] > 1:
+                resultats[maj['id']] = {'id': maj['id'], 'succes': False, 'message': 'Identifiant en double'}
+                continue
+            if maj['statut'] not in transitions:
+                resultats[maj['id']] = {'id': maj['id'], 'succes': False,
+                                        'message': f"Statut non autorisé: {maj['statut']}"}
+                continue
+            par_statut.setdefault(maj['statut'], {})[maj['id']] = maj['notes']
+
+        try:
+            for statut, notes_par_id in par_statut.items():
+                ids = list(notes_par_id)
+                for debut in range(0, len(ids), StatutService.TAILLE_LOT):
+                    lot = ids[debut:debut + StatutService.TAILLE_LOT]
+
+                    valeurs = {'statut': statut}
+                    notes = {i: notes_par_id[i] for i in lot if notes_par_id[i]}
+                    if notes:
+                        valeurs['notes'] = case(notes, value=modele.id, else_=modele.notes)
+                    if statut in dates_statut:
+                        valeurs[dates_statut[statut]] = datetime.now()
+
+                    # Statuts de départ, lignes verrouillées jusqu'au commit
+                    actuels = dict(db.session.execute(
+                        select(modele.id, modele.statut).where(modele.id.in_(lot)).with_for_update()
+                    ).all())
+                    modifies = set(db.session.execute(
+                        update(modele)
+                        .where(modele.id.in_(lot), modele.statut.in_(transitions[statut]))
+                        .values(**valeurs)
+                        .returning(modele.id)
+                        .execution_options(synchronize_session=False)
+                    ).scalars())
+                    changees = []
+                    for i in sorted(modifies):
+                        ligne = {'id': i, 'statut': statut}
+                        if i in notes:
+                            ligne['notes'] = notes[i]
+                        if statut in dates_statut:
+                            ligne[dates_statut[statut]] = valeurs[dates_statut[statut]]
+                        changees.append(ligne)
+                    ChangementService.enregistrer(db.session, modele, 'update', changees)
+                    FluxService.ajouter(db.session, [
+                        {'type': modele.__tablename__, 'id': i, 'statut': statut, 'ancien_statut': actuels[i]}
+                        for i in sorted(modifies)
+                    ])
+
+                    for i in lot:
+                        if i in modifies:
+                            resultats[i] = {'id': i, 'succes': True, 'statut': statut}
+                        elif i in actuels:
+                            resultats[i] = {'id': i, 'succes': False,
+                                            'message': f"Transition invalide: {actuels[i]} -> {statut}"}
+                        else:
+                            resultats[i] = {'id': i, 'succes': False, 'message': 'Introuvable'}
+
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+        ordre = [maj['id'] for maj in mises_a_jour]
+        return [resultats[i] for i in dict.fromkeys(ordre)]
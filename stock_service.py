@@ -1,48 +1,76 @@
-from models import Produit, MouvementStock, db
+from models import Produit, MouvementStock, CoucheStock, StockEmplacement, VariationStock, db
 from datetime import datetime
+from sqlalchemy import select, func, insert, update
+from services.valorisation_service import ValorisationService
+from services.emplacement_service import EmplacementService
+from services.changement_service import ChangementService
 
 class StockService:
     @staticmethod
-    def ajouter_mouvement_stock(produit_id, type_mouvement, quantite, motif=""):
-        """Ajouter un mouvement de stock (entrée ou sortie)"""
+    def ajouter_mouvement_stock(produit_id, type_mouvement, quantite, motif="", cout_unitaire=None,
+                                emplacement_id=None):
+        """Ajouter un mouvement de stock (entrée ou sortie)
+        
+        cout_unitaire: coût d'achat d'une entrée (par défaut le prix d'achat du produit)
+        emplacement_id: magasin ou entrepôt (par défaut l'emplacement par défaut)
+        """
         try:
-            produit = Produit.query.get(produit_id)
+            # Une entrée recalcule le coût moyen: ligne produit verrouillée avant
+            # celle de l'emplacement (même ordre que reapprovisionner_tout)
+            produit = db.session.get(Produit, produit_id, with_for_update=type_mouvement == 'entree')
             if not produit:
                 raise ValueError("Produit non trouvé")
             
+            emplacement_id = emplacement_id or EmplacementService.defaut()
+            stock = EmplacementService.ligne(produit_id, emplacement_id)
+            
             # Vérifier que la sortie ne dépasse pas le stock disponible
-            if type_mouvement == 'sortie' and produit.stock < quantite:
+            if type_mouvement == 'sortie' and stock.quantite < quantite:
                 raise ValueError("Stock insuffisant pour cette sortie")
             
             # Créer le mouvement
             mouvement = MouvementStock(
                 produit_id=produit_id,
+                emplacement_id=emplacement_id,
                 type_mouvement=type_mouvement,
                 quantite=quantite,
                 motif=motif
             )
             
-            # Mettre à jour le stock du produit
+            # Valoriser le mouvement puis mettre à jour le stock de l'emplacement
             if type_mouvement == 'entree':
-                produit.stock += quantite
+                if cout_unitaire is None:
+                    cout_unitaire = produit.prix_achat
+                ValorisationService.entree(produit, quantite, cout_unitaire, mouvement)
+                EmplacementService.modifier(stock, quantite)
             else:  # sortie
-                produit.stock -= quantite
+                ValorisationService.sortie(produit, quantite, mouvement)
+                EmplacementService.modifier(stock, -quantite)
             
             db.session.add(mouvement)
             db.session.commit()
             
-            return True
-            
         except Exception as e:
             db.session.rollback()
             raise e
+        
+        EmplacementService.demander_consolidation()
+        return True
     
     @staticmethod
     def get_produits_stock_bas():
         """Obtenir la liste des produits avec un stock bas"""
-        return Produit.query.filter(
-            Produit.stock <= Produit.seuil_alerte
-        ).all()
+        return db.session.scalars(StockService.requete_produits_stock_bas()).all()
+    
+    @staticmethod
+    def requete_produits_stock_bas():
+        # Drapeau indexé tenu à jour à l'écriture (voir AlerteService)
+        return select(Produit).where(Produit.stock_bas.is_(True))
+    
+    @staticmethod
+    def requete_etat_stocks():
+        """(produit, stock total à jour) de chaque produit"""
+        return select(Produit, EmplacementService.stock_total().label('stock_total'))
     
     @staticmethod
     def get_etat_stock():
@@ -51,37 +79,127 @@ class StockService:
         
         total_produits = len(produits)
         produits_stock_bas = len([p for p in produits if p.est_stock_bas])
-        valeur_stock_total = sum(p.stock * p.prix_achat for p in produits)
+        valeurs = ValorisationService.get_valeur_stock()
         
         return {
             'total_produits': total_produits,
             'produits_stock_bas': produits_stock_bas,
-            'valeur_stock_total': valeur_stock_total,
+            'valeur_stock_total': valeurs['fifo'],
+            'valeur_stock_cmp': valeurs['cmp'],
             'produits': produits
         }
     
     @staticmethod
-    def reapprovisionner_automatique(produit_id, quantite_cible=None):
-        """Réapprovisionner automatiquement un produit"""
+    def reapprovisionner_automatique(produit_id, quantite_cible=None, emplacement_id=None):
+        """Réapprovisionner automatiquement un produit (cible sur le stock total)"""
         try:
             produit = Produit.query.get(produit_id)
             if not produit:
                 raise ValueError("Produit non trouvé")
             
             if quantite_cible is None:
-                quantite_cible = produit.seuil_alerte * 3  # 3x le seuil d'alerte
+                # Cible du planificateur (flask prevision), sinon 3x le seuil d'alerte
+                quantite_cible = produit.quantite_cible or produit.seuil_alerte * 3
             
-            quantite_a_ajouter = quantite_cible - produit.stock
+            quantite_a_ajouter = quantite_cible - EmplacementService.stock_total(produit_id)
             
             if quantite_a_ajouter > 0:
                 return StockService.ajouter_mouvement_stock(
                     produit_id,
                     'entree',
                     quantite_a_ajouter,
-                    f"Réapprovisionnement automatique - Cible: {quantite_cible}"
+                    f"Réapprovisionnement automatique - Cible: {quantite_cible}",
+                    emplacement_id=emplacement_id
                 )
             
             return True
             
         except Exception as e:
             raise e
+    
+    @staticmethod
+    def reapprovisionner_tout(simulation=False, limite=50):
+        """Réapprovisionner en une fois tous les produits en stock bas
+        
+        Les produits dont le stock total (somme des emplacements, sans
+        attendre la consolidation) est sous le seuil sont lus en une requête; les mouvements, les couches FIFO et les stocks sont écrits par
+        lots dans une seule transaction. La marchandise entre à l'emplacement
+        par défaut. simulation=True calcule le même résumé sans rien écrire.
+        """
+        try:
+            defaut = EmplacementService.defaut()
+            cible = func.coalesce(Produit.quantite_cible, Produit.seuil_alerte * 3)
+            stock = EmplacementService.stock_total()
+            requete = select(
+                Produit.id, Produit.nom, stock.label('stock'), Produit.seuil_alerte, Produit.prix_achat,
+                cible.label('cible'),
+                func.coalesce(Produit.cout_moyen, Produit.prix_achat).label('cout_moyen'),
+                StockEmplacement.id.label('stock_emplacement_id'),
+                StockEmplacement.quantite.label('quantite_emplacement')
+            ).join(StockEmplacement, (StockEmplacement.produit_id == Produit.id)
+                   & (StockEmplacement.emplacement_id == defaut)).where(
+                stock <= Produit.seuil_alerte, cible > stock
+            ).order_by(Produit.id)
+            if not simulation:
+                requete = requete.with_for_update(of=(Produit, StockEmplacement))
+            lignes = db.session.execute(requete).all()
+            
+            resume = {
+                'simulation': simulation,
+                'produits': len(lignes),
+                'quantite': sum(l.cible - l.stock for l in lignes),
+                'valeur': sum((l.cible - l.stock) * l.prix_achat for l in lignes),
+                'details': [{'id': l.id, 'nom': l.nom, 'stock': l.stock, 'cible': l.cible,
+                             'quantite': l.cible - l.stock} for l in lignes[:limite]]
+            }
+            if simulation or not lignes:
+                return resume
+            
+            maintenant = datetime.utcnow()
+            mouvements = [{
+                'produit_id': l.id,
+                'emplacement_id': defaut,
+                'type_mouvement': 'entree',
+                'quantite': l.cible - l.stock,
+                'motif': f"Réapprovisionnement automatique - Cible: {l.cible}",
+                'date_mouvement': maintenant,
+                'cout_unitaire': l.prix_achat,
+                'cout_fifo': (l.cible - l.stock) * l.prix_achat,
+                'cout_cmp': (l.cible - l.stock) * l.prix_achat
+            } for l in lignes]
+            mouvement_ids = db.session.scalars(
+                insert(MouvementStock).returning(MouvementStock.id, sort_by_parameter_order=True), mouvements
+            ).all()
+            ChangementService.enregistrer(db.session, MouvementStock, 'insert', [
+                dict(m, id=i) for m, i in zip(mouvements, mouvement_ids)
+            ])
+            db.session.execute(insert(CoucheStock), [{
+                'produit_id': l.id,
+                'emplacement_id': defaut,
+                'mouvement_id': mouvement_id,
+                'quantite_restante': l.cible - l.stock,
+                'cout_unitaire': l.prix_achat,
+                'date_entree': maintenant
+            } for l, mouvement_id in zip(lignes, mouvement_ids)])
+            db.session.execute(update(StockEmplacement), [
+                {'id': l.stock_emplacement_id, 'quantite': l.quantite_emplacement + l.cible - l.stock}
+                for l in lignes
+            ])
+            db.session.execute(insert(VariationStock), [
+                {'produit_id': l.id, 'variation': l.cible - l.stock} for l in lignes
+            ])
+            couts = [{
+                'id': l.id,
+                'cout_moyen': ValorisationService.nouveau_cout_moyen(
+                    l.stock, l.cout_moyen, l.cible - l.stock, l.prix_achat)
+            } for l in lignes]
+            db.session.execute(update(Produit), couts)
+            ChangementService.enregistrer(db.session, Produit, 'update', couts)
+            db.session.commit()
+            
+        except Exception as e:
+            db.session.rollback()
+            raise e
+        
+        EmplacementService.demander_consolidation()
+        return resume
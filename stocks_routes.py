@@ -1,7 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Produit, MouvementStock, db
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
+from models import Produit, MouvementStock, AlerteStock, Emplacement, StockEmplacement, db
+from serializers import stock_json, stock_bas_json, mouvement_json, alerte_json
 from services.stock_service import StockService
+from services.emplacement_service import EmplacementService
+from services.valorisation_service import ValorisationService
+from services.prevision_service import PrevisionService
+from services.query_profiler_service import query_budget
+from services.version_service import conditionnel
 
 stocks_bp = Blueprint('stocks', __name__)
 
@@ -15,15 +23,24 @@ def login_required(f):
 
 @stocks_bp.route('/stocks')
 @login_required
+@conditionnel(Produit, MouvementStock, Emplacement, StockEmplacement)
 def gestion_stocks():
     produits = Produit.query.all()
-    mouvements = MouvementStock.query.order_by(MouvementStock.date_mouvement.desc()).limit(20).all()
+    mouvements = MouvementStock.query.options(
+        joinedload(MouvementStock.produit),
+        joinedload(MouvementStock.emplacement),
+        joinedload(MouvementStock.destination)
+    ).order_by(MouvementStock.date_mouvement.desc()).limit(20).all()
     produits_stock_bas = StockService.get_produits_stock_bas()
     
     return render_template('stocks.html', 
                          produits=produits, 
                          mouvements=mouvements,
-                         produits_stock_bas=produits_stock_bas)
+                         produits_stock_bas=produits_stock_bas,
+                         emplacements=EmplacementService.get_emplacements(),
+                         repartition=EmplacementService.get_repartition(),
+                         valeurs_stock=ValorisationService.get_valeurs_par_produit(),
+                         valeur_stock=ValorisationService.get_valeur_stock())
 
 @stocks_bp.route('/stocks/mouvement', methods=['POST'])
 @login_required
@@ -32,9 +49,12 @@ def ajouter_mouvement():
     type_mouvement = request.form['type_mouvement']
     quantite = int(request.form['quantite'])
     motif = request.form.get('motif', '')
+    cout_unitaire = request.form.get('cout_unitaire', type=float)
+    emplacement_id = request.form.get('emplacement_id', type=int)
     
     try:
-        if StockService.ajouter_mouvement_stock(produit_id, type_mouvement, quantite, motif):
+        if StockService.ajouter_mouvement_stock(produit_id, type_mouvement, quantite, motif, cout_unitaire,
+                                                emplacement_id):
             flash(f'Mouvement de stock enregistré avec succès', 'success')
         else:
             flash('Erreur lors du mouvement de stock', 'error')
@@ -48,9 +68,10 @@ def ajouter_mouvement():
 def reapprovisionner(produit_id):
     quantite = int(request.form['quantite'])
     motif = request.form.get('motif', 'Réapprovisionnement')
+    cout_unitaire = request.form.get('cout_unitaire', type=float)
     
     try:
-        if StockService.ajouter_mouvement_stock(produit_id, 'entree', quantite, motif):
+        if StockService.ajouter_mouvement_stock(produit_id, 'entree', quantite, motif, cout_unitaire):
             flash('Réapprovisionnement effectué avec succès', 'success')
         else:
             flash('Erreur lors du réapprovisionnement', 'error')
@@ -59,32 +80,36 @@ def reapprovisionner(produit_id):
     
     return redirect(url_for('stocks.gestion_stocks'))
 
+@stocks_bp.route('/stocks/reapprovisionner', methods=['POST'])
+@login_required
+def reapprovisionner_tout():
+    try:
+        resume = StockService.reapprovisionner_tout()
+        if resume['produits']:
+            flash(f"{resume['produits']} produit(s) réapprovisionné(s), {resume['quantite']} unités", 'success')
+        else:
+            flash('Aucun produit à réapprovisionner', 'info')
+    except Exception as e:
+        flash(f'Erreur: {str(e)}', 'error')
+    
+    return redirect(url_for('stocks.gestion_stocks'))
+
 # API Routes
 @stocks_bp.route('/api/stocks', methods=['GET'])
 @jwt_required()
+@conditionnel(Produit, StockEmplacement)
 def api_etat_stocks():
-    produits = Produit.query.all()
-    return jsonify([{
-        'id': p.id,
-        'nom': p.nom,
-        'stock': p.stock,
-        'seuil_alerte': p.seuil_alerte,
-        'est_stock_bas': p.est_stock_bas,
-        'prix_unitaire': p.prix_unitaire
-    } for p in produits])
+    return jsonify([stock_json(p, stock) for p, stock in db.session.execute(StockService.requete_etat_stocks())])
 
 @stocks_bp.route('/api/stocks/mouvements', methods=['GET'])
+@query_budget(2)
 @jwt_required()
+@conditionnel(MouvementStock, Produit)
 def api_mouvements_stock():
-    mouvements = MouvementStock.query.order_by(MouvementStock.date_mouvement.desc()).limit(50).all()
-    return jsonify([{
-        'id': m.id,
-        'produit_nom': m.produit.nom,
-        'type_mouvement': m.type_mouvement,
-        'quantite': m.quantite,
-        'motif': m.motif,
-        'date_mouvement': m.date_mouvement.isoformat()
-    } for m in mouvements])
+    mouvements = MouvementStock.query.options(
+        joinedload(MouvementStock.produit)
+    ).order_by(MouvementStock.date_mouvement.desc()).limit(50).all()
+    return jsonify([mouvement_json(m) for m in mouvements])
 
 @stocks_bp.route('/api/stocks/mouvement', methods=['POST'])
 @jwt_required()
@@ -96,7 +121,9 @@ def api_ajouter_mouvement():
             data['produit_id'],
             data['type_mouvement'],
             data['quantite'],
-            data.get('motif', '')
+            data.get('motif', ''),
+            data.get('cout_unitaire'),
+            data.get('emplacement_id')
         )
         
         if success:
@@ -109,11 +136,76 @@ def api_ajouter_mouvement():
 
 @stocks_bp.route('/api/stocks/bas', methods=['GET'])
 @jwt_required()
+@conditionnel(Produit)
 def api_stocks_bas():
     produits = StockService.get_produits_stock_bas()
-    return jsonify([{
-        'id': p.id,
-        'nom': p.nom,
-        'stock': p.stock,
-        'seuil_alerte': p.seuil_alerte
-    } for p in produits])
+    return jsonify([stock_bas_json(p) for p in produits])
+
+@stocks_bp.route('/api/stocks/alertes', methods=['GET'])
+@jwt_required()
+@conditionnel(AlerteStock)
+def api_alertes_stock():
+    """Alertes postérieures à ?apres=<id> (franchissements du seuil, dans l'ordre)"""
+    apres = request.args.get('apres', 0, type=int)
+    limite = min(request.args.get('limite', 100, type=int), 500)
+    alertes = AlerteStock.query.options(
+        joinedload(AlerteStock.produit)
+    ).filter(AlerteStock.id > apres).order_by(AlerteStock.id).limit(limite).all()
+    return jsonify([alerte_json(a) for a in alertes])
+
+@stocks_bp.route('/api/stocks/reapprovisionner', methods=['POST'])
+@jwt_required()
+def api_reapprovisionner_tout():
+    """Réapprovisionner tous les produits en stock bas; {"simulation": true} sans rien écrire"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        resume = StockService.reapprovisionner_tout(
+            simulation=bool(data.get('simulation')),
+            limite=int(data.get('limite', 50))
+        )
+        return jsonify(resume), 200 if resume['simulation'] else 201
+        
+    except Exception as e:
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
+
+@stocks_bp.route('/api/stocks/valorisation', methods=['GET'])
+@jwt_required()
+@conditionnel(Produit, MouvementStock)
+def api_valorisation():
+    """Valeur du stock (FIFO et coût moyen) et coût des ventes de la période
+    
+    Paramètres: debut, fin (AAAA-MM-JJ, fin incluse); par défaut le mois en cours
+    """
+    try:
+        aujourd_hui = datetime.now().date()
+        debut = datetime.strptime(request.args['debut'], '%Y-%m-%d') if request.args.get('debut') \
+            else datetime.combine(aujourd_hui.replace(day=1), datetime.min.time())
+        fin = datetime.strptime(request.args['fin'], '%Y-%m-%d') if request.args.get('fin') \
+            else datetime.combine(aujourd_hui, datetime.min.time())
+        
+        return jsonify({
+            'valeur_stock': ValorisationService.get_valeur_stock(),
+            'periode': {'debut': debut.date().isoformat(), 'fin': fin.date().isoformat()},
+            'cout_des_ventes': ValorisationService.get_cout_des_ventes(debut, fin + timedelta(days=1))
+        })
+        
+    except Exception as e:
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
+
+@stocks_bp.route('/api/stocks/prevision', methods=['POST'])
+@jwt_required()
+def api_prevision():
+    """Points de commande de tous les produits; {"appliquer": true} les enregistre"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        plan = PrevisionService.planifier(**PrevisionService.parametres(current_app.config))
+        resume = PrevisionService.resume(plan, limite=int(data.get('limite', 20)))
+        if data.get('appliquer'):
+            resume['mis_a_jour'] = PrevisionService.appliquer(plan)
+        return jsonify(resume)
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
@@ -0,0 +1,74 @@
+from flask import request, url_for, flash, redirect, jsonify
+
+PAR_PAGE_DEFAUT = 50
+PAR_PAGE_MAX = 200
+
+class TableauService:
+    """Tableaux HTML paginés et triés côté serveur, rafraîchis par fragments
+
+    - ?page=2&par_page=50&tri=-created_at: pagination et tri, limités aux
+      colonnes indexées déclarées par chaque vue
+    - GET /<liste>/tableau renvoie seulement le tableau (page suivante, tri)
+    - un formulaire envoyé avec l'en-tête X-Fragment: ligne reçoit la ligne
+      modifiée (ou 204 après suppression) au lieu d'une redirection
+    """
+
+    @staticmethod
+    def init_app(app):
+        app.add_template_global(TableauService.url_tableau, 'url_tableau')
+
+    @staticmethod
+    def paginer(requete, colonnes, defaut):
+        """Page demandée de la requête, triée par une colonne de `colonnes`
+
+        `colonnes` associe le nom accepté dans ?tri= à une expression indexée.
+        L'id départage les égalités pour un ordre stable d'une page à l'autre.
+        Retourne (pagination, tri appliqué).
+        """
+        tri = request.args.get('tri', defaut)
+        if tri.lstrip('-') not in colonnes:
+            tri = defaut
+        descendant = tri.startswith('-')
+        colonne = colonnes[tri.lstrip('-')]
+        identifiant = requete.column_descriptions[0]['entity'].id
+
+        if descendant:
+            requete = requete.order_by(colonne.desc(), identifiant.desc())
+        else:
+            requete = requete.order_by(colonne.asc(), identifiant.asc())
+
+        pagination = requete.paginate(
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('par_page', PAR_PAGE_DEFAUT, type=int),
+            max_per_page=PAR_PAGE_MAX,
+            error_out=False
+        )
+        return pagination, tri
+
+    @staticmethod
+    def url_tableau(endpoint, **modifications):
+        """URL de la liste avec les paramètres courants (filtre, tri, page) modifiés"""
+        parametres = request.args.to_dict()
+        parametres.update(modifications)
+        return url_for(endpoint, **{k: v for k, v in parametres.items() if v not in (None, '')})
+
+    @staticmethod
+    def fragment():
+        """Le formulaire a été envoyé par app.js et attend la ligne en retour"""
+        return request.headers.get('X-Fragment') == 'ligne'
+
+    @staticmethod
+    def supprime(message, endpoint):
+        """Réponse après suppression d'une ligne"""
+        if TableauService.fragment():
+            return '', 204
+        flash(message, 'success')
+        return redirect(url_for(endpoint))
+
+    @staticmethod
+    def erreur(message, endpoint):
+        """Réponse d'erreur d'un formulaire: JSON pour app.js, flash sinon"""
+        if TableauService.fragment():
+            return jsonify({'message': message}), 400
+        flash(message, 'error')
+        return redirect(url_for(endpoint))
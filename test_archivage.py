@@ -0,0 +1,56 @@
+"""Archivage des périodes closes (ArchiveService)"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, func, update
+
+from models import Produit, Client, Vente, VenteArchive, MouvementStock, MouvementStockArchive, db
+from services.archive_service import ArchiveService
+from services.emplacement_service import EmplacementService
+from services.stock_service import StockService
+from services.vente_service import VenteService
+
+ANCIENNE = datetime(2024, 1, 15, 10)
+
+@pytest.fixture
+def archivee(app):
+    """Produit et client dont toute l'activité est archivée"""
+    produit = Produit(nom="Thé vert", prix_achat=1500, prix_unitaire=2000, stock=0)
+    client = Client(nom="Ravo")
+    db.session.add_all([produit, client])
+    db.session.commit()
+    StockService.ajouter_mouvement_stock(produit.id, 'entree', 3)
+    acks = VenteService.synchroniser_ventes([{'cle': 'caisse1-1', 'produit_id': produit.id, 'quantite': 3,
+                                             'client_id': client.id, 'date_vente': ANCIENNE.isoformat()}])
+    assert acks[0]['statut'] == 'cree'
+    db.session.execute(update(MouvementStock).values(date_mouvement=ANCIENNE))
+    db.session.commit()
+    EmplacementService.consolider()
+
+    resume = ArchiveService.archiver(mois=1, pause=0)
+    assert (resume['ventes'], resume['mouvements']) == (1, 2)
+    return produit.id, client.id
+
+@pytest.fixture
+def connecte(client):
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    return client
+
+def test_supprimer_client_archive(connecte, archivee):
+    _, client_id = archivee
+    reponse = connecte.post(f'/clients/supprimer/{client_id}')
+    assert reponse.status_code == 302
+    db.session.expire_all()
+    assert db.session.get(Client, client_id) is None
+    # L'historique reste, sans client
+    assert db.session.execute(select(VenteArchive.client_id, VenteArchive.total)).all() == [(None, 6000)]
+
+def test_supprimer_produit_archive(connecte, archivee):
+    produit_id, _ = archivee
+    connecte.post(f'/produits/supprimer/{produit_id}')
+    db.session.expire_all()
+    assert db.session.get(Produit, produit_id) is None
+    assert db.session.scalar(select(func.count()).select_from(Vente)) == 0
+    assert db.session.scalars(select(MouvementStockArchive.produit_id)).all() == [None, None]
+    assert db.session.scalar(select(VenteArchive.produit_id)) is None
@@ -0,0 +1,88 @@
+"""Report différé des variations de stock sur Produit.stock (EmplacementService)"""
+import time
+
+from sqlalchemy import select, func
+
+from models import Produit, VariationStock, AlerteStock, db
+from services.emplacement_service import EmplacementService
+from services.stock_service import StockService
+from services.valorisation_service import ValorisationService
+from services.vente_service import VenteService
+
+def creer_produit():
+    produit = Produit(nom="Farine 1kg", prix_achat=3000, prix_unitaire=3600, stock=0, seuil_alerte=5)
+    db.session.add(produit)
+    db.session.commit()
+    StockService.ajouter_mouvement_stock(produit.id, 'entree', 10)
+    return produit.id
+
+def stock_catalogue(produit_id):
+    db.session.rollback()  # relire les écritures des autres sessions
+    return db.session.get(Produit, produit_id).stock
+
+def test_requete_sans_consolidation(app):
+    produit_id = creer_produit()
+    VenteService.creer_vente(produit_id, 3)
+
+    # La requête n'a touché ni Produit.stock ni le journal des variations
+    assert stock_catalogue(produit_id) == 0
+    assert db.session.scalar(select(func.count()).select_from(VariationStock)) == 2
+    assert EmplacementService.stock_total(produit_id) == 7
+
+    # Le réapprovisionnement part du total des emplacements
+    StockService.reapprovisionner_automatique(produit_id, quantite_cible=12)
+    assert EmplacementService.stock_total(produit_id) == 12
+    assert StockService.reapprovisionner_tout()['produits'] == 0
+
+    assert EmplacementService.consolider() == 1
+    assert stock_catalogue(produit_id) == 12
+    assert db.session.scalar(select(func.count()).select_from(VariationStock)) == 0
+
+def test_lectures_a_jour_avant_consolidation(client, entetes):
+    produit_id = creer_produit()
+    premiere = client.get('/api/stocks', headers=entetes)
+    assert premiere.get_json()[0]['stock'] == 10
+
+    VenteService.creer_vente(produit_id, 6)
+    assert stock_catalogue(produit_id) == 0
+    # Même ETag seulement si le stock n'a pas bougé: la vente change StockEmplacement
+    reponse = client.get('/api/stocks', headers=dict(entetes, **{'If-None-Match': premiere.headers['ETag']}))
+    assert reponse.status_code == 200
+    assert reponse.get_json()[0] == {'id': produit_id, 'nom': "Farine 1kg", 'stock': 4, 'seuil_alerte': 5,
+                                     'est_stock_bas': True, 'prix_unitaire': 3600}
+    assert ValorisationService.get_valeurs_par_produit()[produit_id] == {'fifo': 12000, 'cmp': 12000}
+    assert ValorisationService.get_valeur_stock() == {'fifo': 12000, 'cmp': 12000}
+
+def test_alerte_au_report(client, entetes):
+    produit_id = creer_produit()
+    EmplacementService.consolider()
+    derniere = db.session.scalar(select(func.max(AlerteStock.id)))
+    nouvelles = select(AlerteStock.type_alerte, AlerteStock.stock).where(AlerteStock.id > derniere)
+    VenteService.creer_vente(produit_id, 6)
+
+    # Seuil franchi (4 <= 5): drapeau et alerte attendent le report du total
+    assert db.session.get(Produit, produit_id).stock_bas is False
+    assert db.session.execute(nouvelles).all() == []
+    assert client.get('/api/stocks/bas', headers=entetes).get_json() == []
+
+    EmplacementService.consolider()
+    db.session.rollback()
+    assert db.session.execute(nouvelles).all() == [('stock_bas', 4)]
+    assert [p['id'] for p in client.get('/api/stocks/bas', headers=entetes).get_json()] == [produit_id]
+
+    # Le seuil d'un produit modifié est vérifié dans sa propre transaction
+    db.session.get(Produit, produit_id).seuil_alerte = 3
+    db.session.commit()
+    assert db.session.get(Produit, produit_id).stock_bas is False
+
+def test_thread_de_consolidation(app, monkeypatch):
+    produit_id = creer_produit()
+    EmplacementService.consolider()
+    monkeypatch.setitem(app.config, 'STOCK_CONSOLIDATION', 'thread')
+    monkeypatch.setitem(app.config, 'STOCK_CONSOLIDATION_DELAI', 0.05)
+
+    VenteService.creer_vente(produit_id, 4)
+    echeance = time.monotonic() + 5
+    while stock_catalogue(produit_id) != 6 and time.monotonic() < echeance:
+        time.sleep(0.02)
+    assert stock_catalogue(produit_id) == 6
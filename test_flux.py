@@ -0,0 +1,61 @@
+"""Événements du flux en direct (FluxService) publiés au commit"""
+import pytest
+
+from models import Produit, Client, Livraison, db
+from services.flux_service import FluxService
+from services.livraison_service import LivraisonService
+from services.stock_service import StockService
+from services.vente_service import VenteService
+
+@pytest.fixture
+def publies(monkeypatch):
+    lots = []
+    monkeypatch.setattr(FluxService, 'publier', staticmethod(lots.append))
+    return lots
+
+def test_vente_avec_produit_et_client(app, publies):
+    produit = Produit(nom="Huile 1L", prix_achat=6000, prix_unitaire=7500, stock=0)
+    client = Client(nom="Rasoa")
+    db.session.add_all([produit, client])
+    db.session.commit()
+    StockService.ajouter_mouvement_stock(produit.id, 'entree', 10)
+    produit_id, client_id = produit.id, client.id
+    db.session.remove()  # comme une nouvelle requête: rien de chargé
+    publies.clear()
+
+    vente = VenteService.creer_vente(produit_id, 2, client_id)
+    ventes = [e for lot in publies for e in lot if e['type'] == 'vente']
+    assert ventes == [{
+        'type': 'vente',
+        'id': vente.id,
+        'produit_id': produit_id,
+        'produit_nom': "Huile 1L",
+        'client_nom': "Rasoa",
+        'quantite': 2,
+        'total': 15000,
+        'benefice': 3000,
+        'date_vente': vente.date_vente.isoformat()
+    }]
+
+def test_rien_en_cas_d_annulation(app, publies):
+    db.session.add(Produit(nom="Savon", prix_achat=500, prix_unitaire=800, stock=0))
+    db.session.flush()
+    db.session.rollback()
+    assert publies == []
+
+def test_statuts_en_masse(app, publies):
+    client = Client(nom="Rakoto")
+    db.session.add(client)
+    db.session.flush()
+    livraisons = [Livraison(client_id=client.id, adresse="Ambohijatovo", statut=statut)
+                  for statut in ("En cours", "En cours", "Livré")]
+    db.session.add_all(livraisons)
+    db.session.commit()
+    ids = [l.id for l in livraisons]
+    publies.clear()
+
+    resultats = LivraisonService.modifier_statuts_en_masse([{'id': i, 'statut': 'Livré', 'notes': ''} for i in ids])
+    assert [r['succes'] for r in resultats] == [True, True, False]
+    assert [e for lot in publies for e in lot] == [
+        {'type': 'livraison', 'id': i, 'statut': 'Livré', 'ancien_statut': 'En cours'} for i in ids[:2]
+    ]
@@ -0,0 +1,20 @@
+"""Politique de hachage des mots de passe (PasswordService)"""
+import pytest
+from flask import Flask
+
+from services.password_service import PasswordService
+
+@pytest.mark.parametrize('methode, cout', [('bcrypt', 12), ('pbkdf2:sha256', 600000), ('scrypt', 32768)])
+def test_cout_par_algorithme(methode, cout):
+    assert PasswordService.valider(methode, cout) == cout
+
+@pytest.mark.parametrize('methode, cout', [('bcrypt', 32768), ('bcrypt', 3), ('scrypt', 30000), ('pbkdf2:sha256', 0)])
+def test_cout_invalide(methode, cout):
+    with pytest.raises(ValueError):
+        PasswordService.valider(methode, cout)
+
+def test_refuse_au_demarrage():
+    app = Flask(__name__)
+    app.config.update(PASSWORD_HASH_METHOD='bcrypt', PASSWORD_HASH_COST=32768)
+    with pytest.raises(ValueError, match='entre 4 et 31'):
+        PasswordService.init_app(app)
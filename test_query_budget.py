@@ -0,0 +1,45 @@
+"""Budgets SQL des endpoints de liste (QUERY_PROFILER=raise, voir conftest.py)"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Produit, Client, db
+from services.query_profiler_service import QueryBudgetExceeded
+from services.stock_service import StockService
+from services.vente_service import VenteService
+from services.livraison_service import LivraisonService
+from services.reservation_service import ReservationService
+
+ENDPOINTS = ['/api/ventes', '/api/clients', '/api/livraisons', '/api/reservations', '/api/stocks/mouvements']
+
+@pytest.fixture
+def donnees(app):
+    """Quelques lignes liées: une requête par ligne dépasserait les budgets"""
+    produits = [Produit(nom=f"Produit {i}", prix_achat=1000, prix_unitaire=1500, stock=0) for i in range(3)]
+    clients = [Client(nom=f"Client {i}", adresse=f"Lot {i}, Analakely") for i in range(3)]
+    db.session.add_all(produits + clients)
+    db.session.commit()
+
+    for produit in produits:
+        StockService.ajouter_mouvement_stock(produit.id, 'entree', 20, "Réception")
+    for i in range(5):
+        VenteService.creer_vente(produits[i % 3].id, 1 + i, clients[i % 3].id)
+    demain = datetime.now() + timedelta(days=1)
+    for i in range(3):
+        LivraisonService.creer_livraison(clients[i % 3].id, f"Lot {i}, Analakely", demain)
+        ReservationService.creer_reservation(produits[i].id, clients[i % 3].id, 2, demain)
+
+@pytest.mark.parametrize('chemin', ENDPOINTS)
+def test_budget_respecte(app, client, entetes, donnees, chemin):
+    reponse = client.get(chemin, headers=entetes)
+    assert reponse.status_code == 200
+    assert len(reponse.get_json()) >= 3
+
+    vue = app.view_functions[app.url_map.bind('').match(chemin)[0]]
+    assert int(reponse.headers['X-Query-Count']) <= vue.query_budget
+
+def test_depassement_leve(app, client, entetes, donnees, monkeypatch):
+    vue = app.view_functions['ventes.api_liste_ventes']
+    monkeypatch.setattr(vue, 'query_budget', 0)
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/api/ventes', headers=entetes)
@@ -0,0 +1,69 @@
+"""Réapprovisionnement en masse (StockService.reapprovisionner_tout) contre le chemin produit par produit"""
+import random
+
+from sqlalchemy import select
+
+from models import Produit, MouvementStock, CoucheStock, StockEmplacement, db
+from services.emplacement_service import EmplacementService
+from services.stock_service import StockService
+
+def preparer(graine=7, nombre=40):
+    """Produits sous et au-dessus du seuil, cibles et coûts moyens variés"""
+    rng = random.Random(graine)
+    produits = [Produit(
+        nom=f"Produit {i}",
+        prix_achat=rng.randint(5, 50) * 100,
+        prix_unitaire=10000,
+        stock=rng.randint(0, 30),
+        seuil_alerte=rng.randint(5, 15),
+        quantite_cible=rng.choice([None, rng.randint(10, 60)])
+    ) for i in range(nombre)]
+    db.session.add_all(produits)
+    db.session.commit()
+    for produit in produits[::3]:
+        StockService.ajouter_mouvement_stock(produit.id, 'entree', rng.randint(1, 5),
+                                             cout_unitaire=rng.randint(5, 50) * 100)
+    EmplacementService.consolider()
+
+def etat():
+    EmplacementService.consolider()
+    db.session.expire_all()
+    return {
+        'produits': db.session.execute(
+            select(Produit.id, Produit.stock, Produit.cout_moyen).order_by(Produit.id)).all(),
+        'mouvements': db.session.execute(
+            select(MouvementStock.produit_id, MouvementStock.type_mouvement, MouvementStock.quantite,
+                   MouvementStock.motif, MouvementStock.emplacement_id, MouvementStock.cout_unitaire,
+                   MouvementStock.cout_fifo, MouvementStock.cout_cmp).order_by(MouvementStock.id)).all(),
+        'couches': db.session.execute(
+            select(CoucheStock.produit_id, CoucheStock.emplacement_id, CoucheStock.quantite_restante,
+                   CoucheStock.cout_unitaire).order_by(CoucheStock.id)).all(),
+        'stocks': db.session.execute(
+            select(StockEmplacement.produit_id, StockEmplacement.emplacement_id, StockEmplacement.quantite)
+            .order_by(StockEmplacement.produit_id, StockEmplacement.emplacement_id)).all(),
+    }
+
+def test_identique_produit_par_produit(app, reinitialiser):
+    preparer()
+    simulation = StockService.reapprovisionner_tout(simulation=True)
+    avant = etat()
+    resume = StockService.reapprovisionner_tout()
+    en_masse = etat()
+    assert avant != en_masse
+    assert resume['produits'] == simulation['produits'] > 0
+    assert resume['quantite'] == simulation['quantite']
+
+    reinitialiser()
+    preparer()
+    stock_bas = db.session.scalars(
+        select(Produit.id).where(Produit.stock <= Produit.seuil_alerte).order_by(Produit.id)
+    ).all()
+    for produit_id in stock_bas:
+        StockService.reapprovisionner_automatique(produit_id)
+    assert etat() == en_masse
+
+def test_simulation_n_ecrit_rien(app):
+    preparer()
+    avant = etat()
+    StockService.reapprovisionner_tout(simulation=True)
+    assert etat() == avant
@@ -0,0 +1,64 @@
+"""Sauvegarde puis restauration de toutes les tables (SauvegardeService)"""
+import gzip
+import io
+
+import pytest
+from sqlalchemy import select, text
+
+from models import Produit, Client, db
+from services.sauvegarde_service import SauvegardeService
+from services.stock_service import StockService
+from services.vente_service import VenteService
+
+# Valeurs à échapper au format texte de COPY
+NOMS = ["Tab\tulation", "Deux\nlignes\r", "C:\\chemin\\N", "\\N", "\\", "Café « crème »"]
+
+@pytest.fixture
+def donnees(app):
+    produits = [Produit(nom=nom, prix_achat=0.1 + 0.2 * i, prix_unitaire=1234.5678 + i, stock=i * 3)
+                for i, nom in enumerate(NOMS)]
+    clients = [Client(nom="\\N", contact=None, adresse="Lot\tII\nAnalakely", email="a\\b@exemple.mg"),
+               Client(nom="Rabe", contact="034 00 000 00")]
+    db.session.add_all(produits + clients)
+    db.session.commit()
+    StockService.ajouter_mouvement_stock(produits[1].id, 'entree', 7, motif="Livraison\tfournisseur\\1")
+    VenteService.creer_vente(produits[2].id, 2, clients[0].id)
+    db.session.remove()
+
+def contenu():
+    """Lignes de chaque table, dans l'ordre des clés primaires"""
+    return {table.name: db.session.execute(select(table).order_by(*table.primary_key.columns)).all()
+            for table in db.metadata.sorted_tables}
+
+def test_aller_retour(donnees):
+    avant = contenu()
+    assert {p.stock_bas for p in avant['produit']} == {True, False}
+    fichier = io.BytesIO()
+    comptes = SauvegardeService.sauvegarder(fichier)
+    assert comptes == {nom: len(lignes) for nom, lignes in avant.items()}
+    db.session.remove()
+
+    fichier.seek(0)
+    resume = SauvegardeService.restaurer(fichier)
+    assert resume['tables'] == comptes
+    assert contenu() == avant
+    # Vues des archives recréées
+    assert db.session.scalar(text("SELECT count(*) FROM vente_complete")) == 1
+
+def test_sauvegarde_tronquee(donnees):
+    avant = contenu()
+    fichier = io.BytesIO()
+    SauvegardeService.sauvegarder(fichier)
+    texte = gzip.decompress(fichier.getvalue()).decode()
+    db.session.remove()
+
+    # Coupé au milieu de la table des produits: la base reste intacte
+    coupe = texte.index("Café", texte.index("#table produit "))
+    with pytest.raises(ValueError, match="tronquée"):
+        SauvegardeService.restaurer(io.BytesIO(gzip.compress(texte[:coupe].encode())))
+    assert contenu() == avant
+    assert db.session.scalar(text("SELECT count(*) FROM vente_complete")) == 1
+
+def test_fichier_invalide(app):
+    with pytest.raises(ValueError, match="invalide"):
+        SauvegardeService.restaurer(io.BytesIO(gzip.compress(b'{"format": "autre"}\n')))
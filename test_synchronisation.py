@@ -0,0 +1,71 @@
+"""Synchronisation idempotente des ventes hors ligne (VenteService.synchroniser_ventes)"""
+import pytest
+from sqlalchemy import select, func
+
+from models import Produit, Vente, MouvementStock, StockEmplacement, db
+from services.archive_service import ArchiveService
+from services.emplacement_service import EmplacementService
+from services.stock_service import StockService
+
+@pytest.fixture
+def produit(app):
+    produit = Produit(nom="Riz 1kg", prix_achat=2000, prix_unitaire=2500, stock=0)
+    db.session.add(produit)
+    db.session.commit()
+    StockService.ajouter_mouvement_stock(produit.id, 'entree', 10)
+    return produit.id
+
+def compter():
+    return (db.session.scalar(select(func.count()).select_from(Vente)),
+            db.session.scalar(select(func.count()).select_from(MouvementStock)),
+            db.session.scalar(select(StockEmplacement.quantite)))
+
+def test_lot_rejoue(client, entetes, produit):
+    lot = {'ventes': [
+        {'cle': 'caisse1-3', 'produit_id': produit, 'quantite': 4, 'date_vente': '2026-10-01T09:30:00Z'},
+        {'cle': 'caisse1-1', 'produit_id': produit, 'quantite': 3, 'date_vente': '2026-10-01T08:00:00Z'},
+        {'cle': 'caisse1-2', 'produit_id': produit, 'quantite': 5, 'date_vente': '2026-10-01T09:00:00Z'},
+        {'cle': 'caisse1-1', 'produit_id': produit, 'quantite': 3, 'date_vente': '2026-10-01T08:00:00Z'},
+        {'cle': 'caisse1-4', 'produit_id': 999, 'quantite': 1},
+        {'produit_id': produit, 'quantite': 1},
+    ]}
+    premier = client.post('/api/ventes/synchroniser', json=lot, headers=entetes).get_json()
+    # Ordre chronologique: 08:00 (3) et 09:00 (5) passent, 09:30 (4) dépasse les 2 restants
+    assert [a['statut'] for a in premier['acks']] == ['conflit', 'cree', 'cree', 'doublon', 'rejete', 'rejete']
+    assert premier['acks'][0]['stock'] == 2
+    assert premier['acks'][3]['id'] == premier['acks'][1]['id']
+    apres_premier = compter()
+    assert apres_premier == (2, 3, 2)
+
+    second = client.post('/api/ventes/synchroniser', json=lot, headers=entetes).get_json()
+    assert [a['statut'] for a in second['acks']] == ['conflit', 'doublon', 'doublon', 'doublon', 'rejete', 'rejete']
+    for avant, apres in zip(premier['acks'][1:3], second['acks'][1:3]):
+        assert (apres['id'], apres['total']) == (avant['id'], avant['total'])
+    assert compter() == apres_premier
+
+def test_cle_idempotence_api(client, entetes, produit):
+    entetes = dict(entetes, **{'Idempotency-Key': 'caisse2-1'})
+    premiere = client.post('/api/ventes', json={'produit_id': produit, 'quantite': 2}, headers=entetes)
+    rejouee = client.post('/api/ventes', json={'produit_id': produit, 'quantite': 2}, headers=entetes)
+    assert (premiere.status_code, rejouee.status_code) == (201, 200)
+    assert rejouee.get_json()['id'] == premiere.get_json()['id']
+    EmplacementService.consolider()
+    assert db.session.get(Produit, produit).stock == 8
+
+def test_cle_d_une_vente_archivee(client, entetes, produit):
+    lot = {'ventes': [{'cle': 'caisse3-1', 'produit_id': produit, 'quantite': 2,
+                       'date_vente': '2024-01-15T10:00:00Z'}]}
+    premier = client.post('/api/ventes/synchroniser', json=lot, headers=entetes).get_json()
+    assert premier['acks'][0]['statut'] == 'cree'
+
+    assert ArchiveService.archiver(mois=1, pause=0)['ventes'] == 1
+    assert db.session.scalar(select(func.count()).select_from(Vente)) == 0
+
+    second = client.post('/api/ventes/synchroniser', json=lot, headers=entetes).get_json()
+    assert second['acks'][0] == dict(premier['acks'][0], statut='doublon')
+    assert db.session.scalar(select(func.count()).select_from(Vente)) == 0
+    assert db.session.scalar(select(StockEmplacement.quantite)) == 8
+
+    rejouee = client.post('/api/ventes', json={'produit_id': produit, 'quantite': 2},
+                          headers=dict(entetes, **{'Idempotency-Key': 'caisse3-1'}))
+    assert (rejouee.status_code, rejouee.get_json()['id']) == (200, premier['acks'][0]['id'])
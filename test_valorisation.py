@@ -0,0 +1,154 @@
+"""Valorisation FIFO et CMP (ValorisationService) comparée à un rejeu naïf des mouvements"""
+import random
+import threading
+from collections import defaultdict, deque
+
+import pytest
+from sqlalchemy import delete, select
+
+from models import Produit, MouvementStock, CoucheStock, db
+from services.emplacement_service import EmplacementService
+from services.stock_service import StockService
+from services.valorisation_service import ValorisationService
+from services.vente_service import VenteService
+
+def creer_produit(nom, prix_achat, stock):
+    produit = Produit(nom=nom, prix_achat=prix_achat, prix_unitaire=prix_achat * 2, stock=stock)
+    db.session.add(produit)
+    db.session.commit()
+    return produit
+
+def valeurs(produit_id):
+    EmplacementService.consolider()
+    return ValorisationService.get_valeurs_par_produit()[produit_id]
+
+def test_stock_initial_valorise(app):
+    produit = creer_produit("Riz", 100, 10)
+    StockService.ajouter_mouvement_stock(produit.id, 'entree', 5, cout_unitaire=200)
+    assert valeurs(produit.id) == pytest.approx({'fifo': 2000, 'cmp': 2000})
+
+    # Les unités initiales sortent avant celles de l'entrée
+    vente = VenteService.creer_vente(produit.id, 12)
+    assert db.session.scalar(select(MouvementStock.cout_fifo).where(MouvementStock.vente_id == vente.id)) == 1400
+    assert valeurs(produit.id)['fifo'] == 600
+
+def test_initialiser_reprend_l_ecart(app):
+    ancien = creer_produit("Sucre", 100, 10)
+    partiel = creer_produit("Sel", 50, 4)
+    # Stock d'avant la couche d'ouverture: aucune couche pour l'un, une seule entrée pour l'autre
+    db.session.execute(delete(CoucheStock))
+    db.session.commit()
+    StockService.ajouter_mouvement_stock(partiel.id, 'entree', 6, cout_unitaire=80)
+
+    ValorisationService.initialiser()
+    assert valeurs(ancien.id) == pytest.approx({'fifo': 1000, 'cmp': 1000})
+    # Écart de 4 repris au coût moyen: (4 * 50 + 6 * 80) / 10 = 68
+    assert valeurs(partiel.id)['fifo'] == pytest.approx(4 * 68 + 6 * 80)
+
+    # L'écart repris est le stock le plus ancien
+    vente = VenteService.creer_vente(partiel.id, 4)
+    assert db.session.scalar(
+        select(MouvementStock.cout_fifo).where(MouvementStock.vente_id == vente.id)
+    ) == pytest.approx(4 * 68)
+
+    ValorisationService.initialiser()  # rien de plus à reprendre
+    assert valeurs(partiel.id)['fifo'] == pytest.approx(6 * 80)
+
+@pytest.mark.parametrize('graine', [1, 2, 3])
+def test_rejeu_naif(app, graine):
+    rng = random.Random(graine)
+    boutique = EmplacementService.creer_emplacement("Boutique Analakely").id
+    defaut = EmplacementService.defaut()
+    produits = [creer_produit(f"Produit {i}", 100 + 10 * i, rng.randint(0, 20)) for i in range(3)]
+    initial = {p.id: (p.stock, p.prix_achat) for p in produits}
+
+    for _ in range(120):
+        produit = rng.choice(produits)
+        emplacement = rng.choice((defaut, boutique))
+        disponible = EmplacementService.ligne(produit.id, emplacement).quantite
+        db.session.rollback()
+        operation = rng.random()
+        if operation < 0.35 or not disponible:
+            StockService.ajouter_mouvement_stock(produit.id, 'entree', rng.randint(1, 15),
+                                                 cout_unitaire=rng.randint(50, 300), emplacement_id=emplacement)
+        elif operation < 0.7:
+            VenteService.creer_vente(produit.id, rng.randint(1, disponible), emplacement_id=emplacement)
+        elif operation < 0.85:
+            StockService.ajouter_mouvement_stock(produit.id, 'sortie', rng.randint(1, disponible),
+                                                 motif="Casse", emplacement_id=emplacement)
+        else:
+            autre = boutique if emplacement == defaut else defaut
+            EmplacementService.transferer(produit.id, emplacement, autre, rng.randint(1, disponible))
+
+    # Rejeu: files FIFO par (produit, emplacement), coût moyen par produit
+    files = defaultdict(deque)
+    stock, cout_moyen = {}, {}
+    for produit_id, (quantite, prix_achat) in initial.items():
+        if quantite:
+            files[produit_id, defaut].append([quantite, prix_achat])
+        stock[produit_id], cout_moyen[produit_id] = quantite, prix_achat
+
+    def prendre(produit_id, emplacement_id, quantite):
+        prises, file = [], files[produit_id, emplacement_id]
+        while quantite:
+            couche = file[0]
+            prise = min(quantite, couche[0])
+            prises.append((prise, couche[1]))
+            couche[0] -= prise
+            quantite -= prise
+            if not couche[0]:
+                file.popleft()
+        return prises
+
+    for m in db.session.scalars(select(MouvementStock).order_by(MouvementStock.id)):
+        p = m.produit_id
+        if m.type_mouvement == 'entree':
+            files[p, m.emplacement_id].append([m.quantite, m.cout_unitaire])
+            cout_moyen[p] = (stock[p] * cout_moyen[p] + m.quantite * m.cout_unitaire) / (stock[p] + m.quantite)
+            stock[p] += m.quantite
+        elif m.type_mouvement == 'sortie':
+            prises = prendre(p, m.emplacement_id, m.quantite)
+            assert m.cout_fifo == pytest.approx(sum(q * c for q, c in prises))
+            assert m.cout_cmp == pytest.approx(m.quantite * cout_moyen[p])
+            stock[p] -= m.quantite
+        else:
+            # Transfert: les couches prises à la source arrivent à destination avec leur coût
+            prises = prendre(p, m.emplacement_id, m.quantite)
+            files[p, m.destination_id].extend([q, c] for q, c in prises)
+
+    for produit in produits:
+        attendu = sum(q * c for (p, _), file in files.items() if p == produit.id for q, c in file)
+        obtenu = valeurs(produit.id)
+        assert obtenu['fifo'] == pytest.approx(attendu)
+        assert obtenu['cmp'] == pytest.approx(stock[produit.id] * cout_moyen[produit.id])
+
+def test_entrees_entrelacees(app, monkeypatch):
+    produit = creer_produit("Café", 100, 10)
+    produit_id = produit.id
+    boutique = EmplacementService.creer_emplacement("Boutique Isoraka").id
+    lue, reprise = threading.Event(), threading.Event()
+
+    # L'entrée A lit le produit et sa ligne de stock, puis attend que B soit validée
+    ligne = EmplacementService.ligne
+    def ligne_puis_attente(*args):
+        stock = ligne(*args)
+        if threading.current_thread().name == 'entree-a':
+            lue.set()
+            reprise.wait(5)
+        return stock
+    monkeypatch.setattr(EmplacementService, 'ligne', staticmethod(ligne_puis_attente))
+
+    def entree_a():
+        with app.app_context():
+            StockService.ajouter_mouvement_stock(produit_id, 'entree', 10, cout_unitaire=400)
+    a = threading.Thread(target=entree_a, name='entree-a')
+    a.start()
+    assert lue.wait(5)
+    StockService.ajouter_mouvement_stock(produit_id, 'entree', 10, cout_unitaire=300, emplacement_id=boutique)
+    reprise.set()
+    a.join(10)
+
+    # Comme B puis A: (10 * 100 + 10 * 300) / 20 = 200, puis (20 * 200 + 10 * 400) / 30
+    db.session.rollback()
+    assert db.session.get(Produit, produit_id).cout_moyen == pytest.approx(8000 / 30)
+    assert valeurs(produit_id) == pytest.approx({'fifo': 8000, 'cmp': 8000})
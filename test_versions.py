@@ -0,0 +1,33 @@
+"""Versions de tables et GET conditionnel (VersionService)"""
+from sqlalchemy import select
+
+from models import Produit, VersionTable, db
+
+def version(nom):
+    with db.engine.connect() as conn:
+        return conn.scalar(select(VersionTable.version).where(VersionTable.nom == nom))
+
+def test_etag_suit_les_ecritures(client, entetes):
+    premiere = client.get('/api/produits', headers=entetes)
+    etag = premiere.headers['ETag']
+    assert client.get('/api/produits', headers=dict(entetes, **{'If-None-Match': etag})).status_code == 304
+
+    db.session.add(Produit(nom="Riz", prix_achat=2000, prix_unitaire=2500, stock=0))
+    db.session.commit()
+
+    reponse = client.get('/api/produits', headers=dict(entetes, **{'If-None-Match': etag}))
+    assert reponse.status_code == 200
+    assert reponse.headers['ETag'] != etag
+
+def test_incrementee_apres_commit_seulement(app):
+    avant = version('produit')
+    db.session.add(Produit(nom="Riz", prix_achat=2000, prix_unitaire=2500, stock=0))
+    db.session.flush()
+    assert version('produit') == avant  # aucune ligne de version_table verrouillée par l'écriture
+    db.session.commit()
+    assert version('produit') == avant + 1
+
+    db.session.add(Produit(nom="Sucre", prix_achat=3000, prix_unitaire=3500, stock=0))
+    db.session.flush()
+    db.session.rollback()
+    assert version('produit') == avant + 1
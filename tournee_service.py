@@ -0,0 +1,302 @@
+import csv
+import itertools
+import math
+import os
+import time
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
+from models import Livraison
+
+class TourneeService:
+    # Cache de la table des distances: chemin -> (mtime, table, latitude de référence)
+    _tables = {}
+
+    @staticmethod
+    def normaliser_adresse(adresse):
+        """Normaliser une adresse (minuscules, sans accents ni ponctuation)"""
+        if not adresse:
+            return ""
+        texte = unicodedata.normalize('NFKD', adresse)
+        texte = ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+        parties = []
+        for partie in texte.replace('\n', ',').split(','):
+            mots = ''.join(c if c.isalnum() else ' ' for c in partie).split()
+            if mots:
+                parties.append(' '.join(mots))
+        return ', '.join(parties)
+
+    @staticmethod
+    def zone_adresse(adresse_normalisee):
+        """Déduire la zone d'une adresse normalisée (dernier segment: quartier ou ville)"""
+        if not adresse_normalisee:
+            return "sans zone"
+        return adresse_normalisee.rsplit(', ', 1)[-1]
+
+    @staticmethod
+    def charger_table_distances(chemin):
+        """Charger la table locale des distances (CSV `adresse;latitude;longitude[;zone]`)
+
+        Les coordonnées sont projetées une fois en kilomètres (projection
+        équirectangulaire, précise à l'échelle d'une ville) pour que les
+        distances se calculent ensuite par simple hypoténuse. Retourne la
+        table et la latitude de référence de la projection.
+        """
+        if not chemin or not os.path.exists(chemin):
+            return {}, 0.0
+
+        mtime = os.path.getmtime(chemin)
+        cache = TourneeService._tables.get(chemin)
+        if cache and cache[0] == mtime:
+            return cache[1], cache[2]
+
+        lignes = []
+        with open(chemin, newline='', encoding='utf-8') as f:
+            for ligne in csv.reader(f, delimiter=';'):
+                if len(ligne) < 3:
+                    continue
+                try:
+                    lat, lon = float(ligne[1]), float(ligne[2])
+                except ValueError:
+                    continue  # En-tête ou ligne invalide
+                zone = TourneeService.normaliser_adresse(ligne[3]) if len(ligne) > 3 else ""
+                lignes.append((TourneeService.normaliser_adresse(ligne[0]), lat, lon, zone))
+
+        table = {}
+        lat0 = 0.0
+        if lignes:
+            lat0 = sum(l[1] for l in lignes) / len(lignes)
+            for adresse, lat, lon, zone in lignes:
+                table[adresse] = TourneeService.projeter(lat, lon, lat0) + (zone,)
+
+        TourneeService._tables[chemin] = (mtime, table, lat0)
+        return table, lat0
+
+    @staticmethod
+    def projeter(latitude, longitude, latitude_reference):
+        """Projeter des coordonnées GPS en kilomètres sur un plan local"""
+        return (longitude * 111.32 * math.cos(math.radians(latitude_reference)),
+                latitude * 110.57)
+
+    @staticmethod
+    def _grille(points, indices, taille):
+        """Répartir des points dans une grille de cellules carrées"""
+        cellules = {}
+        for i in indices:
+            x, y = points[i]
+            cellules.setdefault((int(x // taille), int(y // taille)), []).append(i)
+        return cellules
+
+    @staticmethod
+    def _taille_cellule(points):
+        """Taille de cellule donnant environ deux points par cellule"""
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        surface = max(max(xs) - min(xs), 1e-6) * max(max(ys) - min(ys), 1e-6)
+        return max(math.sqrt(2 * surface / len(points)), 1e-6)
+
+    @staticmethod
+    def _plus_proches_voisins(points, taille, cellules, k, echeance=None):
+        """Calculer les k plus proches voisins de chaque point via la grille
+
+        Une cellule dense (points confondus ou très proches) ne fournit que
+        4k candidats, pris autour du point: le coût reste linéaire. Retourne
+        None si l'échéance est dépassée.
+        """
+        limite = 4 * k
+        voisins = []
+        for i, (x, y) in enumerate(points):
+            if echeance is not None and time.perf_counter() >= echeance:
+                return None
+            cx, cy = int(x // taille), int(y // taille)
+            rayon = 1
+            while True:
+                candidats = []
+                for gx in range(cx - rayon, cx + rayon + 1):
+                    for gy in range(cy - rayon, cy + rayon + 1):
+                        membres = cellules.get((gx, gy), ())
+                        if len(membres) > limite:
+                            debut = min(max(bisect_left(membres, i) - limite // 2, 0), len(membres) - limite)
+                            membres = membres[debut:debut + limite]
+                        candidats.extend(membres)
+                if len(candidats) > k or len(candidats) >= len(points):
+                    break
+                rayon += 1
+            candidats.sort(key=lambda j: (points[j][0] - x) ** 2 + (points[j][1] - y) ** 2)
+            voisins.append([j for j in candidats if j != i][:k])
+        return voisins
+
+    @staticmethod
+    def _voisin_le_plus_proche(points, depart, taille, echeance=None, limite=32):
+        """Construire un chemin par la méthode du plus proche voisin
+
+        Au plus `limite` points sont examinés par cellule. À l'échéance, les
+        points restants sont ajoutés cellule par cellule, sans recherche.
+        """
+        n = len(points)
+        cellules = {c: set(v) for c, v in TourneeService._grille(points, range(n), taille).items()}
+
+        def retirer(i):
+            cle = (int(points[i][0] // taille), int(points[i][1] // taille))
+            cellules[cle].discard(i)
+            if not cellules[cle]:
+                del cellules[cle]
+
+        chemin = [depart]
+        retirer(depart)
+        while cellules:
+            if echeance is not None and time.perf_counter() >= echeance:
+                chemin.extend(j for cle in sorted(cellules) for j in sorted(cellules[cle]))
+                break
+            x, y = points[chemin[-1]]
+            cx, cy = int(x // taille), int(y // taille)
+            meilleur, meilleure_distance = None, float('inf')
+            rayon = 0
+            while meilleur is None or meilleure_distance > (rayon - 1) * taille:
+                if (2 * rayon + 1) ** 2 > len(cellules):
+                    # Anneaux trop grands: balayer directement les cellules restantes
+                    for membres in cellules.values():
+                        for j in itertools.islice(membres, limite):
+                            d = math.hypot(points[j][0] - x, points[j][1] - y)
+                            if d < meilleure_distance:
+                                meilleur, meilleure_distance = j, d
+                    break
+                for gx in range(cx - rayon, cx + rayon + 1):
+                    for gy in range(cy - rayon, cy + rayon + 1):
+                        if max(abs(gx - cx), abs(gy - cy)) != rayon:
+                            continue
+                        for j in itertools.islice(cellules.get((gx, gy), ()), limite):
+                            d = math.hypot(points[j][0] - x, points[j][1] - y)
+                            if d < meilleure_distance:
+                                meilleur, meilleure_distance = j, d
+                rayon += 1
+            chemin.append(meilleur)
+            retirer(meilleur)
+        return chemin
+
+    @staticmethod
+    def _deux_opt(points, chemin, voisins, echeance):
+        """Améliorer un chemin ouvert (départ fixe) par 2-opt sur listes de voisins"""
+        n = len(chemin)
+        position = [0] * n
+        for i, p in enumerate(chemin):
+            position[p] = i
+
+        def dist(a, b):
+            return math.hypot(points[a][0] - points[b][0], points[a][1] - points[b][1])
+
+        ameliore = True
+        while ameliore and time.perf_counter() < echeance:
+            ameliore = False
+            for a in range(n):
+                for c in voisins[a]:
+                    i, j = position[a], position[c]
+                    bas, haut = min(i, j), max(i, j)
+                    if haut - bas < 2:
+                        continue
+                    p1, p2, p3 = chemin[bas], chemin[bas + 1], chemin[haut]
+                    gain = dist(p1, p2) - dist(p1, p3)
+                    if haut + 1 < n:
+                        p4 = chemin[haut + 1]
+                        gain += dist(p3, p4) - dist(p2, p4)
+                    if gain > 1e-9:
+                        chemin[bas + 1:haut + 1] = chemin[bas + 1:haut + 1][::-1]
+                        for k in range(bas + 1, haut + 1):
+                            position[chemin[k]] = k
+                        ameliore = True
+                        break
+                if time.perf_counter() >= echeance:
+                    break
+        return chemin
+
+    @staticmethod
+    def ordonner_points(points, depart=None, temps_max=0.5):
+        """Ordonner des points (x, y en km) en tournée: plus proche voisin puis 2-opt
+
+        Si `depart` est fourni (coordonnées du dépôt), la tournée part de ce
+        point; sinon elle part du premier point. Retourne la liste des indices
+        dans l'ordre de passage et la distance totale parcourue.
+        """
+        if not points:
+            return [], 0.0
+
+        echeance = time.perf_counter() + temps_max
+        tous = ([depart] if depart else []) + list(points)
+        taille = TourneeService._taille_cellule(tous)
+
+        chemin = TourneeService._voisin_le_plus_proche(tous, 0, taille, echeance)
+        if len(tous) > 3 and time.perf_counter() < echeance:
+            cellules = TourneeService._grille(tous, range(len(tous)), taille)
+            voisins = TourneeService._plus_proches_voisins(tous, taille, cellules, 8, echeance)
+            if voisins is not None:
+                chemin = TourneeService._deux_opt(tous, chemin, voisins, echeance)
+
+        distance = sum(
+            math.hypot(tous[a][0] - tous[b][0], tous[a][1] - tous[b][1])
+            for a, b in zip(chemin, chemin[1:])
+        )
+        if depart:
+            chemin = [i - 1 for i in chemin[1:]]
+        return chemin, distance
+
+    @staticmethod
+    def planifier_tournees(date=None, chemin_table=None, depot=None, temps_max=0.8):
+        """Regrouper les livraisons en cours d'une journée par zone et ordonner chaque tournée
+
+        `depot` est un couple (latitude, longitude) optionnel; il n'est
+        utilisé que si la table des distances contient des coordonnées.
+        Les livraisons dont l'adresse est absente de la table sont placées
+        en fin de tournée, dans l'ordre de création.
+        """
+        if not date:
+            date = datetime.now().date()
+
+        debut = datetime.combine(date, datetime.min.time())
+        fin = debut + timedelta(days=1)
+
+        livraisons = Livraison.query.options(joinedload(Livraison.client)).filter(
+            Livraison.statut == "En cours",
+            Livraison.date_prevue >= debut,
+            Livraison.date_prevue < fin
+        ).order_by(Livraison.id).all()
+
+        table, lat0 = TourneeService.charger_table_distances(chemin_table)
+
+        groupes = {}
+        for livraison in livraisons:
+            adresse = TourneeService.normaliser_adresse(livraison.adresse)
+            entree = table.get(adresse)
+            zone = (entree[2] if entree and entree[2] else None) or TourneeService.zone_adresse(adresse)
+            groupes.setdefault(zone, []).append((livraison, entree))
+
+        point_depot = TourneeService.projeter(depot[0], depot[1], lat0) if depot and table else None
+
+        tournees = []
+        for zone in sorted(groupes):
+            arrets = groupes[zone]
+            localises = [(l, e) for l, e in arrets if e]
+            non_localises = [l for l, e in arrets if not e]
+
+            budget = temps_max * len(arrets) / max(len(livraisons), 1)
+            ordre, distance = TourneeService.ordonner_points(
+                [(e[0], e[1]) for _, e in localises], point_depot, budget
+            )
+            sequence = [localises[i][0] for i in ordre] + non_localises
+
+            tournees.append({
+                'zone': zone,
+                'date': date.isoformat(),
+                'nombre_arrets': len(sequence),
+                'distance_km': round(distance, 2),
+                'non_localisees': len(non_localises),
+                'arrets': [{
+                    'ordre': rang,
+                    'livraison_id': l.id,
+                    'client_nom': l.client.nom,
+                    'adresse': l.adresse,
+                    'date_prevue': l.date_prevue.isoformat() if l.date_prevue else None
+                } for rang, l in enumerate(sequence, start=1)]
+            })
+
+        return tournees
@@ -0,0 +1,228 @@
+from datetime import datetime
+from sqlalchemy import select, func, update, insert, and_, literal, case
+from sqlalchemy.orm.attributes import set_committed_value
+from models import Produit, MouvementStockComplete, CoucheStock, StockEmplacement, db
+from services.changement_service import ChangementService
+
+class ValorisationService:
+    """Valorisation du stock au FIFO et au coût moyen pondéré (CMP)
+
+    Mise à jour à chaque mouvement, dans sa transaction:
+    - entrée: nouvelle couche (quantité, coût unitaire) et nouveau Produit.cout_moyen
+    - sortie: consommation des couches les plus anciennes de l'emplacement
+      (date d'entrée, puis ordre de création)
+    - transfert: les couches consommées à la source sont recréées à destination
+    Le coût de chaque mouvement est enregistré selon les deux méthodes: la
+    valeur du stock et le coût des ventes d'une période se lisent par agrégats,
+    sans rejouer l'historique des mouvements. La valeur CMP porte sur la somme
+    des stocks des emplacements, à jour sans attendre la consolidation de
+    Produit.stock (voir EmplacementService).
+    """
+
+    @staticmethod
+    def cout_moyen(produit):
+        return produit.cout_moyen if produit.cout_moyen is not None else produit.prix_achat
+
+    @staticmethod
+    def nouveau_cout_moyen(stock, cout_moyen, quantite, cout_unitaire):
+        """Coût moyen pondéré après l'entrée de `quantite` au coût `cout_unitaire`"""
+        stock = max(stock or 0, 0)
+        return (stock * cout_moyen + quantite * cout_unitaire) / (stock + quantite)
+
+    @staticmethod
+    def entree(produit, quantite, cout_unitaire, mouvement):
+        """Valoriser une entrée (avant la mise à jour du stock de son emplacement)
+
+        Le coût moyen est recalculé par un seul UPDATE, à partir du coût moyen
+        et du stock total lus en base: deux entrées simultanées du même produit
+        s'enchaînent sans que l'une efface l'autre. L'appelant verrouille la
+        ligne produit au début de la transaction (StockService).
+        """
+        stock = select(func.coalesce(func.sum(StockEmplacement.quantite), 0)).where(
+            StockEmplacement.produit_id == produit.id
+        ).scalar_subquery()
+        stock = case((stock > 0, stock), else_=0)
+        cout_moyen = db.session.scalar(
+            update(Produit).where(Produit.id == produit.id).values(
+                cout_moyen=(stock * func.coalesce(Produit.cout_moyen, Produit.prix_achat)
+                            + quantite * cout_unitaire) / (stock + quantite)
+            ).returning(Produit.cout_moyen).execution_options(synchronize_session=False)
+        )
+        set_committed_value(produit, 'cout_moyen', cout_moyen)
+        ChangementService.enregistrer(db.session, Produit, 'update', [{'id': produit.id, 'cout_moyen': cout_moyen}])
+
+        mouvement.cout_unitaire = cout_unitaire
+        mouvement.cout_fifo = mouvement.cout_cmp = quantite * cout_unitaire
+        db.session.add(CoucheStock(
+            produit_id=produit.id,
+            emplacement_id=mouvement.emplacement_id,
+            mouvement=mouvement,
+            quantite_restante=quantite,
+            cout_unitaire=cout_unitaire
+        ))
+
+    @staticmethod
+    def couches(produit_id, emplacement_id):
+        """Couches d'un produit dans un emplacement, verrouillées, des plus anciennes aux plus récentes"""
+        return db.session.scalars(
+            select(CoucheStock).where(
+                CoucheStock.produit_id == produit_id,
+                CoucheStock.emplacement_id == emplacement_id
+            ).order_by(CoucheStock.date_entree, CoucheStock.id).with_for_update()
+        ).all()
+
+    @staticmethod
+    def sortie(produit, quantite, mouvement):
+        """Valoriser une sortie en consommant les couches les plus anciennes de son emplacement"""
+        couches = ValorisationService.couches(produit.id, mouvement.emplacement_id)
+        cout_fifo, cout_cmp = ValorisationService.consommer(
+            couches, quantite, ValorisationService.cout_moyen(produit)
+        )
+        mouvement.cout_fifo = cout_fifo
+        mouvement.cout_cmp = cout_cmp
+
+    @staticmethod
+    def transfert(produit, quantite, mouvement):
+        """Valoriser un transfert: les couches prises à la source sont recréées à destination"""
+        couches = ValorisationService.couches(produit.id, mouvement.emplacement_id)
+        cout_moyen = ValorisationService.cout_moyen(produit)
+        prises = []
+        mouvement.cout_fifo, mouvement.cout_cmp = ValorisationService.consommer(
+            couches, quantite, cout_moyen, prises
+        )
+        # Quantité sans couche à la source: arrive au coût moyen
+        reste = quantite - sum(prise for prise, _ in prises)
+        if reste:
+            prises.append((reste, cout_moyen))
+        for prise, cout_unitaire in prises:
+            db.session.add(CoucheStock(
+                produit_id=produit.id,
+                emplacement_id=mouvement.destination_id,
+                mouvement=mouvement,
+                quantite_restante=prise,
+                cout_unitaire=cout_unitaire
+            ))
+
+    @staticmethod
+    def consommer(couches, quantite, cout_moyen, prises=None):
+        """Prendre quantite dans les couches (plus anciennes d'abord), vidées supprimées
+
+        Retourne le coût de la sortie (FIFO, CMP). prises reçoit les
+        (quantité, coût unitaire) prélevés sur chaque couche.
+        """
+        reste = quantite
+        cout = 0
+        for couche in couches:
+            if not couche.quantite_restante:
+                continue  # déjà vidée par une sortie précédente du même lot
+            prise = min(reste, couche.quantite_restante)
+            cout += prise * couche.cout_unitaire
+            reste -= prise
+            if prises is not None:
+                prises.append((prise, couche.cout_unitaire))
+            couche.quantite_restante -= prise
+            if not couche.quantite_restante:
+                db.session.delete(couche)
+            if not reste:
+                break
+
+        # Stock sans couche (antérieur à la valorisation): coût moyen
+        return cout + reste * cout_moyen, quantite * cout_moyen
+
+    @staticmethod
+    def requete_stocks():
+        """Stock total de chaque produit: somme de ses emplacements"""
+        return select(
+            StockEmplacement.produit_id,
+            func.sum(StockEmplacement.quantite).label('quantite')
+        ).group_by(StockEmplacement.produit_id).subquery()
+
+    @staticmethod
+    def requete_valeurs_par_produit():
+        """Valeur FIFO et valeur au coût moyen du stock de chaque produit"""
+        fifo = select(
+            CoucheStock.produit_id,
+            func.sum(CoucheStock.quantite_restante * CoucheStock.cout_unitaire).label('valeur')
+        ).group_by(CoucheStock.produit_id).subquery()
+        stocks = ValorisationService.requete_stocks()
+
+        return select(
+            Produit.id,
+            func.coalesce(fifo.c.valeur, 0),
+            func.coalesce(stocks.c.quantite, 0) * func.coalesce(Produit.cout_moyen, Produit.prix_achat)
+        ).outerjoin(fifo, fifo.c.produit_id == Produit.id).outerjoin(stocks, stocks.c.produit_id == Produit.id)
+
+    @staticmethod
+    def get_valeurs_par_produit():
+        return {produit_id: {'fifo': fifo, 'cmp': cmp}
+                for produit_id, fifo, cmp in db.session.execute(ValorisationService.requete_valeurs_par_produit())}
+
+    @staticmethod
+    def get_valeur_stock():
+        """Valeur totale du stock selon chaque méthode"""
+        fifo = db.session.scalar(select(func.sum(CoucheStock.quantite_restante * CoucheStock.cout_unitaire)))
+        stocks = ValorisationService.requete_stocks()
+        cmp = db.session.scalar(select(
+            func.sum(stocks.c.quantite * func.coalesce(Produit.cout_moyen, Produit.prix_achat))
+        ).join_from(stocks, Produit, Produit.id == stocks.c.produit_id))
+        return {'fifo': fifo or 0, 'cmp': cmp or 0}
+
+    @staticmethod
+    def get_cout_des_ventes(debut, fin):
+        """Coût des marchandises vendues entre debut (inclus) et fin (exclue)
+
+        Les autres sorties (casse, pertes...) sont comptées à part. Les
+        mouvements archivés sont compris.
+        """
+        lignes = db.session.execute(
+            select(
+                MouvementStockComplete.vente_id.is_not(None),
+                func.sum(MouvementStockComplete.quantite),
+                func.sum(MouvementStockComplete.cout_fifo),
+                func.sum(MouvementStockComplete.cout_cmp)
+            ).where(
+                MouvementStockComplete.type_mouvement == 'sortie',
+                MouvementStockComplete.date_mouvement >= debut,
+                MouvementStockComplete.date_mouvement < fin
+            ).group_by(MouvementStockComplete.vente_id.is_not(None))
+        ).all()
+
+        resultat = {cle: {'quantite': 0, 'fifo': 0, 'cmp': 0} for cle in ('ventes', 'autres_sorties')}
+        for vente, quantite, fifo, cmp in lignes:
+            resultat['ventes' if vente else 'autres_sorties'] = {
+                'quantite': quantite or 0,
+                'fifo': fifo or 0,
+                'cmp': cmp or 0
+            }
+        return resultat
+
+    @staticmethod
+    def initialiser():
+        """Couche d'ouverture pour le stock sans couche, par produit et emplacement (étape init-db)
+
+        L'écart entre StockEmplacement.quantite et la somme des couches est
+        repris au coût moyen, daté de la création du produit: c'est le stock
+        le plus ancien, consommé en premier. À lancer après
+        EmplacementService.initialiser(), qui crée les lignes de stock.
+        """
+        with db.engine.begin() as conn:
+            conn.execute(update(Produit).where(Produit.cout_moyen.is_(None)).values(cout_moyen=Produit.prix_achat))
+            couches = select(
+                CoucheStock.produit_id,
+                CoucheStock.emplacement_id,
+                func.sum(CoucheStock.quantite_restante).label('quantite')
+            ).group_by(CoucheStock.produit_id, CoucheStock.emplacement_id).subquery()
+            ecart = StockEmplacement.quantite - func.coalesce(couches.c.quantite, 0)
+            conn.execute(insert(CoucheStock).from_select(
+                ['produit_id', 'emplacement_id', 'quantite_restante', 'cout_unitaire', 'date_entree'],
+                select(
+                    StockEmplacement.produit_id,
+                    StockEmplacement.emplacement_id,
+                    ecart,
+                    Produit.cout_moyen,
+                    func.coalesce(Produit.created_at, literal(datetime.utcnow()))
+                ).join(Produit, Produit.id == StockEmplacement.produit_id).outerjoin(couches, and_(
+                    couches.c.produit_id == StockEmplacement.produit_id,
+                    couches.c.emplacement_id == StockEmplacement.emplacement_id
+                )).where(ecart > 0)
+            ))
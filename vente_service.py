@@ -1,97 +1,365 @@
-from models import Vente, Produit, Client, db
-from datetime import datetime, timedelta
-from sqlalchemy import func
+from models import Vente, VenteComplete, Produit, Client, MouvementStock, CoucheStock, Emplacement, StockEmplacement, VariationStock, db
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select, insert
+from sqlalchemy.exc import IntegrityError
+from services.replica_service import ReplicaService
+from services.valorisation_service import ValorisationService
+from services.flux_service import FluxService
+from services.emplacement_service import EmplacementService
+from services.changement_service import ChangementService
 
 class VenteService:
     @staticmethod
-    def creer_vente(produit_id, quantite, client_id=None):
-        """Créer une nouvelle vente"""
+    def creer_vente(produit_id, quantite, client_id=None, emplacement_id=None):
+        """Créer une nouvelle vente (emplacement par défaut si non précisé)"""
         try:
             produit = Produit.query.get(produit_id)
             if not produit:
                 raise ValueError("Produit non trouvé")
             
-            if produit.stock < quantite:
+            emplacement_id = emplacement_id or EmplacementService.defaut()
+            stock = EmplacementService.ligne(produit_id, emplacement_id)
+            if stock.quantite < quantite:
+                db.session.rollback()
                 return None  # Stock insuffisant
             
             # Créer la vente
             vente = Vente(
                 produit_id=produit_id,
                 client_id=client_id,
+                emplacement_id=emplacement_id,
                 quantite=quantite,
                 prix_unitaire=produit.prix_unitaire,
                 total=produit.prix_unitaire * quantite
             )
             
-            # Mettre à jour le stock
-            produit.stock -= quantite
+            # Sortie de stock valorisée (coût des marchandises vendues)
+            mouvement = MouvementStock(
+                produit_id=produit_id,
+                emplacement_id=emplacement_id,
+                type_mouvement='sortie',
+                quantite=quantite,
+                motif='Vente',
+                vente=vente
+            )
+            ValorisationService.sortie(produit, quantite, mouvement)
+            
+            # Mettre à jour le stock de l'emplacement
+            EmplacementService.modifier(stock, -quantite)
             
             db.session.add(vente)
+            db.session.add(mouvement)
             db.session.commit()
             
-            return vente
-            
         except Exception as e:
             db.session.rollback()
             raise e
+        
+        EmplacementService.demander_consolidation()
+        return vente
     
     @staticmethod
-    def get_statistiques_financieres():
-        """Obtenir les statistiques financières"""
-        # Calculs des totaux
-        total_ventes = db.session.query(func.sum(Vente.total)).scalar() or 0
-        total_benefices = db.session.query(
-            func.sum((Vente.prix_unitaire - Produit.prix_achat) * Vente.quantite)
-        ).join(Produit).scalar() or 0
+    def synchroniser_ventes(ventes):
+        """Enregistrer un lot de ventes saisies hors ligne par une caisse
         
-        nombre_ventes = Vente.query.count()
+        Chaque vente porte une clé d'idempotence générée par la caisse et sa
+        date d'origine: {'cle', 'produit_id', 'quantite', 'client_id',
+        'emplacement_id', 'prix_unitaire', 'date_vente'} (les quatre derniers
+        facultatifs, emplacement par défaut si absent). Une clé déjà
+        enregistrée, même archivée, est acquittée avec la vente existante, sans
+        doublon. Les autres ventes sont appliquées par ordre chronologique, écrites par
+        lots dans une seule transaction; celle qui dépasse le stock restant est
+        signalée en conflit (stock de son emplacement) et n'est pas enregistrée
+        (à renvoyer plus tard avec la même clé).
         
-        # Ventes du jour
-        aujourd_hui = datetime.now().date()
-        ventes_jour = db.session.query(func.sum(Vente.total)).filter(
-            func.date(Vente.date_vente) == aujourd_hui
-        ).scalar() or 0
+        Retourne un acquittement par vente, dans l'ordre reçu: {'cle', 'statut'}
+        plus 'id' et 'total' (cree, doublon), 'stock' (conflit) ou 'motif' (rejete).
+        """
+        for tentative in range(2):
+            try:
+                acks = VenteService._appliquer_ventes(ventes)
+                EmplacementService.demander_consolidation()
+                return acks
+            except IntegrityError:
+                # Même clé enregistrée entre-temps par une autre requête:
+                # relue comme doublon au second passage
+                db.session.rollback()
+                if tentative:
+                    raise
+            except Exception:
+                db.session.rollback()
+                raise
+    
+    @staticmethod
+    def _lire_vente_hors_ligne(donnees):
+        cle = donnees.get('cle')
+        if not isinstance(cle, str) or not 0 < len(cle) <= 64:
+            raise ValueError("clé d'idempotence manquante ou trop longue (64 caractères)")
+        if 'produit_id' not in donnees or 'quantite' not in donnees:
+            raise ValueError("produit_id et quantite sont requis")
+        quantite = int(donnees['quantite'])
+        if quantite <= 0:
+            raise ValueError("quantité invalide")
         
-        # Ventes du mois
-        debut_mois = datetime.now().replace(day=1)
-        ventes_mois = db.session.query(func.sum(Vente.total)).filter(
-            Vente.date_vente >= debut_mois
-        ).scalar() or 0
+        date_vente = donnees.get('date_vente')
+        if date_vente:
+            try:
+                date_vente = datetime.fromisoformat(date_vente)
+            except (TypeError, ValueError):
+                raise ValueError("date_vente invalide (ISO 8601 attendu)")
+            if date_vente.tzinfo is not None:
+                date_vente = date_vente.astimezone(timezone.utc).replace(tzinfo=None)
+        prix_unitaire = donnees.get('prix_unitaire')
+        if prix_unitaire is not None and float(prix_unitaire) < 0:
+            raise ValueError("prix invalide")
         
         return {
-            'total_ventes': total_ventes,
-            'total_benefices': total_benefices,
-            'nombre_ventes': nombre_ventes,
-            'ventes_jour': ventes_jour,
-            'ventes_mois': ventes_mois,
-            'moyenne_vente': total_ventes / nombre_ventes if nombre_ventes > 0 else 0
+            'cle': cle,
+            'produit_id': int(donnees['produit_id']),
+            'client_id': int(donnees['client_id']) if donnees.get('client_id') else None,
+            'emplacement_id': int(donnees['emplacement_id']) if donnees.get('emplacement_id') else None,
+            'quantite': quantite,
+            'prix_unitaire': float(prix_unitaire) if prix_unitaire is not None else None,
+            'date_vente': date_vente or datetime.utcnow()
         }
     
+    @staticmethod
+    def _appliquer_ventes(ventes):
+        acks = [None] * len(ventes)
+        candidates = []
+        premieres = {}  # clé -> rang de sa première occurrence dans le lot
+        repetees = {}
+        for rang, donnees in enumerate(ventes):
+            try:
+                vente = VenteService._lire_vente_hors_ligne(donnees)
+            except (AttributeError, TypeError, ValueError) as e:
+                cle = donnees.get('cle') if isinstance(donnees, dict) else None
+                acks[rang] = {'cle': cle, 'statut': 'rejete', 'motif': str(e)}
+                continue
+            if vente['cle'] in premieres:
+                repetees[rang] = premieres[vente['cle']]
+                continue
+            premieres[vente['cle']] = rang
+            candidates.append((rang, vente))
+        
+        # Clés déjà synchronisées (index uniques), ventes archivées comprises:
+        # une caisse peut renvoyer une vente après l'archivage de sa période
+        existantes = {}
+        if premieres:
+            existantes = {l.cle_idempotence: l for l in db.session.execute(
+                select(VenteComplete.cle_idempotence, VenteComplete.id, VenteComplete.total)
+                .where(VenteComplete.cle_idempotence.in_(list(premieres)))
+            )}
+        a_appliquer = []
+        for rang, vente in candidates:
+            existante = existantes.get(vente['cle'])
+            if existante:
+                acks[rang] = {'cle': vente['cle'], 'statut': 'doublon', 'id': existante.id, 'total': existante.total}
+            else:
+                a_appliquer.append((rang, vente))
+        
+        produit_ids = {v['produit_id'] for _, v in a_appliquer}
+        client_ids = {v['client_id'] for _, v in a_appliquer if v['client_id']}
+        produits = {}
+        clients = {}
+        emplacements = set()
+        stocks = {}  # (produit, emplacement) -> StockEmplacement
+        couches = defaultdict(list)
+        if a_appliquer:
+            defaut = EmplacementService.defaut()
+            for _, vente in a_appliquer:
+                vente['emplacement_id'] = vente['emplacement_id'] or defaut
+            emplacements = set(db.session.scalars(select(Emplacement.id).where(
+                Emplacement.id.in_({v['emplacement_id'] for _, v in a_appliquer})
+            )))
+            produits = {l.id: l for l in db.session.execute(
+                select(Produit.id, Produit.nom, Produit.prix_unitaire, Produit.prix_achat,
+                       func.coalesce(Produit.cout_moyen, Produit.prix_achat).label('cout_moyen'))
+                .where(Produit.id.in_(produit_ids))
+            )}
+            # Verrous sur les stocks et couches des emplacements concernés
+            # seulement: la ligne du produit n'est pas touchée
+            for stock in db.session.scalars(
+                select(StockEmplacement).where(
+                    StockEmplacement.produit_id.in_(produit_ids),
+                    StockEmplacement.emplacement_id.in_(emplacements)
+                ).order_by(StockEmplacement.id).with_for_update()
+            ):
+                stocks[stock.produit_id, stock.emplacement_id] = stock
+            for couche in db.session.scalars(
+                select(CoucheStock).where(
+                    CoucheStock.produit_id.in_(produit_ids),
+                    CoucheStock.emplacement_id.in_(emplacements)
+                ).order_by(CoucheStock.date_entree, CoucheStock.id).with_for_update()
+            ):
+                couches[couche.produit_id, couche.emplacement_id].append(couche)
+        if client_ids:
+            clients = dict(db.session.execute(select(Client.id, Client.nom).where(Client.id.in_(client_ids))).all())
+        
+        # Ordre chronologique des caisses: le stock va à la vente la plus ancienne
+        variations = defaultdict(int)
+        lignes = []
+        for rang, vente in sorted(a_appliquer, key=lambda rv: (rv[1]['date_vente'], rv[0])):
+            produit = produits.get(vente['produit_id'])
+            if produit is None:
+                acks[rang] = {'cle': vente['cle'], 'statut': 'rejete', 'motif': 'produit non trouvé'}
+                continue
+            if vente['emplacement_id'] not in emplacements:
+                acks[rang] = {'cle': vente['cle'], 'statut': 'rejete', 'motif': 'emplacement non trouvé'}
+                continue
+            if vente['client_id'] and vente['client_id'] not in clients:
+                acks[rang] = {'cle': vente['cle'], 'statut': 'rejete', 'motif': 'client non trouvé'}
+                continue
+            stock = stocks.get((produit.id, vente['emplacement_id']))
+            if stock is None or stock.quantite < vente['quantite']:
+                acks[rang] = {'cle': vente['cle'], 'statut': 'conflit', 'stock': stock.quantite if stock else 0}
+                continue
+            
+            stock.quantite -= vente['quantite']
+            variations[produit.id] -= vente['quantite']
+            prix = produit.prix_unitaire if vente['prix_unitaire'] is None else vente['prix_unitaire']
+            cout_fifo, cout_cmp = ValorisationService.consommer(
+                couches[produit.id, vente['emplacement_id']], vente['quantite'], produit.cout_moyen
+            )
+            lignes.append((rang, vente, produit, prix, cout_fifo, cout_cmp))
+        
+        if lignes:
+            valeurs_ventes = [{
+                'produit_id': produit.id,
+                'client_id': vente['client_id'],
+                'emplacement_id': vente['emplacement_id'],
+                'quantite': vente['quantite'],
+                'prix_unitaire': prix,
+                'total': prix * vente['quantite'],
+                'date_vente': vente['date_vente'],
+                'cle_idempotence': vente['cle']
+            } for _, vente, produit, prix, _, _ in lignes]
+            vente_ids = db.session.scalars(
+                insert(Vente).returning(Vente.id, sort_by_parameter_order=True), valeurs_ventes
+            ).all()
+            valeurs_mouvements = [{
+                'produit_id': produit.id,
+                'emplacement_id': vente['emplacement_id'],
+                'type_mouvement': 'sortie',
+                'quantite': vente['quantite'],
+                'motif': 'Vente',
+                'date_mouvement': vente['date_vente'],
+                'vente_id': vente_id,
+                'cout_fifo': cout_fifo,
+                'cout_cmp': cout_cmp
+            } for (_, vente, produit, _, cout_fifo, cout_cmp), vente_id in zip(lignes, vente_ids)]
+            mouvement_ids = db.session.scalars(
+                insert(MouvementStock).returning(MouvementStock.id, sort_by_parameter_order=True),
+                valeurs_mouvements
+            ).all()
+            ChangementService.enregistrer(db.session, Vente, 'insert', [
+                dict(v, id=i) for v, i in zip(valeurs_ventes, vente_ids)
+            ])
+            ChangementService.enregistrer(db.session, MouvementStock, 'insert', [
+                dict(v, id=i) for v, i in zip(valeurs_mouvements, mouvement_ids)
+            ])
+            # Totaux des produits: reportés par EmplacementService.consolider()
+            db.session.execute(insert(VariationStock), [
+                {'produit_id': produit_id, 'variation': variation} for produit_id, variation in variations.items()
+            ])
+            
+            evenements = []
+            for (rang, vente, produit, prix, _, _), vente_id in zip(lignes, vente_ids):
+                total = prix * vente['quantite']
+                acks[rang] = {'cle': vente['cle'], 'statut': 'cree', 'id': vente_id, 'total': total}
+                evenements.append({
+                    'type': 'vente',
+                    'id': vente_id,
+                    'produit_id': produit.id,
+                    'produit_nom': produit.nom,
+                    'client_nom': clients.get(vente['client_id']),
+                    'quantite': vente['quantite'],
+                    'total': total,
+                    'benefice': (prix - produit.prix_achat) * vente['quantite'],
+                    'date_vente': vente['date_vente'].isoformat()
+                })
+            FluxService.ajouter(db.session, evenements)
+            db.session.commit()
+        else:
+            db.session.rollback()  # libère les verrous
+        
+        # Clé répétée dans le lot: même sort que sa première occurrence
+        for rang, premier in repetees.items():
+            ack = acks[premier]
+            acks[rang] = dict(ack, statut='doublon') if ack['statut'] == 'cree' else ack
+        return acks
+    
+    @staticmethod
+    def get_statistiques_financieres():
+        """Obtenir les statistiques financières (lues sur le réplica)"""
+        with ReplicaService.lecture():
+            valeurs = {nom: db.session.execute(requete).scalar()
+                       for nom, requete in VenteService.requetes_statistiques_financieres().items()}
+        return VenteService.formater_statistiques_financieres(valeurs)
+    
+    @staticmethod
+    def requetes_statistiques_financieres():
+        """Requêtes scalaires des statistiques financières (partagées avec l'API asynchrone)
+
+        Totaux sur les ventes archivées comprises; le jour et le mois en cours
+        sont toujours dans la table active.
+        """
+        aujourd_hui = datetime.now().date()
+        debut_mois = datetime.now().replace(day=1)
+        return {
+            'total_ventes': select(func.sum(VenteComplete.total)),
+            'total_benefices': select(
+                func.sum((VenteComplete.prix_unitaire - Produit.prix_achat) * VenteComplete.quantite)
+            ).join(Produit, Produit.id == VenteComplete.produit_id),
+            'nombre_ventes': select(func.count(VenteComplete.id)),
+            # Ventes du jour
+            'ventes_jour': select(func.sum(Vente.total)).where(func.date(Vente.date_vente) == aujourd_hui),
+            # Ventes du mois
+            'ventes_mois': select(func.sum(Vente.total)).where(Vente.date_vente >= debut_mois),
+        }
+    
+    @staticmethod
+    def formater_statistiques_financieres(valeurs):
+        stats = {nom: valeur or 0 for nom, valeur in valeurs.items()}
+        nombre_ventes = stats['nombre_ventes']
+        stats['moyenne_vente'] = stats['total_ventes'] / nombre_ventes if nombre_ventes > 0 else 0
+        return stats
+    
     @staticmethod
     def get_statistiques_par_periode(periode='mensuel'):
-        """Obtenir les statistiques par période pour les graphiques"""
+        """Obtenir les statistiques par période pour les graphiques (lues sur le réplica)"""
+        with ReplicaService.lecture():
+            stats = db.session.execute(VenteService.requete_statistiques_par_periode(periode)).all()
+        return VenteService.formater_statistiques_par_periode(stats)
+    
+    @staticmethod
+    def requete_statistiques_par_periode(periode):
+        """Requête groupée par période (partagée avec l'API asynchrone)"""
         if periode == 'journalier':
             # 7 derniers jours
             date_debut = datetime.now() - timedelta(days=7)
-            format_date = func.date(Vente.date_vente)
+            format_date = func.date(VenteComplete.date_vente)
         elif periode == 'hebdomadaire':
             # 8 dernières semaines
             date_debut = datetime.now() - timedelta(weeks=8)
-            format_date = func.strftime('%Y-W%W', Vente.date_vente)
+            format_date = func.strftime('%Y-W%W', VenteComplete.date_vente)
         else:  # mensuel
             # 12 derniers mois
             date_debut = datetime.now() - timedelta(days=365)
-            format_date = func.strftime('%Y-%m', Vente.date_vente)
+            format_date = func.strftime('%Y-%m', VenteComplete.date_vente)
         
-        stats = db.session.query(
+        return select(
             format_date.label('periode'),
-            func.sum(Vente.total).label('total_ventes'),
-            func.count(Vente.id).label('nombre_ventes'),
-            func.sum(Vente.quantite).label('quantite_vendue')
-        ).filter(
-            Vente.date_vente >= date_debut
-        ).group_by(format_date).order_by(format_date).all()
-        
+            func.sum(VenteComplete.total).label('total_ventes'),
+            func.count(VenteComplete.id).label('nombre_ventes'),
+            func.sum(VenteComplete.quantite).label('quantite_vendue')
+        ).where(
+            VenteComplete.date_vente >= date_debut
+        ).group_by(format_date).order_by(format_date)
+    
+    @staticmethod
+    def formater_statistiques_par_periode(stats):
         return [{
             'periode': stat.periode,
             'total_ventes': float(stat.total_ventes or 0),
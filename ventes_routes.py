@@ -1,7 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Vente, Produit, Client, db
+from sqlalchemy.orm import joinedload
+from models import Vente, VenteComplete, Produit, Client, Emplacement, db
+from serializers import vente_json
 from services.vente_service import VenteService
+from services.emplacement_service import EmplacementService
+from services.query_profiler_service import query_budget
+from services.version_service import conditionnel
 from datetime import datetime
 
 ventes_bp = Blueprint('ventes', __name__)
@@ -16,20 +21,20 @@ def login_required(f):
 
 @ventes_bp.route('/ventes')
 @login_required
+@conditionnel(Vente, Produit, Client, Emplacement)
 def liste_ventes():
     page = request.args.get('page', 1, type=int)
-    ventes = Vente.query.order_by(Vente.date_vente.desc()).paginate(
+    ventes = db.session.query(VenteComplete).options(
+        joinedload(VenteComplete.produit), joinedload(VenteComplete.client)
+    ).order_by(VenteComplete.date_vente.desc()).paginate(
         page=page, per_page=20, error_out=False
     )
     
-    produits = Produit.query.filter(Produit.stock > 0).all()
-    clients = Client.query.all()
-    
     # Statistiques
     stats = VenteService.get_statistiques_financieres()
     
-    return render_template('ventes.html', ventes=ventes, produits=produits, 
-                         clients=clients, stats=stats)
+    return render_template('ventes.html', ventes=ventes, stats=stats,
+                           emplacements=EmplacementService.liste())
 
 @ventes_bp.route('/ventes/ajouter', methods=['POST'])
 @login_required
@@ -39,9 +44,10 @@ def ajouter_vente():
     if client_id:
         client_id = int(client_id)
     quantite = int(request.form['quantite'])
+    emplacement_id = request.form.get('emplacement_id', type=int)
     
     try:
-        vente = VenteService.creer_vente(produit_id, quantite, client_id)
+        vente = VenteService.creer_vente(produit_id, quantite, client_id, emplacement_id)
         if vente:
             flash('Vente enregistrée avec succès', 'success')
         else:
@@ -60,30 +66,43 @@ def stats_ventes():
 
 # API Routes
 @ventes_bp.route('/api/ventes', methods=['GET'])
+@query_budget(2)
 @jwt_required()
+@conditionnel(Vente, Produit, Client)
 def api_liste_ventes():
-    ventes = Vente.query.order_by(Vente.date_vente.desc()).all()
-    return jsonify([{
-        'id': v.id,
-        'produit_nom': v.produit.nom,
-        'client_nom': v.client.nom if v.client else 'Client direct',
-        'quantite': v.quantite,
-        'prix_unitaire': v.prix_unitaire,
-        'total': v.total,
-        'benefice': v.benefice,
-        'date_vente': v.date_vente.isoformat()
-    } for v in ventes])
+    ventes = db.session.query(VenteComplete).options(
+        joinedload(VenteComplete.produit), joinedload(VenteComplete.client)
+    ).order_by(VenteComplete.date_vente.desc()).all()
+    return jsonify([vente_json(v) for v in ventes])
 
 @ventes_bp.route('/api/ventes', methods=['POST'])
 @jwt_required()
 def api_ajouter_vente():
     data = request.get_json()
     
+    # Avec une clé d'idempotence, une requête rejouée renvoie la même vente
+    cle = request.headers.get('Idempotency-Key')
+    if cle:
+        try:
+            ack = VenteService.synchroniser_ventes([dict(data, cle=cle)])[0]
+        except Exception as e:
+            return jsonify({'message': f'Erreur: {str(e)}'}), 400
+        if ack['statut'] == 'conflit':
+            return jsonify({'message': 'Stock insuffisant'}), 400
+        if ack['statut'] == 'rejete':
+            return jsonify({'message': f"Erreur: {ack['motif']}"}), 400
+        return jsonify({
+            'message': 'Vente créée avec succès' if ack['statut'] == 'cree' else 'Vente déjà enregistrée',
+            'id': ack['id'],
+            'total': ack['total']
+        }), 201 if ack['statut'] == 'cree' else 200
+    
     try:
         vente = VenteService.creer_vente(
             data['produit_id'],
             data['quantite'],
-            data.get('client_id')
+            data.get('client_id'),
+            data.get('emplacement_id')
         )
         
         if vente:
@@ -98,6 +117,27 @@ def api_ajouter_vente():
     except Exception as e:
         return jsonify({'message': f'Erreur: {str(e)}'}), 400
 
+@ventes_bp.route('/api/ventes/synchroniser', methods=['POST'])
+@jwt_required()
+def api_synchroniser_ventes():
+    """Ventes en attente d'une caisse hors ligne: {"ventes": [{"cle", "produit_id", "quantite", ...}]}"""
+    data = request.get_json(silent=True) or {}
+    ventes = data.get('ventes')
+    if not isinstance(ventes, list):
+        return jsonify({'message': 'Liste "ventes" requise'}), 400
+    if len(ventes) > current_app.config['VENTES_SYNC_LOT_MAX']:
+        return jsonify({'message': f"Au plus {current_app.config['VENTES_SYNC_LOT_MAX']} ventes par lot"}), 413
+    
+    try:
+        acks = VenteService.synchroniser_ventes(ventes)
+    except Exception as e:
+        return jsonify({'message': f'Erreur: {str(e)}'}), 400
+    
+    compte = {statut: 0 for statut in ('cree', 'doublon', 'conflit', 'rejete')}
+    for ack in acks:
+        compte[ack['statut']] += 1
+    return jsonify({**compte, 'acks': acks})
+
 @ventes_bp.route('/api/ventes/stats', methods=['GET'])
 @jwt_required()
 def api_stats_ventes():
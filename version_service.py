@@ -0,0 +1,155 @@
+import hashlib
+import logging
+from datetime import datetime, date
+from functools import wraps
+from itertools import chain
+from flask import request, session, make_response, current_app
+from sqlalchemy import event, select, update, insert
+from werkzeug.http import is_resource_modified
+from models import VersionTable, db
+from services.replica_service import SessionRoutee
+
+logger = logging.getLogger(__name__)
+
+def conditionnel(*modeles):
+    """GET conditionnel (ETag / Last-Modified) d'après la version des tables lues
+
+    À placer sous @jwt_required() / @login_required: une requête dont les
+    versions n'ont pas changé reçoit 304 après une seule lecture de
+    version_table, sans exécuter la vue.
+    """
+    tables = sorted(m.__tablename__ for m in modeles)
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if session.get('_flashes'):
+                return f(*args, **kwargs)  # message flash à afficher une seule fois
+
+            # Versions lues avant la vue: au pire l'ETag est plus ancien que le contenu
+            # et le client refera une requête complète au prochain appel
+            versions = db.session.execute(VersionService.requete_versions(tables)).all()
+            etag, modifie_le = VersionService.etag(versions, request.full_path, session.get('user_id'))
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=modifie_le):
+                reponse = current_app.response_class(status=304)
+            else:
+                reponse = make_response(f(*args, **kwargs))
+            reponse.set_etag(etag)
+            if modifie_le:
+                reponse.last_modified = modifie_le
+            reponse.cache_control.no_cache = True
+            reponse.cache_control.private = True
+            return reponse
+        return decorated_function
+    return decorator
+
+class VersionService:
+    """Version par table, incrémentée après le commit de chaque écriture ORM
+
+    Les flush (ajout, modification, suppression d'objets) et les
+    INSERT/UPDATE/DELETE en masse via db.session.execute sont suivis. Les
+    insertions Core directes (seed_data.py) ne le sont pas.
+
+    Les tables touchées sont notées dans session.info pendant la transaction,
+    puis incrémentées une fois, dans l'ordre des noms, par une courte
+    transaction séparée après le commit. Les écritures ne verrouillent donc
+    pas les lignes de version_table jusqu'à leur commit: deux ventes ne se
+    sérialisent pas sur la ligne `vente`, et l'ordre fixe exclut les
+    interblocages. Entre le commit et l'incrémentation, un client peut lire
+    le nouveau contenu sous l'ancien ETag: il le relira une fois de plus,
+    jamais l'inverse.
+    """
+    _ecouteur_installe = False
+
+    @staticmethod
+    def init_app(app):
+        if not VersionService._ecouteur_installe:
+            event.listen(SessionRoutee, 'after_flush', VersionService._apres_flush)
+            event.listen(SessionRoutee, 'do_orm_execute', VersionService._execution_orm)
+            event.listen(SessionRoutee, 'after_commit', VersionService._apres_commit)
+            event.listen(SessionRoutee, 'after_rollback', VersionService._apres_rollback)
+            VersionService._ecouteur_installe = True
+
+    @staticmethod
+    def initialiser():
+        """Créer une ligne de version pour chaque table (étape init-db)"""
+        with db.engine.begin() as conn:
+            existantes = set(conn.scalars(select(VersionTable.nom)))
+            manquantes = [nom for nom in db.metadata.tables
+                          if nom not in existantes and nom != VersionTable.__tablename__]
+            if manquantes:
+                conn.execute(insert(VersionTable), [
+                    {'nom': nom, 'version': 0, 'modifie_le': datetime.utcnow()} for nom in manquantes
+                ])
+
+    @staticmethod
+    def incrementer(connexion, tables):
+        """Incrémenter la version des tables, une ligne à la fois dans l'ordre des noms"""
+        maintenant = datetime.utcnow()
+        manquantes = []
+        for nom in sorted(tables):
+            resultat = connexion.execute(
+                update(VersionTable).where(VersionTable.nom == nom)
+                .values(version=VersionTable.version + 1, modifie_le=maintenant)
+            )
+            if not resultat.rowcount:
+                manquantes.append(nom)
+        if manquantes:
+            connexion.execute(insert(VersionTable), [
+                {'nom': nom, 'version': 1, 'modifie_le': maintenant} for nom in manquantes
+            ])
+
+    @staticmethod
+    def requete_versions(tables):
+        return select(VersionTable.nom, VersionTable.version, VersionTable.modifie_le).where(
+            VersionTable.nom.in_(tables)
+        )
+
+    @staticmethod
+    def etag(versions, chemin, utilisateur=None):
+        """ETag et date de dernière modification d'une ressource
+
+        La date du jour fait partie de l'ETag pour les vues qui en dépendent
+        (ventes du jour, du mois).
+        """
+        empreinte = ';'.join(f"{nom}:{version}" for nom, version, _ in sorted(versions))
+        cle = f"{chemin}|{utilisateur}|{date.today()}|{empreinte}"
+        modifie_le = max((m for _, _, m in versions if m), default=None)
+        return hashlib.sha1(cle.encode()).hexdigest()[:20], modifie_le
+
+    @staticmethod
+    def _noter(session, tables):
+        session.info.setdefault('versions', set()).update(tables)
+
+    @staticmethod
+    def _apres_flush(session, flush_context):
+        tables = {type(o).__table__.name for o in chain(session.new, session.deleted)}
+        tables |= {type(o).__table__.name for o in session.dirty
+                   if session.is_modified(o, include_collections=False)}
+        tables.discard(VersionTable.__tablename__)
+        if tables:
+            VersionService._noter(session, tables)
+
+    @staticmethod
+    def _execution_orm(orm_execute_state):
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+            return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.local_table.name != VersionTable.__tablename__:
+            VersionService._noter(orm_execute_state.session, {mapper.local_table.name})
+
+    @staticmethod
+    def _apres_commit(session):
+        tables = session.info.pop('versions', None)
+        if tables:
+            try:
+                with db.engine.begin() as connexion:
+                    VersionService.incrementer(connexion, tables)
+            except Exception:
+                # Écriture déjà validée: l'ETag suivra à la prochaine écriture sur ces tables
+                logger.exception("Versions non incrémentées: %s", ', '.join(sorted(tables)))
+
+    @staticmethod
+    def _apres_rollback(session):
+        session.info.pop('versions', None)